@@ -0,0 +1,102 @@
+"""
+Accuracy levels — trade measurement accuracy for analysis speed per job.
+
+At reduced levels the video pass decodes fewer and smaller frames and the
+audio pass resamples the audio for clipping and the waveform:
+
+- the luma analysis width of every detector (see luma.py) is capped at the
+  level's width; noise keeps the source resolution, TOUT averages out on
+  scaled frames (benchmark line dropouts: 0.28 at 1080p, 0.01-0.04 at
+  640 px) and a capped noise check would pass noisy material
+- black and freeze detection look at a decimated frame rate (fps=); noise
+  (TOUT) and scene detection compare neighbouring frames and keep every
+  decoded frame
+- "fast" only decodes keyframes (-skip_frame nokey); noise and flash-frame
+  detection need consecutive frames and are not run at all
+- loudness always reads the source rate: ebur128 upsamples for true peak
+  anyway, and a downsampled input would lose the content above the new
+  Nyquist frequency
+
+The level is stored in the result so reviewers know how far to trust it.
+"""
+
+ACCURACY_LEVELS = {
+    "full": {
+        "label": "Vollständig",
+        "description": "Jedes Frame in Analyseauflösung je Detektor, Audio unverändert",
+        "width": None,
+        "fps": None,
+        "keyframes_only": False,
+        "audio_rate": None,
+        # Rough analysis time relative to "full", for the time estimates
+        "time_factor": 1.0,
+    },
+    "balanced": {
+        "label": "Ausgewogen",
+        "description": "Luma höchstens 640 px (Rauschen in voller Auflösung), Schwarzbild/Freeze mit 10 fps, Audio 24 kHz",
+        "width": 640,
+        "fps": 10,
+        "keyframes_only": False,
+        "audio_rate": 24000,
+        "time_factor": 0.35,
+    },
+    "fast": {
+        "label": "Schnell",
+        "description": "Nur Keyframes, 320 px Luma, Audio 16 kHz; ohne Rauschen und Fehlschnitte",
+        "width": 320,
+        "fps": None,
+        "keyframes_only": True,
+        "audio_rate": 16000,
+        "time_factor": 0.1,
+    },
+}
+
+DEFAULT_ACCURACY = "full"
+
+# Detectors that stay usable on a decimated frame rate
+DECIMATABLE_STEPS = ("black_frames", "media_offline")
+# Detectors that need consecutive frames, so not available on keyframes only
+TEMPORAL_STEPS = ("noise", "fuck_frames")
+# Audio consumers that read the resampled audio (loudness keeps the source rate)
+RESAMPLED_AUDIO = ("clipping", "waveform")
+
+
+def unsupported_steps(level):
+    """Steps that cannot run at the given accuracy level."""
+    return list(TEMPORAL_STEPS) if ACCURACY_LEVELS[level]["keyframes_only"] else []
+
+
+def video_input_args(level):
+    """Decoder options placed before the input."""
+    return ['-skip_frame', 'nokey'] if ACCURACY_LEVELS[level]["keyframes_only"] else []
+
+
+def analysis_width(level, detector_width):
+    """Luma analysis width of a detector at the given level (None: source resolution)."""
+    if detector_width is None:
+        return None  # Detectors at source resolution are never capped
+    widths = [w for w in (detector_width, ACCURACY_LEVELS[level]["width"]) if w]
+    return min(widths)
+
+
+def branch_prefilter(level, step_key):
+    """Per-detector frame rate decimation, or ''."""
+    fps = ACCURACY_LEVELS[level]["fps"]
+    return f"fps={fps}," if fps and step_key in DECIMATABLE_STEPS else ''
+
+
+def audio_prefilter(level):
+    """Resampling shared by the RESAMPLED_AUDIO consumers, or ''."""
+    rate = ACCURACY_LEVELS[level]["audio_rate"]
+    return f"aresample={rate}," if rate else ''
+
+
+def accuracy_info(level, skipped_steps=()):
+    """The accuracy level as reported in a job result."""
+    cfg = ACCURACY_LEVELS[level]
+    return {
+        "level": level,
+        "label": cfg["label"],
+        "description": cfg["description"],
+        "skipped_steps": sorted(skipped_steps),
+    }
@@ -1,107 +1,116 @@
-import re
+import math
 import subprocess
+from array import array
 
+import numpy as np
 
-def detect_clipping(filepath, duration=None, timeout=600):
+from analyzers.ffmpeg_runner import MetadataPipe, run_ffmpeg
+from analyzers.series import as_float32, as_float64, find_runs, run_maxima
+
+PEAK_KEY = 'lavfi.astats.Overall.Peak_level'
+FLAT_KEY = 'lavfi.astats.Overall.Flat_factor'
+
+# Per-frame stats (reset=1), only the two overall values we need as metadata
+ASTATS_FILTER = 'astats=metadata=1:reset=1:measure_perchannel=none:measure_overall=Peak_level+Flat_factor'
+
+# Level reported for digital silence (astats gives -inf dB)
+SILENCE_DB = -100.0
+
+
+def detect_clipping(filepath, timeout=600, progress=None):
+    parser = ClippingParser()
     cmd = [
         'ffmpeg',
         '-i', filepath,
-        '-af', 'astats=metadata=1:reset=1',
+        '-af', clipping_filter(parser.pipe),
         '-vn',
         '-f', 'null',
         '-'
     ]
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        run_ffmpeg(cmd, timeout=timeout, progress=progress, pipes=[parser.pipe])
     except subprocess.TimeoutExpired:
         return {"status": "error", "message": "Clipping detection timed out"}
+    return parser.result()
+
+
+def clipping_filter(pipe):
+    """astats chain that writes per-frame peak level and flat factor with their pts to pipe."""
+    return f'{ASTATS_FILTER},ametadata=mode=print:{pipe.filter_option()}'
+
 
-    # ffmpeg astats outputs in log format: "Peak level dB: -17.98"
-    peak_pattern = re.compile(r'Peak level dB:\s*([-\d.]+)')
-    flat_pattern = re.compile(r'Flat factor:\s*([\d.]+)')
-
-    peak_levels = []
-    flat_factors = []
-
-    for line in result.stderr.splitlines():
-        pm = peak_pattern.search(line)
-        if pm:
-            try:
-                peak_levels.append(float(pm.group(1)))
-            except ValueError:
-                pass
-        fm = flat_pattern.search(line)
-        if fm:
-            try:
-                flat_factors.append(float(fm.group(1)))
-            except ValueError:
-                pass
-
-    clipping_count = sum(1 for p in peak_levels if p >= 0.0)
-    max_peak = max(peak_levels) if peak_levels else -100.0
-    max_flat = max(flat_factors) if flat_factors else 0.0
+class ClippingParser:
+    """
+    Collects the per-frame astats peak levels from the ametadata pipe as
+    compact float32 values next to the exact pts of every audio frame; the
+    flat factor only matters as a maximum and is folded in directly.
+    """
 
+    log_filter = None
+
+    def __init__(self):
+        self.peak_levels = array('f')
+        self.timestamps = array('d')
+        self.max_flat = None
+        self.pipe = MetadataPipe(self.add_frame)
+
+    def add_frame(self, pts, values):
+        try:
+            peak = float(values[PEAK_KEY])
+        except (KeyError, ValueError):
+            peak = None
+        if peak is not None:
+            if not math.isfinite(peak):
+                peak = SILENCE_DB
+            self.peak_levels.append(peak)
+            self.timestamps.append(pts)
+        try:
+            flat = float(values[FLAT_KEY])
+        except (KeyError, ValueError):
+            return
+        if math.isfinite(flat) and (self.max_flat is None or flat > self.max_flat):
+            self.max_flat = flat
+
+    def result(self):
+        return _clipping_result(
+            self.peak_levels, self.timestamps,
+            0.0 if self.max_flat is None else self.max_flat,
+        )
+
+
+def _clipping_result(peak_levels, timestamps, max_flat):
+    peak_levels = as_float32(peak_levels)
+    timestamps = as_float64(timestamps)
     total_frames = len(peak_levels)
-    # Calculate seconds per frame for time-based segments
-    spf = (duration / total_frames) if (duration and total_frames > 0) else 0
+
+    clipping = peak_levels >= 0.0
+    clipping_count = int(np.count_nonzero(clipping))
+    max_peak = float(peak_levels.max()) if total_frames else -100.0
 
     # Find clipping segments (time-based)
     clipping_segments = []
-    if clipping_count > 0 and total_frames > 0:
-        in_clip = False
-        clip_start = 0
-        for i, p in enumerate(peak_levels):
-            if p >= 0.0:
-                if not in_clip:
-                    in_clip = True
-                    clip_start = i
-            else:
-                if in_clip:
-                    clipping_segments.append({
-                        "start_frame": clip_start,
-                        "end_frame": i - 1,
-                        "frame_count": i - clip_start,
-                        "start": round(clip_start * spf, 3),
-                        "end": round((i - 1) * spf, 3),
-                    })
-                    in_clip = False
-        if in_clip:
-            clipping_segments.append({
-                "start_frame": clip_start,
-                "end_frame": total_frames - 1,
-                "frame_count": total_frames - clip_start,
-                "start": round(clip_start * spf, 3),
-                "end": round((total_frames - 1) * spf, 3),
-            })
+    starts, ends = find_runs(clipping)
+    for s, e in zip(starts, ends):
+        clipping_segments.append({
+            "start_frame": int(s),
+            "end_frame": int(e),
+            "frame_count": int(e - s + 1),
+            "start": round(float(timestamps[s]), 3),
+            "end": round(float(timestamps[e]), 3),
+        })
 
     # Find extreme loudness segments (peak > -3 dB but not clipping)
-    loud_segments = []
-    if total_frames > 0:
-        in_loud = False
-        loud_start = 0
-        loud_peak = -100
-        for i, p in enumerate(peak_levels):
-            if p >= -3.0 and p < 0.0:
-                if not in_loud:
-                    in_loud = True
-                    loud_start = i
-                    loud_peak = p
-                else:
-                    loud_peak = max(loud_peak, p)
-            else:
-                if in_loud:
-                    loud_segments.append({
-                        "start": round(loud_start * spf, 3),
-                        "end": round((i - 1) * spf, 3),
-                        "level": round(loud_peak, 1),
-                    })
-                    in_loud = False
-        if in_loud:
-            loud_segments.append({
-                "start": round(loud_start * spf, 3),
-                "end": round((total_frames - 1) * spf, 3),
-                "level": round(loud_peak, 1),
-            })
+    loud = (peak_levels >= -3.0) & (peak_levels < 0.0)
+    starts, ends = find_runs(loud)
+    levels = run_maxima(peak_levels, loud, starts)
+    loud_segments = [
+        {
+            "start": round(float(timestamps[s]), 3),
+            "end": round(float(timestamps[e]), 3),
+            "level": round(float(level), 1),
+        }
+        for s, e, level in zip(starts, ends, levels)
+    ]
 
     return {
         "max_peak_level_db": round(max_peak, 2),
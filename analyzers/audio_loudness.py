@@ -1,24 +1,58 @@
 import re
 import subprocess
 
+from analyzers.ffmpeg_runner import run_ffmpeg
 
-def measure_loudness(filepath, timeout=600):
+EBUR128_FILTER = 'ebur128=peak=true'
+
+_INTEGRATED_PATTERN = re.compile(r'I:\s+([-\d.]+)\s+LUFS')
+_LRA_PATTERN = re.compile(r'LRA:\s+([-\d.]+)\s+LU')
+_TRUE_PEAK_PATTERN = re.compile(r'Peak:\s+([-\d.]+)\s+dBFS')
+_LRA_LOW_PATTERN = re.compile(r'LRA low:\s+([-\d.]+)\s+LUFS')
+_LRA_HIGH_PATTERN = re.compile(r'LRA high:\s+([-\d.]+)\s+LUFS')
+
+
+def measure_loudness(filepath, timeout=600, progress=None):
     cmd = [
         'ffmpeg',
         '-i', filepath,
-        '-af', 'ebur128=peak=true',
+        '-af', EBUR128_FILTER,
         '-vn',
         '-f', 'null',
         '-'
     ]
+    parser = LoudnessParser()
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        run_ffmpeg(cmd, parser.feed, timeout=timeout, progress=progress)
     except subprocess.TimeoutExpired:
         return {"status": "error", "message": "Loudness measurement timed out"}
+    return parser.result()
+
+
+class LoudnessParser:
+    """Keeps the last ebur128 summary block from ffmpeg log lines."""
+
+    log_filter = 'ebur128'
+    pipe = None
+
+    def __init__(self):
+        self.summary_lines = None
+
+    def feed(self, line):
+        if 'Summary:' in line:
+            # Keep only the LAST Summary block
+            self.summary_lines = [line]
+        elif self.summary_lines is not None:
+            self.summary_lines.append(line)
+
+    def result(self):
+        summary = None
+        if self.summary_lines is not None:
+            summary = _parse_ebur128_summary('\n'.join(self.summary_lines))
+        return _loudness_result(summary)
 
-    stderr = result.stderr
-    summary = _parse_ebur128_summary(stderr)
 
+def _loudness_result(summary):
     if summary is None:
         return {"status": "error", "message": "Could not parse loudness data"}
 
@@ -43,11 +77,11 @@ def _parse_ebur128_summary(stderr):
 
     block = '\n'.join(lines[summary_idx:])
 
-    integrated = _extract_float(block, r'I:\s+([-\d.]+)\s+LUFS')
-    lra = _extract_float(block, r'LRA:\s+([-\d.]+)\s+LU')
-    true_peak = _extract_float(block, r'Peak:\s+([-\d.]+)\s+dBFS')
-    lra_low = _extract_float(block, r'LRA low:\s+([-\d.]+)\s+LUFS')
-    lra_high = _extract_float(block, r'LRA high:\s+([-\d.]+)\s+LUFS')
+    integrated = _extract_float(block, _INTEGRATED_PATTERN)
+    lra = _extract_float(block, _LRA_PATTERN)
+    true_peak = _extract_float(block, _TRUE_PEAK_PATTERN)
+    lra_low = _extract_float(block, _LRA_LOW_PATTERN)
+    lra_high = _extract_float(block, _LRA_HIGH_PATTERN)
 
     if integrated is None:
         return None
@@ -62,7 +96,7 @@ def _parse_ebur128_summary(stderr):
 
 
 def _extract_float(text, pattern):
-    match = re.search(pattern, text)
+    match = pattern.search(text)
     if match:
         try:
             return float(match.group(1))
@@ -0,0 +1,124 @@
+"""
+Fused audio pass — loudness, clipping and waveform from a single decode.
+
+One ffmpeg process decodes the first audio stream, fans it out with `asplit`
+and feeds ebur128, astats and showwavespic side by side. At reduced accuracy
+levels astats and showwavespic share one resampled copy (see accuracy.py). The loudness log
+lines and the per-frame clipping metadata are streamed to their parsers;
+the waveform branch writes the PNG directly. For video files this also means the container is
+read only once for all audio work.
+"""
+
+import os
+import subprocess
+
+from analyzers.audio_loudness import EBUR128_FILTER, LoudnessParser, measure_loudness
+from analyzers.audio_clipping import ClippingParser, clipping_filter, detect_clipping
+from analyzers.waveform import generate_waveform, waveform_filter, waveform_path
+from analyzers.ffmpeg_runner import FileInput, LineRouter, run_ffmpeg
+from analyzers.accuracy import DEFAULT_ACCURACY, RESAMPLED_AUDIO, audio_prefilter
+
+AUDIO_STEPS = ("loudness", "clipping")
+
+
+def run_audio_pass(filepath, job_id, steps, timeout=600, threads=None, progress=None, source=None,
+                   accuracy=DEFAULT_ACCURACY):
+    """
+    Run the enabled audio analyzers plus the waveform in one ffmpeg decode.
+
+    Args:
+        filepath: Path to the media file
+        job_id: Job ID for naming the waveform PNG
+        steps: Iterable of step keys to run (subset of AUDIO_STEPS)
+        timeout: Timeout for the whole pass in seconds
+        threads: Decoder thread limit (None = ffmpeg default)
+        progress: Optional progress(out_time, speed) callback
+        source: Input object (default: FileInput(filepath))
+        accuracy: Accuracy level key; reduced levels resample the audio first
+
+    Returns:
+        dict with a result per requested step key and "waveform_path"
+        (None if no waveform could be rendered)
+    """
+    branches = []  # (step_key, filter chain, parser)
+    if "loudness" in steps:
+        branches.append(("loudness", EBUR128_FILTER, LoudnessParser()))
+    if "clipping" in steps:
+        parser = ClippingParser()
+        branches.append(("clipping", clipping_filter(parser.pipe), parser))
+
+    output_path = waveform_path(job_id)
+    cmd = ['ffmpeg']
+    if threads:
+        cmd.extend(['-threads', str(threads)])
+    source = source or FileInput(filepath)
+    cmd.extend(source.args())
+    cmd.extend(['-filter_complex', build_audio_graph(branches, audio_prefilter(accuracy))])
+    for i in range(len(branches)):
+        cmd.extend(['-map', f'[out{i}]', '-f', 'null', '-'])
+    cmd.extend(['-map', '[wave]', '-frames:v', '1', '-y', output_path])
+
+    parsers = [parser for _, _, parser in branches]
+    router = LineRouter({p.log_filter: p for p in parsers if p.log_filter})
+    try:
+        returncode = run_ffmpeg(cmd, router.feed, timeout=timeout, progress=progress,
+                                pipes=[p.pipe for p in parsers if p.pipe], stdin=source.open())
+    except subprocess.TimeoutExpired:
+        results = {step_key: {"status": "error", "message": "Audio analysis timed out"}
+                   for step_key, _, _ in branches}
+        results["waveform_path"] = None
+        return results
+
+    if returncode != 0:
+        # e.g. older ffmpeg without showwavespic split_channels — run separately
+        # (these read the file itself, so it has to be complete)
+        source.wait()
+        return _run_separately(filepath, job_id, steps, timeout, progress)
+
+    results = {step_key: parser.result() for step_key, _, parser in branches}
+    results["waveform_path"] = _existing(output_path)
+    return results
+
+
+def build_audio_graph(branches, prefilter=''):
+    """
+    Build the filter_complex string: split the audio once, one chain per consumer.
+
+    A prefilter (resampling) runs once on a separate split output that feeds
+    only the RESAMPLED_AUDIO consumers.
+    """
+    consumers = [(step_key, chain, f'[out{i}]') for i, (step_key, chain, _) in enumerate(branches)]
+    consumers.append(("waveform", waveform_filter(), '[wave]'))
+    direct, resampled = [], []
+    for i, (step_key, _, _) in enumerate(consumers):
+        (resampled if prefilter and step_key in RESAMPLED_AUDIO else direct).append(f'[in{i}]')
+
+    chains = [_fan_out('[0:a:0]', direct + (['[resample]'] if resampled else []))]
+    if resampled:
+        chains.append(_fan_out(f'[resample]{prefilter}', resampled))
+    for i, (_, chain, output) in enumerate(consumers):
+        chains.append(f'[in{i}]{chain}{output}')
+    return ';'.join(chains)
+
+
+def _fan_out(head, labels):
+    return f"{head}{f'asplit={len(labels)}' if len(labels) > 1 else 'anull'}{''.join(labels)}"
+
+
+def _run_separately(filepath, job_id, steps, timeout, progress=None):
+    results = {}
+    if "loudness" in steps:
+        results["loudness"] = measure_loudness(filepath, timeout=timeout, progress=progress)
+    if "clipping" in steps:
+        results["clipping"] = detect_clipping(filepath, timeout=timeout, progress=progress)
+    try:
+        results["waveform_path"] = generate_waveform(filepath, job_id, progress=progress)
+    except Exception:
+        results["waveform_path"] = None
+    return results
+
+
+def _existing(path):
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        return path
+    return None
@@ -1,37 +1,64 @@
 import re
 import subprocess
 
+from analyzers.ffmpeg_runner import run_ffmpeg
 
-def detect_black_frames(filepath, config, timeout=600):
+# Shortest black interval reported
+BLACK_MIN_DURATION = 0.5
+
+
+def blackdetect_filter(min_duration=BLACK_MIN_DURATION):
+    return f'blackdetect=d={min_duration}:pix_th=0.10:pic_th=0.98'
+
+
+BLACKDETECT_FILTER = blackdetect_filter()
+# Luma analysis width in the fused video pass (see luma.py)
+ANALYSIS_WIDTH = 480
+
+_BLACK_PATTERN = re.compile(
+    r'black_start:([\d.]+)\s+black_end:([\d.]+)\s+black_duration:([\d.]+)'
+)
+
+
+def detect_black_frames(filepath, config, timeout=600, progress=None):
     cmd = [
         'ffmpeg',
         '-i', filepath,
-        '-vf', 'blackdetect=d=0.5:pix_th=0.10:pic_th=0.98',
+        '-vf', BLACKDETECT_FILTER,
         '-an',
         '-f', 'null',
         '-'
     ]
+    parser = BlackFrameParser()
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        run_ffmpeg(cmd, parser.feed, timeout=timeout, progress=progress)
     except subprocess.TimeoutExpired:
         return {"status": "error", "message": "Black frame detection timed out"}
+    return parser.result()
+
+
+class BlackFrameParser:
+    """Collects blackdetect intervals from ffmpeg log lines."""
+
+    log_filter = 'blackdetect'
+    pipe = None
+
+    def __init__(self):
+        self.intervals = []
 
-    pattern = re.compile(
-        r'black_start:([\d.]+)\s+black_end:([\d.]+)\s+black_duration:([\d.]+)'
-    )
-    intervals = []
-    for line in result.stderr.splitlines():
-        match = pattern.search(line)
+    def feed(self, line):
+        match = _BLACK_PATTERN.search(line)
         if match:
-            intervals.append({
+            self.intervals.append({
                 "start": float(match.group(1)),
                 "end": float(match.group(2)),
                 "duration": float(match.group(3)),
             })
 
-    total = sum(i['duration'] for i in intervals)
-    return {
-        "intervals": intervals,
-        "total_black_duration": round(total, 2),
-        "count": len(intervals),
-    }
+    def result(self):
+        total = sum(i['duration'] for i in self.intervals)
+        return {
+            "intervals": self.intervals,
+            "total_black_duration": round(total, 2),
+            "count": len(self.intervals),
+        }
@@ -0,0 +1,370 @@
+"""
+Shared helpers for running ffmpeg and parsing its log output.
+
+ffmpeg's stderr is streamed line by line into the analyzer parsers while
+the process runs, so memory use does not grow with the length of the log
+(per-frame filters like signalstats or astats log hundreds of MB for a
+feature-length file).
+
+Every process started here (ffprobe through run_capture) is counted while
+it runs. Once it exits, a record of it (command, start and end time, exit
+code, bytes read, CPU time, peak memory) is handed to the callbacks
+registered with on_process_finished; the web app turns these into metrics
+and job traces.
+"""
+
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+# Filters inside a parsed graph log as "[Parsed_<filter>_<index> @ 0x...] ..." up to
+# ffmpeg 5 and as "[<filter> @ 0x...] ..." from ffmpeg 6 on
+_FILTER_PREFIX = re.compile(r'^\[(?:Parsed_([a-z0-9_]+?)_\d+|([a-z0-9_]+)) @ [^\]]*\]')
+
+# ffmpeg processes of this Python process that are still running
+_running = 0
+_running_lock = threading.Lock()
+# Callables taking the record of each finished process (see _reap)
+_finished_callbacks = []
+# ru_maxrss is in kilobytes on Linux, in bytes on macOS
+_RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+def running_processes():
+    """Number of ffmpeg processes this Python process is running right now."""
+    return _running
+
+
+def on_process_finished(callback):
+    """
+    Register callback(record), called in the thread that ran the process once it exited.
+
+    record is a dict with cmd, started_at, ended_at (epoch seconds),
+    exit_code, bytes_read, cpu_seconds and max_rss_bytes; the last three are
+    None where the platform does not report them.
+    """
+    _finished_callbacks.append(callback)
+
+
+class FileInput:
+    """
+    ffmpeg input read directly from a complete media file.
+
+    Passes take an input object instead of a path so the same command can
+    also read an upload that is still arriving (see upload_stream.py): args()
+    gives the input arguments, open() a stream to copy into ffmpeg's stdin
+    (None when ffmpeg reads the file itself) and wait() blocks until the
+    whole file is on disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def args(self):
+        return ['-i', self.path]
+
+    def open(self):
+        return None
+
+    def wait(self):
+        pass
+
+
+def run_ffmpeg(cmd, feed=None, timeout=600, progress=None, pipes=(), stdin=None):
+    """
+    Run an ffmpeg command and stream its stderr lines to feed as they arrive.
+
+    Args:
+        cmd: Command list
+        feed: Callable taking one log line (without newline), or None
+        timeout: Seconds after which the process is killed
+        progress: Callable progress(out_time, speed) called with the media
+                  seconds processed so far and the speed as a multiple of
+                  realtime (None while unknown), or None
+        pipes: MetadataPipe objects the filter graph writes to
+        stdin: Readable binary stream copied into the process (for '-i pipe:0'),
+               or None. The timeout then only starts once the input is complete,
+               so a slow upload does not count against it.
+
+    Returns:
+        The exit code of the process
+
+    Raises:
+        subprocess.TimeoutExpired if the process had to be killed
+    """
+    global _running
+    if progress is not None:
+        # Machine-readable progress blocks on stdout instead of the status line
+        cmd = [cmd[0], '-progress', 'pipe:1', '-nostats'] + list(cmd[1:])
+    started_at = time.time()
+    try:
+        proc = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE if stdin is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE if progress is not None else subprocess.DEVNULL,
+            stderr=subprocess.PIPE, text=True, errors='replace',
+            pass_fds=[p.write_fd for p in pipes],
+        )
+    finally:
+        # Only ffmpeg may hold the write ends, so the readers see EOF when it exits
+        for p in pipes:
+            p.close_writer()
+    with _running_lock:
+        _running += 1
+    pipe_readers = [p.start_reader() for p in pipes]
+    reader = None
+    if progress is not None:
+        reader = threading.Thread(target=_read_progress, args=(proc.stdout, progress), daemon=True)
+        reader.start()
+    expired = threading.Event()
+
+    def kill():
+        expired.set()
+        proc.kill()
+
+    timer = threading.Timer(timeout, kill)
+    timer.daemon = True
+    if stdin is not None:
+        # proc.stdin is a text wrapper (text=True applies to all streams); write bytes to its buffer
+        writer = threading.Thread(target=_write_input, args=(stdin, proc.stdin.buffer, timer.start),
+                                  daemon=True)
+        writer.start()
+    else:
+        timer.start()
+    try:
+        # Universal newlines also split the '\r'-terminated status lines
+        for line in proc.stderr:
+            if feed is not None:
+                feed(line.rstrip('\n'))
+        _reap(proc, cmd, started_at)
+    finally:
+        timer.cancel()
+        if proc.poll() is None:
+            proc.kill()
+            _reap(proc, cmd, started_at)
+        with _running_lock:
+            _running -= 1
+        # The input writer is not joined: it may still wait for upload data
+        # and ends with a broken pipe on its next write
+        if reader is not None:
+            reader.join()
+            proc.stdout.close()
+        for t in pipe_readers:
+            t.join()
+        proc.stderr.close()
+
+    if expired.is_set():
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    return proc.returncode
+
+
+def run_capture(cmd, timeout=30):
+    """
+    Run a short command (ffprobe) and capture its output, accounted like run_ffmpeg.
+
+    Returns:
+        (returncode, stdout, stderr)
+
+    Raises:
+        subprocess.TimeoutExpired if the process had to be killed
+    """
+    global _running
+    started_at = time.time()
+    proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, text=True, errors='replace')
+    with _running_lock:
+        _running += 1
+    stderr = []
+    reader = threading.Thread(target=lambda: stderr.append(proc.stderr.read()), daemon=True)
+    reader.start()
+    expired = threading.Event()
+
+    def kill():
+        expired.set()
+        proc.kill()
+
+    timer = threading.Timer(timeout, kill)
+    timer.daemon = True
+    timer.start()
+    try:
+        stdout = proc.stdout.read()
+        reader.join()
+        _reap(proc, cmd, started_at)
+    finally:
+        timer.cancel()
+        if proc.poll() is None:
+            proc.kill()
+            _reap(proc, cmd, started_at)
+        with _running_lock:
+            _running -= 1
+        proc.stdout.close()
+        proc.stderr.close()
+
+    if expired.is_set():
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    return proc.returncode, stdout, stderr[0] if stderr else ''
+
+
+def _reap(proc, cmd, started_at):
+    """Wait for the process and pass its record to the callbacks."""
+    record = {"cmd": list(cmd), "started_at": started_at, "ended_at": None, "exit_code": None,
+              "bytes_read": _bytes_read(proc.pid), "cpu_seconds": None, "max_rss_bytes": None}
+    try:
+        _, status, usage = os.wait4(proc.pid, 0)
+    except ChildProcessError:
+        # Already reaped by Popen (kill() polls it on a timeout)
+        proc.wait()
+    else:
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        record["cpu_seconds"] = usage.ru_utime + usage.ru_stime
+        record["max_rss_bytes"] = usage.ru_maxrss * _RSS_UNIT
+    record["ended_at"] = time.time()
+    record["exit_code"] = proc.returncode
+    for callback in _finished_callbacks:
+        callback(record)
+
+
+def _bytes_read(pid):
+    """Bytes an exited process read (files and pipes), from /proc before it is reaped; None elsewhere."""
+    try:
+        # Wait for the exit but leave the process a zombie, so /proc still has it
+        os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+        with open(f"/proc/{pid}/io") as f:
+            for line in f:
+                if line.startswith("rchar:"):
+                    return int(line.split()[1])
+    except (AttributeError, OSError):
+        pass
+    return None
+
+
+def _write_input(source, sink, on_done):
+    """Copy the input stream into ffmpeg's stdin; ffmpeg may stop reading early."""
+    try:
+        while True:
+            chunk = source.read(1024 * 1024)
+            if not chunk:
+                break
+            sink.write(chunk)
+    except (BrokenPipeError, ValueError):
+        pass
+    finally:
+        try:
+            sink.close()
+        except BrokenPipeError:
+            pass
+        source.close()
+        on_done()
+
+
+def _read_progress(stream, progress):
+    """Parse ffmpeg -progress blocks ("key=value" lines ending in "progress=...")."""
+    out_time = 0.0
+    speed = None
+    for line in stream:
+        key, _, value = line.strip().partition('=')
+        # out_time_ms is the pre-4.4 name and is in microseconds as well
+        if key in ('out_time_us', 'out_time_ms'):
+            try:
+                out_time = max(int(value) / 1_000_000, 0.0)
+            except ValueError:
+                pass
+        elif key == 'speed':
+            try:
+                speed = float(value.rstrip('x'))
+            except ValueError:
+                speed = None
+        elif key == 'progress':
+            progress(out_time, speed)
+
+
+class MetadataPipe:
+    """
+    OS pipe that a metadata/ametadata filter in print mode writes to.
+
+    The child inherits the write end; the output (a "frame:N pts:P
+    pts_time:T" header followed by "key=value" lines per frame) is read in
+    large chunks and handed to on_frame(pts_time, values) once per frame,
+    with values mapping metadata keys to their string values.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, on_frame):
+        self.on_frame = on_frame
+        self.read_fd, self.write_fd = os.pipe()
+
+    def filter_option(self):
+        """file= option for the print filter (quoted so the ':' survives both escaping levels)."""
+        return f"file='pipe\\:{self.write_fd}'"
+
+    def close_writer(self):
+        if self.write_fd is not None:
+            os.close(self.write_fd)
+            self.write_fd = None
+
+    def start_reader(self):
+        t = threading.Thread(target=self._read, daemon=True)
+        t.start()
+        return t
+
+    def _read(self):
+        pts = 0.0
+        values = None
+        rest = b''
+        with os.fdopen(self.read_fd, 'rb') as stream:
+            while True:
+                chunk = stream.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                lines = (rest + chunk).split(b'\n')
+                rest = lines.pop()
+                for line in lines:
+                    if line.startswith(b'frame:'):
+                        if values is not None:
+                            self.on_frame(pts, values)
+                        pts = _parse_pts_time(line, pts)
+                        values = {}
+                    elif values is not None:
+                        key, _, value = line.partition(b'=')
+                        values[key.decode()] = value.decode()
+        if values is not None:
+            self.on_frame(pts, values)
+
+
+def _parse_pts_time(header, previous):
+    _, _, value = header.rpartition(b'pts_time:')
+    try:
+        return float(value)
+    except ValueError:
+        # NOPTS: keep the last known timestamp
+        return previous
+
+
+class LineRouter:
+    """
+    Dispatch ffmpeg log lines to the parser that owns the emitting filter.
+
+    Args:
+        parsers: Dict mapping a filter name (e.g. 'blackdetect') to a parser
+                 object with a feed(line) method
+
+    Blank or indented lines without a filter prefix continue a multi-line
+    message (e.g. the ebur128 summary) and go to the filter that logged last.
+    """
+
+    def __init__(self, parsers):
+        self.parsers = parsers
+        self.current = None
+
+    def feed(self, line):
+        m = _FILTER_PREFIX.match(line)
+        if m:
+            self.current = self.parsers.get(m.group(1) or m.group(2))
+        elif line and not line[:1].isspace():
+            self.current = None
+            return
+        if self.current is not None:
+            self.current.feed(line)
@@ -11,11 +11,16 @@ Strategy:
 3. Report these as potential fuck frames / flash frames
 """
 
-import re
 import subprocess
 
+from analyzers.ffmpeg_runner import MetadataPipe, run_capture, run_ffmpeg
 
-def detect_fuck_frames(filepath, config, max_flash_frames=5, timeout=600):
+SCENE_SCORE_KEY = 'lavfi.scene_score'
+# Luma analysis width in the fused video pass (see luma.py)
+ANALYSIS_WIDTH = 480
+
+
+def detect_fuck_frames(filepath, config, max_flash_frames=5, timeout=600, progress=None):
     """
     Detect accidental flash frames (fuck frames) in a video.
 
@@ -27,6 +32,7 @@ def detect_fuck_frames(filepath, config, max_flash_frames=5, timeout=600):
         config: Channel config dict
         max_flash_frames: Maximum number of frames for a segment to be considered
                          a fuck frame (default: 5)
+        progress: Optional progress(out_time, speed) callback
 
     Returns:
         dict with flash_frames list, flash_count
@@ -37,73 +43,111 @@ def detect_fuck_frames(filepath, config, max_flash_frames=5, timeout=600):
         if fps <= 0:
             return {"status": "error", "message": "Framerate konnte nicht ermittelt werden"}
 
-        # Maximum duration in seconds for a fuck frame
-        max_flash_duration = max_flash_frames / fps
-
-        # Scene detection threshold — lower = more sensitive
-        scene_threshold = config.get('scene_threshold', 0.35)
-
         # Run ffmpeg scene detection
+        parser = SceneChangeParser(fps, max_flash_frames)
         cmd = [
             'ffmpeg',
             '-i', filepath,
-            '-vf', f"select='gt(scene,{scene_threshold})',showinfo",
+            '-vf', scene_filter(scene_threshold([config]), parser.pipe),
             '-vsync', 'vfr',
             '-f', 'null',
             '-'
         ]
 
-        result = subprocess.run(
-            cmd, capture_output=True, text=True,
-            timeout=timeout
-        )
-
-        # Parse scene change timestamps from showinfo output
-        # Format: [Parsed_showinfo...] n:   X pts:   Y pts_time:Z.ZZZ ...
-        scene_times = []
-        for line in result.stderr.split('\n'):
-            m = re.search(r'pts_time:\s*([\d.]+)', line)
-            if m:
-                t = float(m.group(1))
-                scene_times.append(t)
-
-        if len(scene_times) < 2:
-            return {
-                "flash_frames": [],
-                "flash_count": 0,
-                "scene_changes": len(scene_times),
-                "fps": fps,
-            }
-
-        # Sort scene times
-        scene_times.sort()
-
-        # Find fuck frames: very short segments between scene changes
-        flash_frames = []
-        for i in range(len(scene_times) - 1):
-            gap = scene_times[i + 1] - scene_times[i]
-            frame_count = round(gap * fps)
-
-            if 0 < frame_count <= max_flash_frames:
-                flash_frames.append({
-                    "start": round(scene_times[i], 3),
-                    "end": round(scene_times[i + 1], 3),
-                    "duration": round(gap, 4),
-                    "frame_count": frame_count,
-                })
+        run_ffmpeg(cmd, timeout=timeout, progress=progress, pipes=[parser.pipe])
+        return flash_frames_for_channel(parser.result(), config)
+
+    except subprocess.TimeoutExpired:
+        return {"status": "error", "message": "Analyse-Timeout (>5min)"}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+def scene_threshold(configs):
+    """Lowest scene threshold of the given channel configs — lower = more sensitive."""
+    return min(c.get('scene_threshold', 0.35) for c in configs)
+
+
+def scene_filter(threshold, pipe):
+    """Build the select chain that writes every scene change and its score to pipe."""
+    return (f"select='gt(scene,{threshold})',"
+            f"metadata=mode=print:key={SCENE_SCORE_KEY}:{pipe.filter_option()}")
+
+
+def flash_frames_for_channel(raw, config):
+    """
+    Find the fuck frames among the scene changes above the channel's threshold.
+
+    select keeps a frame if its score exceeds the threshold, so filtering the
+    scene changes of a more sensitive run by score gives exactly the cuts a
+    run at the channel's own threshold would have found.
+    """
+    if raw.get("status") == "error":
+        return raw
+    threshold = config.get('scene_threshold', 0.35)
+    scene_times = [t for t, score in raw["scene_changes"] if score > threshold]
+    return _flash_frames(scene_times, raw["fps"], raw["max_flash_frames"])
+
+
+class SceneChangeParser:
+    """Collects scene change timestamps and scores from the metadata pipe."""
+
+    log_filter = None
+
+    def __init__(self, fps, max_flash_frames=5):
+        self.fps = fps
+        self.max_flash_frames = max_flash_frames
+        self.scene_changes = []
+        self.pipe = MetadataPipe(self.add_frame)
+
+    def add_frame(self, pts, values):
+        try:
+            score = float(values[SCENE_SCORE_KEY])
+        except (KeyError, ValueError):
+            return
+        self.scene_changes.append((pts, score))
+
+    def result(self):
+        """Raw result; flash_frames_for_channel turns it into the channel's findings."""
+        return {
+            "scene_changes": sorted(self.scene_changes),
+            "fps": self.fps,
+            "max_flash_frames": self.max_flash_frames,
+        }
+
+
+def _flash_frames(scene_times, fps, max_flash_frames):
+    scene_times = sorted(scene_times)
 
+    if len(scene_times) < 2:
         return {
-            "flash_frames": flash_frames,
-            "flash_count": len(flash_frames),
+            "flash_frames": [],
+            "flash_count": 0,
             "scene_changes": len(scene_times),
             "fps": fps,
-            "max_flash_frames": max_flash_frames,
         }
 
-    except subprocess.TimeoutExpired:
-        return {"status": "error", "message": "Analyse-Timeout (>5min)"}
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+    # Find fuck frames: very short segments between scene changes
+    flash_frames = []
+    for i in range(len(scene_times) - 1):
+        gap = scene_times[i + 1] - scene_times[i]
+        frame_count = round(gap * fps)
+
+        if 0 < frame_count <= max_flash_frames:
+            flash_frames.append({
+                "start": round(scene_times[i], 3),
+                "end": round(scene_times[i + 1], 3),
+                "duration": round(gap, 4),
+                "frame_count": frame_count,
+            })
+
+    return {
+        "flash_frames": flash_frames,
+        "flash_count": len(flash_frames),
+        "scene_changes": len(scene_times),
+        "fps": fps,
+        "max_flash_frames": max_flash_frames,
+    }
 
 
 def _get_framerate(filepath):
@@ -117,8 +161,8 @@ def _get_framerate(filepath):
         filepath
     ]
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-        rate_str = result.stdout.strip()
+        _, stdout, _ = run_capture(cmd, timeout=10)
+        rate_str = stdout.strip()
         if '/' in rate_str:
             num, den = rate_str.split('/')
             num, den = float(num), float(den)
@@ -0,0 +1,50 @@
+"""
+Luma-only analysis frames for the pixel detectors.
+
+blackdetect, freezedetect and the scene score only need the brightness
+structure of a frame, not its chroma or its full resolution. The fused video
+pass therefore converts the decoded video to an 8-bit luma plane scaled to a
+fixed analysis width per detector (one swscale step, shared by all detectors
+with the same width) instead of feeding them e.g. 4K 10-bit 4:2:2 frames.
+Sources narrower than the analysis width are not upscaled.
+
+Analysis widths and tolerances (verdicts compared with full-resolution runs
+in the source pixel format):
+
+- black_frames, 480 px: pix_th is relative to the luma range and pic_th is
+  an area ratio, so both carry over unchanged; blackdetect only ever looked
+  at the luma plane. Interval boundaries stay on the same frames; only
+  frames whose non-black area is below ~0.2% of the picture (a few pixels
+  of text at 480 px) can flip, which moves a boundary by at most one frame
+  during fades.
+- media_offline, 640 px: freezedetect compares consecutive frames; area
+  scaling averages grain, so the mean frame difference of a noisy still
+  drops and it is detected as frozen at least as reliably. Threshold
+  n=0.003 is unchanged; motion below one source pixel per frame over the
+  whole freeze duration (2 s) can additionally count as frozen.
+- fuck_frames, 480 px: the scene score is a normalized mean absolute
+  difference, dominated by large-scale content at a cut, so hard cuts and
+  flash frames stay well above the 0.35 threshold. Cuts between two
+  near-identical shots that only differ in fine texture can fall below it.
+- noise: stays at the source resolution and pixel format. TOUT counts
+  single-line outliers, which downscaling averages away, and signalstats
+  reads high-bit-depth YUV (TOUT uses the luma plane) without a
+  conversion. Reduced accuracy levels do not scale it either.
+
+tests/test_luma.py checks these bounds against full-size runs on the
+benchmark media (black runs, freezes, flashes, line dropouts, a fade
+through black): interval boundaries within one frame, the same cuts and
+the same noise verdicts. Run it when changing a width. Reduced accuracy levels
+(accuracy.py) cap these widths further, except the source resolution of noise.
+"""
+
+
+def luma_filter(width, gray=True):
+    """Filter chain producing the analysis frames for a width (None: source frames as decoded).
+
+    Without gray the frames keep their pixel format and are only scaled.
+    """
+    if width is None:
+        return ''
+    scale = f"scale=w='min({width},iw)':h=-2:flags=area"
+    return f"{scale},format=gray" if gray else scale
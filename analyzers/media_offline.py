@@ -1,9 +1,31 @@
 import re
 import subprocess
 
+from analyzers.ffmpeg_runner import run_ffmpeg
 
-def detect_media_offline(filepath, config, timeout=600):
-    frozen = _detect_frozen_frames(filepath, timeout=timeout)
+# Shortest freeze reported
+FREEZE_MIN_DURATION = 2
+
+
+def freezedetect_filter(min_duration=FREEZE_MIN_DURATION):
+    return f'freezedetect=n=0.003:d={min_duration}'
+
+
+FREEZEDETECT_FILTER = freezedetect_filter()
+# Luma analysis width in the fused video pass (see luma.py)
+ANALYSIS_WIDTH = 640
+
+_START_PATTERN = re.compile(r'freeze_start:\s*([\d.]+)')
+_END_PATTERN = re.compile(r'freeze_end:\s*([\d.]+)')
+_DUR_PATTERN = re.compile(r'freeze_duration:\s*([\d.]+)')
+
+
+def detect_media_offline(filepath, config, timeout=600, progress=None):
+    frozen = _detect_frozen_frames(filepath, timeout=timeout, progress=progress)
+    return _offline_result(frozen)
+
+
+def _offline_result(frozen):
     return {
         "frozen_intervals": frozen.get("intervals", []),
         "frozen_count": frozen.get("count", 0),
@@ -11,50 +33,60 @@ def detect_media_offline(filepath, config, timeout=600):
     }
 
 
-def _detect_frozen_frames(filepath, timeout=600):
+def _detect_frozen_frames(filepath, timeout=600, progress=None):
     cmd = [
         'ffmpeg',
         '-i', filepath,
-        '-vf', 'freezedetect=n=0.003:d=2',
+        '-vf', FREEZEDETECT_FILTER,
         '-an',
         '-f', 'null',
         '-'
     ]
+    parser = FrozenFrameParser()
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        run_ffmpeg(cmd, parser.feed, timeout=timeout, progress=progress)
     except subprocess.TimeoutExpired:
         return {"status": "error", "message": "Freeze detection timed out", "intervals": [], "count": 0, "total_duration": 0}
+    return parser.frozen()
+
+
+class FrozenFrameParser:
+    """Collects freezedetect intervals from ffmpeg log lines."""
 
-    start_pattern = re.compile(r'freeze_start:\s*([\d.]+)')
-    end_pattern = re.compile(r'freeze_end:\s*([\d.]+)')
-    dur_pattern = re.compile(r'freeze_duration:\s*([\d.]+)')
+    log_filter = 'freezedetect'
+    pipe = None
 
-    starts = []
-    ends = []
-    durations = []
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.durations = []
 
-    for line in result.stderr.splitlines():
-        sm = start_pattern.search(line)
+    def feed(self, line):
+        sm = _START_PATTERN.search(line)
         if sm:
-            starts.append(float(sm.group(1)))
-        em = end_pattern.search(line)
+            self.starts.append(float(sm.group(1)))
+        em = _END_PATTERN.search(line)
         if em:
-            ends.append(float(em.group(1)))
-        dm = dur_pattern.search(line)
+            self.ends.append(float(em.group(1)))
+        dm = _DUR_PATTERN.search(line)
         if dm:
-            durations.append(float(dm.group(1)))
+            self.durations.append(float(dm.group(1)))
 
-    intervals = []
-    for i in range(min(len(starts), len(ends), len(durations))):
-        intervals.append({
-            "start": starts[i],
-            "end": ends[i],
-            "duration": durations[i],
-        })
+    def frozen(self):
+        intervals = []
+        for i in range(min(len(self.starts), len(self.ends), len(self.durations))):
+            intervals.append({
+                "start": self.starts[i],
+                "end": self.ends[i],
+                "duration": self.durations[i],
+            })
 
-    total = sum(iv['duration'] for iv in intervals)
-    return {
-        "intervals": intervals,
-        "count": len(intervals),
-        "total_duration": round(total, 2),
-    }
+        total = sum(iv['duration'] for iv in intervals)
+        return {
+            "intervals": intervals,
+            "count": len(intervals),
+            "total_duration": round(total, 2),
+        }
+
+    def result(self):
+        return _offline_result(self.frozen())
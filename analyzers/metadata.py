@@ -1,6 +1,7 @@
 import json
 import os
-import subprocess
+
+from analyzers.ffmpeg_runner import run_capture
 
 
 def extract_metadata(filepath, original_filename=None):
@@ -12,11 +13,11 @@ def extract_metadata(filepath, original_filename=None):
         '-show_streams',
         filepath
     ]
-    result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-    if result.returncode != 0:
-        return {"status": "error", "message": f"ffprobe failed: {result.stderr[:200]}"}
+    returncode, stdout, stderr = run_capture(cmd, timeout=30)
+    if returncode != 0:
+        return {"status": "error", "message": f"ffprobe failed: {stderr[:200]}"}
 
-    data = json.loads(result.stdout)
+    data = json.loads(stdout)
     fmt = data.get('format', {})
     streams = data.get('streams', [])
 
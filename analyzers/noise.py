@@ -1,94 +1,121 @@
-import re
 import subprocess
+from array import array
 
+import numpy as np
 
-def detect_noise(filepath, config, timeout=600):
+from analyzers.ffmpeg_runner import MetadataPipe, run_ffmpeg
+from analyzers.series import as_float32, as_float64, find_runs, run_means
+
+TOUT_KEY = 'lavfi.signalstats.TOUT'
+# TOUT counts single-pixel outliers: analyzed at source resolution (see luma.py)
+ANALYSIS_WIDTH = None
+
+
+def detect_noise(filepath, config, timeout=600, progress=None):
+    parser = NoiseParser([config])
     cmd = [
         'ffmpeg',
         '-i', filepath,
-        '-vf', 'signalstats=stat=tout,metadata=mode=print',
+        '-vf', noise_filter(parser.pipe),
         '-an',
         '-f', 'null',
         '-'
     ]
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        run_ffmpeg(cmd, timeout=timeout, progress=progress, pipes=[parser.pipe])
     except subprocess.TimeoutExpired:
         return {"status": "error", "message": "Noise analysis timed out"}
+    return noise_for_channel(parser.result(), config)
 
-    tout_pattern = re.compile(r'TOUT=([\d.]+)')
-    pts_pattern = re.compile(r'pts_time:([\d.]+)')
 
-    tout_values = []
-    timestamps = []
-    current_pts = 0.0
+def noise_filter(pipe):
+    """signalstats chain that writes the per-frame TOUT value with its pts to pipe."""
+    return f'signalstats=stat=tout,metadata=mode=print:key={TOUT_KEY}:{pipe.filter_option()}'
 
-    for line in result.stderr.splitlines():
-        pts_match = pts_pattern.search(line)
-        if pts_match:
-            current_pts = float(pts_match.group(1))
-        tout_match = tout_pattern.search(line)
-        if tout_match:
-            tout_values.append(float(tout_match.group(1)))
-            timestamps.append(current_pts)
 
-    if not tout_values:
-        return {
-            "avg_tout": 0,
-            "max_tout": 0,
-            "noisy_frame_count": 0,
-            "total_frames": 0,
-            "noisy_percentage": 0,
-            "noisy_segments": [],
-        }
+def noise_thresholds(configs):
+    """Distinct TOUT thresholds of the given channel configs."""
+    return sorted({c.get('noise_threshold_tout', 0.10) for c in configs})
 
+
+def noise_for_channel(raw, config):
+    """Pick the channel's threshold variant out of a raw NoiseParser result."""
+    if raw.get("status") == "error":
+        return raw
     threshold = config.get('noise_threshold_tout', 0.10)
-    avg_tout = sum(tout_values) / len(tout_values)
-    max_tout = max(tout_values)
-    noisy_count = sum(1 for v in tout_values if v > threshold)
+    result = {k: v for k, v in raw.items() if k != "by_threshold"}
+    result.update(raw["by_threshold"][str(threshold)])
+    return result
+
+
+class NoiseParser:
+    """
+    Collects the per-frame signalstats TOUT values from the metadata pipe.
+
+    The series is kept as compact float32 values next to the exact pts of
+    each frame; all statistics are computed vectorized at the end, once per
+    TOUT threshold of the given channel configs (see noise_for_channel).
+    """
+
+    log_filter = None
 
-    noisy_segments = _find_noisy_segments(tout_values, timestamps, threshold)
+    def __init__(self, configs):
+        self.thresholds = noise_thresholds(configs)
+        self.tout_values = array('f')
+        self.timestamps = array('d')
+        self.pipe = MetadataPipe(self.add_frame)
 
-    return {
-        "avg_tout": round(avg_tout, 4),
-        "max_tout": round(max_tout, 4),
-        "noisy_frame_count": noisy_count,
-        "total_frames": len(tout_values),
-        "noisy_percentage": round(noisy_count / len(tout_values) * 100, 2),
-        "noisy_segments": noisy_segments,
-    }
+    def add_frame(self, pts, values):
+        try:
+            value = float(values[TOUT_KEY])
+        except (KeyError, ValueError):
+            return
+        self.tout_values.append(value)
+        self.timestamps.append(pts)
+
+    def result(self):
+        if not self.tout_values:
+            empty = {"noisy_frame_count": 0, "noisy_percentage": 0, "noisy_segments": []}
+            return {
+                "avg_tout": 0,
+                "max_tout": 0,
+                "total_frames": 0,
+                "by_threshold": {str(t): dict(empty) for t in self.thresholds},
+            }
+
+        tout_values = as_float32(self.tout_values)
+        timestamps = as_float64(self.timestamps)
+        total = len(tout_values)
+
+        by_threshold = {}
+        for threshold in self.thresholds:
+            noisy_count = int(np.count_nonzero(tout_values > threshold))
+            by_threshold[str(threshold)] = {
+                "noisy_frame_count": noisy_count,
+                "noisy_percentage": round(noisy_count / total * 100, 2),
+                "noisy_segments": _find_noisy_segments(tout_values, timestamps, threshold),
+            }
+
+        return {
+            "avg_tout": round(float(tout_values.mean(dtype=np.float64)), 4),
+            "max_tout": round(float(tout_values.max()), 4),
+            "total_frames": total,
+            "by_threshold": by_threshold,
+        }
 
 
 def _find_noisy_segments(tout_values, timestamps, threshold, min_frames=5):
-    segments = []
-    in_segment = False
-    seg_start = 0
-    seg_values = []
-
-    for i, val in enumerate(tout_values):
-        if val > threshold:
-            if not in_segment:
-                in_segment = True
-                seg_start = i
-                seg_values = []
-            seg_values.append(val)
-        else:
-            if in_segment and len(seg_values) >= min_frames:
-                segments.append({
-                    "start": round(timestamps[seg_start], 2) if seg_start < len(timestamps) else 0,
-                    "end": round(timestamps[i - 1], 2) if (i - 1) < len(timestamps) else 0,
-                    "avg_tout": round(sum(seg_values) / len(seg_values), 4),
-                    "frames": len(seg_values),
-                })
-            in_segment = False
-            seg_values = []
-
-    if in_segment and len(seg_values) >= min_frames:
-        segments.append({
-            "start": round(timestamps[seg_start], 2) if seg_start < len(timestamps) else 0,
-            "end": round(timestamps[-1], 2) if timestamps else 0,
-            "avg_tout": round(sum(seg_values) / len(seg_values), 4),
-            "frames": len(seg_values),
-        })
-
-    return segments
+    tout_values = as_float32(tout_values)
+    timestamps = as_float64(timestamps)
+    starts, ends = find_runs(tout_values > threshold, min_length=min_frames)
+    means = run_means(tout_values, starts, ends)
+
+    return [
+        {
+            "start": round(float(timestamps[s]), 2),
+            "end": round(float(timestamps[e]), 2),
+            "avg_tout": round(float(m), 4),
+            "frames": int(e - s + 1),
+        }
+        for s, e, m in zip(starts, ends, means)
+    ]
@@ -1,17 +1,12 @@
-from config import PASS, WARN, FAIL
+from config import CHANNEL_CONFIGS, PASS, WARN, FAIL
+from analyzers.video_pass import channel_result
 
 
 def run_quality_checks(metadata, black_frames, media_offline,
                        noise_results, loudness, clipping, fuck_frames, config,
                        enabled_steps=None):
-    checks = []
-
     # Metadata-based checks always run
-    checks.append(_check_resolution(metadata, config))
-    checks.append(_check_bitrate(metadata, config))
-    checks.append(_check_framerate(metadata, config))
-    checks.append(_check_audio_sample_rate(metadata, config))
-    checks.append(_check_audio_channels(metadata, config))
+    checks = run_metadata_checks(metadata, config)
 
     # Audio analysis checks
     if enabled_steps is None or "loudness" in enabled_steps:
@@ -37,6 +32,48 @@ def run_quality_checks(metadata, black_frames, media_offline,
     return checks
 
 
+def run_metadata_checks(metadata, config):
+    """Checks that only need the container header (also run early on streaming uploads)."""
+    return [
+        _check_resolution(metadata, config),
+        _check_bitrate(metadata, config),
+        _check_framerate(metadata, config),
+        _check_audio_sample_rate(metadata, config),
+        _check_audio_channels(metadata, config),
+    ]
+
+
+def score_channel(raw, channel):
+    """
+    Run the quality checks for one channel on the raw measurements of a job.
+
+    Returns:
+        dict with channel, channel_label, checks, overall
+    """
+    config = CHANNEL_CONFIGS[channel]
+    video = {k: channel_result(k, v, config) for k, v in raw["video"].items()}
+    audio = raw["audio"]
+
+    black_frames = video.get("black_frames", {"intervals": [], "total_black_duration": 0, "count": 0})
+    media_offline = video.get("media_offline", {"frozen_intervals": [], "frozen_count": 0, "total_frozen_duration": 0})
+    noise_results = video.get("noise", {"avg_tout": 0, "max_tout": 0, "noisy_frame_count": 0, "total_frames": 0, "noisy_percentage": 0, "noisy_segments": []})
+    fuck_frames = video.get("fuck_frames", {"flash_frames": [], "flash_count": 0})
+    loudness = audio.get("loudness", {"status": "error", "message": "Kein Audio-Stream"})
+    clipping = audio.get("clipping", {"status": "error", "message": "Kein Audio-Stream"})
+
+    checks = run_quality_checks(
+        raw["metadata"], black_frames, media_offline,
+        noise_results, loudness, clipping, fuck_frames, config,
+        enabled_steps=set(raw["enabled_steps"])
+    )
+    return {
+        "channel": channel,
+        "channel_label": config["label"],
+        "checks": checks,
+        "overall": aggregate_results(checks),
+    }
+
+
 def aggregate_results(checks):
     statuses = [c['status'] for c in checks]
     if FAIL in statuses:
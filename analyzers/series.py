@@ -0,0 +1,54 @@
+"""
+Vectorized helpers for per-frame measurement series.
+
+The analyzers collect one value per frame (TOUT, audio peak level, ...).
+These helpers find runs of frames matching a condition with NumPy instead
+of walking the series frame by frame in Python.
+"""
+
+import numpy as np
+
+
+def as_float32(values):
+    """View a compact array('f') buffer (or any sequence) as a float32 NumPy array."""
+    if getattr(values, 'typecode', None) == 'f':
+        return np.frombuffer(values, dtype=np.float32)
+    return np.asarray(values, dtype=np.float32)
+
+
+def as_float64(values):
+    """View an array('d') buffer (or any sequence) as a float64 NumPy array."""
+    if getattr(values, 'typecode', None) == 'd':
+        return np.frombuffer(values, dtype=np.float64)
+    return np.asarray(values, dtype=np.float64)
+
+
+def find_runs(mask, min_length=1):
+    """
+    Find runs of consecutive True values in a boolean array.
+
+    Returns:
+        (starts, ends) index arrays; ends are inclusive
+    """
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    edges = np.diff(padded)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    if min_length > 1:
+        keep = (ends - starts + 1) >= min_length
+        starts, ends = starts[keep], ends[keep]
+    return starts, ends
+
+
+def run_means(values, starts, ends):
+    """Mean of values over each run, accumulated in float64."""
+    csum = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    return (csum[ends + 1] - csum[starts]) / (ends - starts + 1)
+
+
+def run_maxima(values, mask, starts):
+    """Maximum of the masked values within each run starting at starts."""
+    if len(starts) == 0:
+        return np.empty(0, dtype=values.dtype)
+    masked = np.where(mask, values, -np.inf)
+    return np.maximum.reduceat(masked, starts)
@@ -0,0 +1,383 @@
+"""
+Fused video pass — runs every enabled video detector on a single decode.
+
+Instead of decoding the file once per detector (blackdetect, freezedetect,
+signalstats, scene detection), one ffmpeg process decodes the first video
+stream, fans the frames out with `split` and feeds one branch per detector.
+Each branch ends in its own null output; the log lines (and, for per-frame
+values, the metadata pipes) of the branches are streamed to the individual
+analyzer parsers.
+
+The results are raw measurements covering a set of channel configs: the
+channel-dependent detector settings (noise threshold, scene threshold) are
+applied afterwards by channel_result, so one pass can be scored against
+every channel profile exactly.
+
+The detectors get luma frames at their own analysis width (see luma.py):
+the decoded video is split once per width, scaled and converted once per
+width and split again to the detectors sharing it. Reduced accuracy levels
+(see accuracy.py) cap the widths and decimate the branches that tolerate it.
+
+Long files are cut into time shards (see shard_ranges), each decoded by its
+own ffmpeg process so one job can use more than the few cores a single
+decode keeps busy. A shard seeks accurately to a little before its range
+(-ss before -i) and reads a little past it; -copyts -start_at_zero keeps the
+timestamps of a single pass. The shard results are merged into exactly
+what one pass over the whole file reports:
+
+- noise and scene changes are per-frame values; every frame belongs to the
+  shard whose range holds its pts. TOUT is computed within one frame, the
+  scene score against the previous frame, which the lead-in decodes.
+- black and freeze intervals are detected with no minimum duration from the
+  shard start on (trim) and past its end, then joined where the last
+  interval of one shard overlaps the first of the next, and filtered by the
+  minimum duration afterwards. blackdetect decides per frame, so the joined
+  intervals are exact. freezedetect compares every frame with the first
+  frame of the freeze, which a shard cannot see if the freeze started in an
+  earlier one: stills are exact, a freeze that slowly drifts towards the
+  noise tolerance across a shard boundary may end a few frames apart.
+
+Sharding needs a seekable input and every frame, so streaming uploads and
+accuracy levels that decimate frames run as one pass.
+"""
+
+import contextvars
+import math
+import subprocess
+import threading
+
+import numpy as np
+
+from analyzers import black_frames, fuck_frames, media_offline, noise
+from analyzers.black_frames import BLACK_MIN_DURATION, BlackFrameParser, blackdetect_filter
+from analyzers.media_offline import FREEZE_MIN_DURATION, FrozenFrameParser, freezedetect_filter
+from analyzers.noise import noise_filter, noise_for_channel, noise_thresholds, NoiseParser
+from analyzers.fuck_frames import (flash_frames_for_channel, scene_filter, scene_threshold,
+                                   SceneChangeParser, _get_framerate)
+from analyzers.ffmpeg_runner import FileInput, LineRouter, run_ffmpeg
+from analyzers.accuracy import (ACCURACY_LEVELS, DEFAULT_ACCURACY, analysis_width, branch_prefilter,
+                                video_input_args)
+from analyzers.luma import luma_filter
+from analyzers.series import as_float32, as_float64
+
+VIDEO_STEPS = ("black_frames", "media_offline", "noise", "fuck_frames")
+
+# Luma analysis width per detector (None: source resolution), see luma.py
+ANALYSIS_WIDTHS = {
+    "black_frames": black_frames.ANALYSIS_WIDTH,
+    "media_offline": media_offline.ANALYSIS_WIDTH,
+    "noise": noise.ANALYSIS_WIDTH,
+    "fuck_frames": fuck_frames.ANALYSIS_WIDTH,
+}
+
+# Detectors whose frames keep the source pixel format (only scaled), see luma.py
+SOURCE_FORMAT_STEPS = ("noise",)
+
+# Steps reporting intervals that are joined across shard boundaries
+INTERVAL_STEPS = ("black_frames", "media_offline")
+
+# Shortest time range worth its own decode
+SHARD_MIN_DURATION = 600
+# Decoded before and after a shard's range: the previous frame for the scene
+# score and the frames that show whether an interval continues in the next shard
+SHARD_MARGIN = 1.0
+
+
+def run_video_pass(filepath, configs, steps, timeout=600, threads=None, progress=None, source=None,
+                   accuracy=DEFAULT_ACCURACY, duration=None, max_shards=1):
+    """
+    Run the enabled video detectors in one ffmpeg decode (or one per time shard).
+
+    Args:
+        filepath: Path to the video file
+        configs: Channel config dicts the raw results must cover
+        steps: Iterable of step keys to run (subset of VIDEO_STEPS)
+        timeout: Timeout for the whole pass in seconds
+        threads: Decoder thread limit (None = ffmpeg default), shared by the shards
+        progress: Optional progress(out_time, speed) callback
+        source: Input object (default: FileInput(filepath))
+        accuracy: Accuracy level key (see accuracy.py)
+        duration: Media duration in seconds, needed for sharding
+        max_shards: Upper limit for the number of parallel shards
+
+    Returns:
+        dict mapping each requested step key to its raw analyzer result
+    """
+    results = {}
+    step_keys = [s for s in VIDEO_STEPS if s in steps]
+    source = source or FileInput(filepath)
+    ranges = shard_ranges(duration, max_shards) if _shardable(source, accuracy) else [(0, math.inf)]
+
+    fps = None
+    if "fuck_frames" in step_keys or len(ranges) > 1:
+        fps = _get_framerate(filepath)
+        if fps <= 0:
+            ranges = [(0, math.inf)]
+    if "fuck_frames" in step_keys and fps <= 0:
+        results["fuck_frames"] = {"status": "error", "message": "Framerate konnte nicht ermittelt werden"}
+        step_keys.remove("fuck_frames")
+
+    if not step_keys:
+        return results
+
+    if len(ranges) == 1:
+        branches = _branches(step_keys, configs, fps, accuracy)
+        if not _run_branches(branches, source, accuracy, timeout, threads, progress):
+            return _timed_out(results, step_keys)
+        for step_key, _, parser in branches:
+            results[step_key] = parser.result()
+        return results
+
+    shard_threads = max(1, threads // len(ranges)) if threads else None
+    shard_progress = _ShardProgress(progress, len(ranges)) if progress else None
+    shards = [_branches(step_keys, configs, fps, accuracy, shard) for shard in ranges]
+    outcomes = [None] * len(ranges)
+
+    def run_shard(k):
+        try:
+            outcomes[k] = _run_branches(shards[k], FileInput(filepath), accuracy, timeout, shard_threads,
+                                        shard_progress.reporter(k) if shard_progress else None,
+                                        shard=ranges[k])
+        except Exception as e:
+            outcomes[k] = e
+
+    # Shard threads inherit the caller's context (the job trace, see tracing.py)
+    workers = [threading.Thread(target=contextvars.copy_context().run, args=(run_shard, k),
+                                name=f"video shard {k + 1}", daemon=True) for k in range(len(ranges))]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    for outcome in outcomes:
+        if isinstance(outcome, Exception):
+            raise outcome
+    if not all(outcomes):
+        return _timed_out(results, step_keys)
+
+    for i, step_key in enumerate(step_keys):
+        results[step_key] = _merge_shards(step_key, [branches[i][2] for branches in shards], ranges,
+                                          configs, fps)
+    return results
+
+
+def shard_ranges(duration, max_shards):
+    """
+    Time ranges [start, end) to analyze in parallel; the last one is open-ended.
+
+    Every shard covers at least SHARD_MIN_DURATION seconds.
+    """
+    if not duration or max_shards <= 1:
+        return [(0, math.inf)]
+    count = int(min(max_shards, duration // SHARD_MIN_DURATION))
+    if count <= 1:
+        return [(0, math.inf)]
+    bounds = [round(duration * k / count, 3) for k in range(count)]
+    return list(zip(bounds, bounds[1:] + [math.inf]))
+
+
+def _shardable(source, accuracy):
+    """Seeking needs a file; merging needs every frame, so no decimated levels."""
+    level = ACCURACY_LEVELS[accuracy]
+    return isinstance(source, FileInput) and not level["fps"] and not level["keyframes_only"]
+
+
+def _timed_out(results, step_keys):
+    for step_key in step_keys:
+        results[step_key] = {"status": "error", "message": "Video analysis timed out"}
+    return results
+
+
+def _branches(step_keys, configs, fps, accuracy, shard=None):
+    """
+    One (step_key, filter chain, parser) per step.
+
+    For a shard, the interval detectors report intervals of any length from
+    the shard start on; _merge_shards applies the minimum durations.
+    """
+    branches = []
+    for step_key in step_keys:
+        if step_key == "black_frames":
+            parser = BlackFrameParser()
+            chain = blackdetect_filter(0) if shard else blackdetect_filter()
+        elif step_key == "media_offline":
+            parser = FrozenFrameParser()
+            chain = freezedetect_filter(0) if shard else freezedetect_filter()
+        elif step_key == "noise":
+            parser = NoiseParser(configs)
+            chain = noise_filter(parser.pipe)
+        else:
+            parser = SceneChangeParser(fps)
+            chain = scene_filter(scene_threshold(configs), parser.pipe)
+        if shard and shard[0] > 0 and step_key in INTERVAL_STEPS:
+            chain = f'trim=start={shard[0]},{chain}'
+        branches.append((step_key, branch_prefilter(accuracy, step_key) + chain, parser))
+    return branches
+
+
+def _run_branches(branches, source, accuracy, timeout, threads, progress, shard=None):
+    """Run the branches in one ffmpeg process. Returns False on timeout."""
+    widths = [analysis_width(accuracy, ANALYSIS_WIDTHS[step_key]) for step_key, _, _ in branches]
+
+    # -vsync vfr: scene detection only needs the selected frames, never duplicates
+    cmd = ['ffmpeg', '-vsync', 'vfr']
+    if threads:
+        cmd.extend(['-threads', str(threads)])
+    cmd.extend(video_input_args(accuracy))
+    if shard:
+        # Accurate seek to the lead-in, keeping the timestamps of a single pass
+        seek = max(0, shard[0] - SHARD_MARGIN)
+        if seek > 0:
+            cmd.extend(['-ss', str(seek)])
+        if shard[1] != math.inf:
+            cmd.extend(['-t', str(round(shard[1] + SHARD_MARGIN - seek, 3))])
+        cmd.extend(['-copyts', '-start_at_zero'])
+    cmd.extend(source.args())
+    cmd.extend(['-filter_complex', build_video_graph(branches, widths)])
+    for i in range(len(branches)):
+        cmd.extend(['-map', f'[out{i}]', '-f', 'null', '-'])
+
+    parsers = [parser for _, _, parser in branches]
+    router = LineRouter({p.log_filter: p for p in parsers if p.log_filter})
+    try:
+        run_ffmpeg(cmd, router.feed, timeout=timeout, progress=progress,
+                   pipes=[p.pipe for p in parsers if p.pipe], stdin=source.open())
+    except subprocess.TimeoutExpired:
+        return False
+    return True
+
+
+class _ShardProgress:
+    """Sums the progress of parallel shards into one progress(out_time, speed) callback."""
+
+    def __init__(self, progress, count):
+        self.progress = progress
+        self.lock = threading.Lock()
+        self.first = [None] * count
+        self.done = [0.0] * count
+        self.speeds = [None] * count
+
+    def reporter(self, k):
+        def report(out_time, speed):
+            with self.lock:
+                # Measured from the first report, the lead-in is not part of the file time
+                if self.first[k] is None:
+                    self.first[k] = out_time
+                self.done[k] = out_time - self.first[k]
+                self.speeds[k] = speed
+                done = sum(self.done)
+                speeds = [s for s in self.speeds if s is not None]
+            self.progress(done, sum(speeds) if speeds else None)
+        return report
+
+
+def _merge_shards(step_key, parsers, ranges, configs, fps):
+    """Combine the parsers of one step across shards into the result of a single pass."""
+    if step_key == "noise":
+        merged = NoiseParser(configs)
+        for parser, (start, end) in zip(parsers, ranges):
+            timestamps = as_float64(parser.timestamps)
+            own = (timestamps >= start) & (timestamps < end)
+            merged.tout_values.frombytes(as_float32(parser.tout_values)[own].tobytes())
+            merged.timestamps.frombytes(timestamps[own].tobytes())
+        return merged.result()
+
+    if step_key == "fuck_frames":
+        merged = SceneChangeParser(fps)
+        for parser, (start, end) in zip(parsers, ranges):
+            merged.scene_changes.extend(c for c in parser.scene_changes if start <= c[0] < end)
+        return merged.result()
+
+    if step_key == "black_frames":
+        runs = _join_runs([parser.intervals for parser in parsers], ranges)
+        merged = BlackFrameParser()
+        merged.intervals = [r for r in runs if r["duration"] >= BLACK_MIN_DURATION]
+        return merged.result()
+
+    runs = _join_runs([_freeze_runs(parser) for parser in parsers], ranges)
+    merged = FrozenFrameParser()
+    for run in runs:
+        # The single pass reports a freeze once freeze_end - freeze_start reaches d;
+        # a freeze still running at the end of the file is not reported
+        if run["end"] != math.inf and run["duration"] >= FREEZE_MIN_DURATION - 1e-6:
+            merged.starts.append(run["start"])
+            merged.ends.append(run["end"])
+            merged.durations.append(run["duration"])
+    return merged.result()
+
+
+def _freeze_runs(parser):
+    """Freeze intervals of one shard; a freeze running into the end of the shard ends at infinity."""
+    runs = [{"start": start, "end": end, "duration": duration}
+            for start, end, duration in zip(parser.starts, parser.ends, parser.durations)]
+    if len(parser.starts) > len(runs):
+        runs.append({"start": parser.starts[len(runs)], "end": math.inf, "duration": math.inf})
+    return runs
+
+
+def _join_runs(shard_runs, ranges):
+    """
+    Join the intervals of consecutive shards.
+
+    Intervals starting after a shard's range belong to the next shard. The
+    last interval of a shard continues in the next one if that shard's first
+    interval starts before it ended (the shard saw SHARD_MARGIN past its
+    range): both describe the same frames there, so they are one interval.
+    """
+    merged = []
+    for k, (runs, (start, end)) in enumerate(zip(shard_runs, ranges)):
+        runs = [dict(r) for r in runs if r["start"] < end]
+        if merged and runs and merged[-1]["shard"] == k - 1:
+            last, first = merged[-1], runs[0]
+            if first["start"] < min(last["end"], start + SHARD_MARGIN):
+                runs.pop(0)
+                last["end"] = first["end"] if last["end"] == math.inf else max(last["end"], first["end"])
+                last["duration"] = (math.inf if last["end"] == math.inf
+                                    else round(last["end"] - last["start"], 6))
+                last["shard"] = k
+        for run in runs:
+            run["shard"] = k
+        merged.extend(runs)
+    for run in merged:
+        del run["shard"]
+    return merged
+
+
+def detector_params(step_key, configs, accuracy=DEFAULT_ACCURACY):
+    """Detector settings a step's raw result for the given channel configs depends on."""
+    params = {}
+    if step_key == "noise":
+        params["noise_thresholds"] = noise_thresholds(configs)
+    elif step_key == "fuck_frames":
+        params["scene_threshold"] = scene_threshold(configs)
+    if accuracy != DEFAULT_ACCURACY:
+        params["accuracy"] = accuracy
+    return params
+
+
+def channel_result(step_key, raw, config):
+    """Turn a raw step result into the result for one channel config."""
+    if step_key == "noise":
+        return noise_for_channel(raw, config)
+    if step_key == "fuck_frames":
+        return flash_frames_for_channel(raw, config)
+    return raw
+
+
+def build_video_graph(branches, widths):
+    """
+    Build the filter_complex string: split the video once per analysis width
+    (and pixel format), convert each group to its analysis frames once, then
+    one chain per detector.
+    """
+    groups = {}  # (analysis width, gray) -> indices of the branches using it
+    for i, ((step_key, _, _), width) in enumerate(zip(branches, widths)):
+        groups.setdefault((width, step_key not in SOURCE_FORMAT_STEPS), []).append(i)
+    group_labels = ''.join(f'[g{j}]' for j in range(len(groups)))
+    chains = [f'[0:v:0]split={len(groups)}{group_labels}']
+    for j, ((width, gray), members) in enumerate(groups.items()):
+        labels = ''.join(f'[in{i}]' for i in members)
+        prefix = luma_filter(width, gray)
+        chains.append(f'[g{j}]{prefix + "," if prefix else ""}split={len(members)}{labels}')
+    for i, (_, chain, _) in enumerate(branches):
+        chains.append(f'[in{i}]{chain}[out{i}]')
+    return ';'.join(chains)
@@ -6,10 +6,12 @@ Works reliably with any audio format ffmpeg supports, regardless of file size.
 import os
 import subprocess
 
+from analyzers.ffmpeg_runner import run_ffmpeg
+
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads')
 
 
-def generate_waveform(filepath, job_id, width=1600, height=240):
+def generate_waveform(filepath, job_id, width=1600, height=240, progress=None):
     """
     Generate a waveform PNG image from an audio/video file.
 
@@ -21,17 +23,18 @@ def generate_waveform(filepath, job_id, width=1600, height=240):
         job_id: Job ID for naming the output file
         width: Image width in pixels
         height: Image height in pixels
+        progress: Optional progress(out_time, speed) callback
 
     Returns:
         Path to the generated PNG file
     """
-    output_path = os.path.join(UPLOAD_FOLDER, f"waveform_{job_id}.png")
+    output_path = waveform_path(job_id)
 
     cmd = [
         'ffmpeg',
         '-i', filepath,
         '-filter_complex',
-        f'showwavespic=s={width}x{height}:colors=#6366f1|#818cf8:scale=sqrt:split_channels=0',
+        waveform_filter(width, height),
         '-frames:v', '1',
         '-y',
         output_path
@@ -45,15 +48,11 @@ def generate_waveform(filepath, job_id, width=1600, height=240):
     timeout = max(120, int(file_size_gb * 60) + 120)  # at least 2 min, +1 min per GB
 
     try:
-        result = subprocess.run(
-            cmd, capture_output=True, text=True, timeout=timeout
-        )
-        if result.returncode != 0:
+        returncode = run_ffmpeg(cmd, timeout=timeout, progress=progress)
+        if returncode != 0:
             # Try without split_channels (older ffmpeg versions)
             cmd[5] = f'showwavespic=s={width}x{height}:colors=#6366f1:scale=sqrt'
-            result = subprocess.run(
-                cmd, capture_output=True, text=True, timeout=timeout
-            )
+            run_ffmpeg(cmd, timeout=timeout, progress=progress)
 
         if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
             return output_path
@@ -64,3 +63,14 @@ def generate_waveform(filepath, job_id, width=1600, height=240):
         return None
     except Exception:
         return None
+
+
+def waveform_path(job_id):
+    """Path of the waveform PNG for a job; creates the folder (the CLI runs without app.py)."""
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    return os.path.join(UPLOAD_FOLDER, f"waveform_{job_id}.png")
+
+
+def waveform_filter(width=1600, height=240):
+    """showwavespic filter that renders the whole stream into one image."""
+    return f'showwavespic=s={width}x{height}:colors=#6366f1|#818cf8:scale=sqrt:split_channels=0'
@@ -1,36 +1,80 @@
+import errno
+import hashlib
 import json
+import math
 import os
 import re
+import shutil
 import subprocess
 import time
 import uuid
 import threading
 
-from flask import Flask, jsonify, render_template, request
+from flask import Flask, Response, jsonify, render_template, request, stream_with_context
 from flask_cors import CORS
 
-from config import CHANNEL_CONFIGS, MAX_CONTENT_LENGTH, UPLOAD_FOLDER
+from config import (ANALYSIS_THREADS, ANALYZE_ROOTS, CACHE_FOLDER, CHANNEL_CONFIGS, JOB_CPU_BUDGET, MAX_BATCH_FILES,
+                    MAX_CONCURRENT_JOBS, MAX_CONTENT_LENGTH, MAX_QUEUED_JOBS, MAX_STATUS_STREAMS, UPLOAD_CHUNK_SIZE,
+                    UPLOAD_FOLDER, VIDEO_SHARDS)
 from analyzers.metadata import extract_metadata
-from analyzers.black_frames import detect_black_frames
-from analyzers.media_offline import detect_media_offline
-from analyzers.noise import detect_noise
-from analyzers.audio_loudness import measure_loudness
-from analyzers.audio_clipping import detect_clipping
-from analyzers.fuck_frames import detect_fuck_frames
-from analyzers.waveform import generate_waveform
-from analyzers.quality_checks import run_quality_checks, aggregate_results
+from analyzers.video_pass import VIDEO_STEPS, channel_result, detector_params, run_video_pass
+from analyzers.audio_pass import AUDIO_STEPS, run_audio_pass
+from analyzers.ffmpeg_runner import FileInput, run_capture, running_processes
+from analyzers.accuracy import ACCURACY_LEVELS, DEFAULT_ACCURACY, accuracy_info, unsupported_steps
+from analyzers.waveform import waveform_path
+from analyzers.quality_checks import run_metadata_checks, aggregate_results, score_channel
+from scheduler import Task, run_tasks
+from batch_report import build_report, report_csv
+import estimator
+import job_store
+import metrics
+import result_cache
+import tracing
+from upload_stream import IDLE_TIMEOUT, UploadInput, moov_at_end, received_bytes
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 CORS(app, origins=["https://alexstoesslein.github.io", "http://127.0.0.1:5000", "http://localhost:5000"])
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-# In-memory job store
-jobs = {}
+os.makedirs(CACHE_FOLDER, exist_ok=True)
+
+# Jobs live in a SQLite store shared by all gunicorn workers (see job_store.py)
+job_store.init()
+# Seconds a finished job stays available after its result was fetched
+JOB_RETENTION = 300
+# Seconds a finished batch and its jobs stay available after it was fetched
+BATCH_RETENTION = 24 * 3600
+# Worker heartbeat; running jobs of a worker silent for ORPHAN_AFTER are re-run
+HEARTBEAT_INTERVAL = 5
+ORPHAN_AFTER = 30
+# Idle analysis threads look for queued jobs of other workers this often
+QUEUE_POLL_INTERVAL = 1
+# Wakes this worker's idle analysis threads when it queues a job
+work_available = threading.Event()
+# Chunk size bounds for chunked uploads; uploads idle this long are discarded
+MIN_UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_CHUNK_SIZE = 256 * 1024 * 1024
+UPLOAD_IDLE_TTL = 24 * 3600
+# A streaming upload's analysis starts once this much of the file has arrived
+UPLOAD_HEADER_BYTES = 8 * 1024 * 1024
+# Header triage of a streaming upload: attempts per job; an attempt not done after
+# TRIAGE_TIMEOUT (e.g. its worker died) counts as failed
+TRIAGE_ATTEMPTS = 3
+TRIAGE_TIMEOUT = 60
+# Status streams check their job this often and send a keepalive when idle
+STREAM_POLL_INTERVAL = 0.25
+STREAM_KEEPALIVE = 15
+# A stream ends after this many seconds and the browser reconnects, so a
+# forgotten tab does not hold a server thread for the whole analysis
+STREAM_MAX_DURATION = 300
+STREAM_RECONNECT_MS = 500
+# Each open stream holds a server thread; beyond MAX_STATUS_STREAMS clients poll
+stream_slots = threading.BoundedSemaphore(MAX_STATUS_STREAMS)
 
 # Time estimates per step (seconds per second of video duration)
-# These are rough multipliers: step_time ≈ factor * video_duration
+# These are rough multipliers: step_time ≈ factor * video_duration. They are the
+# fallback until the learned estimates (estimator.py) have data for a step.
 STEP_ESTIMATES = {
     "metadata":      {"factor": 0.01, "min": 1,  "label": "Metadaten werden extrahiert..."},
     "black_frames":  {"factor": 0.4,  "min": 3,  "label": "Schwarzbilder werden gesucht..."},
@@ -44,6 +88,23 @@ STEP_ESTIMATES = {
 
 STEP_ORDER = ["metadata", "black_frames", "media_offline", "noise", "loudness", "clipping", "fuck_frames", "checks"]
 
+# Scheduler tasks: which steps each task covers and what it has to wait for.
+# The video and audio passes only depend on the metadata and run side by side.
+TASK_STEPS = {
+    "metadata": ["metadata"],
+    "video": list(VIDEO_STEPS),
+    "audio": list(AUDIO_STEPS),
+    "checks": ["checks"],
+}
+TASK_DEPS = {
+    "metadata": [],
+    "video": ["metadata"],
+    "audio": ["metadata"],
+    "checks": ["video", "audio"],
+}
+# Decoder threads for the audio pass; the video pass gets the rest of the budget
+AUDIO_THREADS = 1
+
 
 def estimate_step_time(step_key, duration):
     """Estimate how long a step will take based on video duration."""
@@ -52,21 +113,56 @@ def estimate_step_time(step_key, duration):
 
 
 def estimate_total_time(duration, has_video=True, has_audio=True):
-    """Estimate total analysis time."""
-    total = 0
-    for step in STEP_ORDER:
-        if step in ("black_frames", "media_offline", "noise", "fuck_frames") and not has_video:
-            continue
-        if step in ("loudness", "clipping") and not has_audio:
-            continue
-        total += estimate_step_time(step, duration)
-    return total
-
-
-def run_analysis(job_id, filepath, channel, original_filename=None, enabled_steps=None):
-    """Run the full analysis pipeline in a background thread."""
-    job = jobs[job_id]
+    """Estimate total analysis time (video and audio pass overlap)."""
+    task_times = {}
+    for task_key, step_keys in TASK_STEPS.items():
+        total = 0
+        for step in step_keys:
+            if step in VIDEO_STEPS and not has_video:
+                continue
+            if step in AUDIO_STEPS and not has_audio:
+                continue
+            total += estimate_step_time(step, duration)
+        task_times[task_key] = total
+    return _critical_path(task_times)
+
+
+def _critical_path(task_times):
+    """Length of the longest dependency chain through TASK_DEPS."""
+    finish = {}
+
+    def finish_time(task_key):
+        if task_key not in finish:
+            start = max((finish_time(d) for d in TASK_DEPS[task_key]), default=0)
+            finish[task_key] = start + task_times.get(task_key, 0)
+        return finish[task_key]
+
+    return max((finish_time(k) for k in TASK_DEPS), default=0)
+
+
+def run_analysis(job_id, filepath, channel, original_filename=None, enabled_steps=None, content_hash=None,
+                 upload_id=None, in_place=False, accuracy=DEFAULT_ACCURACY):
+    """Run the full analysis pipeline in a background thread.
+
+    The raw measurements cover every channel profile and are kept in the
+    job, so /api/rescore can evaluate them for other channels. Steps whose
+    raw results are already cached for the file (computed with the same
+    detector parameters) are not run again; without a content_hash the file
+    is hashed first.
+
+    With an upload_id the file is a streaming upload that is still arriving:
+    the passes read it as it comes in (see upload_stream.py), the cache is
+    only consulted for the hash of the complete file afterwards.
+
+    Uploaded files are deleted at the end; a server-side file analyzed
+    in_place is only read. Reduced accuracy levels decode less (see
+    analyzers/accuracy.py); the level is part of the result. The steps and
+    subprocesses of the run are traced (see tracing.py).
+    """
     config = CHANNEL_CONFIGS[channel]
+    profiles = list(CHANNEL_CONFIGS.values())
+    # Freshly computed step results: step_key -> (params, result)
+    fresh = {}
 
     # If no enabled_steps specified, run all
     if enabled_steps is None:
@@ -76,180 +172,448 @@ def run_analysis(job_id, filepath, channel, original_filename=None, enabled_step
     # metadata and checks always run
     enabled_steps.add("metadata")
     enabled_steps.add("checks")
-
-    try:
-        # --- Step 1: Metadata ---
-        _start_step(job, "metadata")
-        metadata = extract_metadata(filepath, original_filename=original_filename)
-        _finish_step(job, "metadata")
+    # Steps the accuracy level cannot measure are left out (and reported)
+    skipped_steps = enabled_steps & set(unsupported_steps(accuracy))
+    enabled_steps -= skipped_steps
+
+    # Filled by the metadata task, read by the passes that depend on it
+    upload = UploadInput(upload_id, filepath) if upload_id else None
+    media = {"source": upload or FileInput(filepath)}
+
+    def metadata_task():
+        _start_step(job_id, "metadata")
+        if upload_id:
+            # The cache key needs the complete file, so a streaming upload is not looked up
+            media["cache_entry"] = None
+            metadata = _probe_upload(media, filepath, original_filename)
+            _finish_step(job_id, "metadata")
+        else:
+            # Chunked uploads arrive without a hash of the whole file
+            media["content_hash"] = content_hash or result_cache.file_hash(filepath)
+            media["cache_entry"] = cache_entry = result_cache.load_entry(media["content_hash"])
+            metrics.inc("qc_cache_requests_total", step="metadata", result="hit" if cache_entry else "miss")
+            if cache_entry:
+                metadata = dict(cache_entry["metadata"],
+                                filename=original_filename or os.path.basename(filepath))
+                _cached_step(job_id, "metadata")
+            else:
+                metadata = extract_metadata(filepath, original_filename=original_filename)
+                _finish_step(job_id, "metadata")
 
         if metadata.get('status') == 'error':
-            job["status"] = "error"
-            job["error"] = f"Metadaten-Extraktion fehlgeschlagen: {metadata.get('message')}"
-            return
+            raise AnalysisError(f"Metadaten-Extraktion fehlgeschlagen: {metadata.get('message')}")
 
-        has_video = metadata.get('video') is not None
-        has_audio = metadata.get('audio') is not None
-        duration = metadata.get('duration', 0)
+        media["has_video"] = metadata.get('video') is not None
+        media["has_audio"] = metadata.get('audio') is not None
+        media["duration"] = metadata.get('duration', 0)
+        media["resolution"] = metrics.resolution_class(metadata)
 
         # Calculate timeout for ffmpeg analyzers based on duration
         # At least 10 minutes, plus ~3x the media duration (for slow analysis)
-        analysis_timeout = max(600, int(duration * 3) + 120)
+        media["timeout"] = max(600, int(media["duration"] * 3) + 120)
 
-        # Generate waveform for audio-only files (or any file with audio)
-        if has_audio:
+        # Recalculate estimates now that we know the actual duration and streams
+        _recalculate_estimates(job_id, media["duration"], media["has_video"], media["has_audio"],
+                               ACCURACY_LEVELS[accuracy]["time_factor"],
+                               estimator.features(metadata, accuracy))
+        return metadata
+
+    # --- Fused video pass (one decode for all video detectors) ---
+    def video_task():
+        video_steps = [s for s in VIDEO_STEPS if media["has_video"] and s in enabled_steps]
+        video_results = _cached_results(media["cache_entry"], video_steps, profiles, accuracy)
+        run_steps = [s for s in video_steps if s not in video_results]
+        _count_cache_lookups(media, video_steps, video_results)
+        for step_key in VIDEO_STEPS:
+            if step_key in video_results:
+                _cached_step(job_id, step_key)
+            elif step_key in run_steps:
+                _start_step(job_id, step_key)
+            else:
+                _skip_step(job_id, step_key)
+        if run_steps:
+            pass_started = time.time()
+            computed = run_video_pass(filepath, profiles, run_steps,
+                                      timeout=media["timeout"], threads=video_threads,
+                                      progress=_progress_reporter(job_id, run_steps),
+                                      source=media["source"], accuracy=accuracy,
+                                      duration=media["duration"], max_shards=VIDEO_SHARDS)
+            _observe_realtime(media, "video_pass", time.time() - pass_started)
+            video_results.update(computed)
+            for step_key in run_steps:
+                fresh[_cache_step(step_key, accuracy)] = (detector_params(step_key, profiles, accuracy),
+                                                          computed[step_key])
+        _finish_steps(job_id, run_steps)
+        return video_results
+
+    # --- Fused audio pass (loudness, clipping and waveform) ---
+    def audio_task():
+        audio_steps = [s for s in AUDIO_STEPS if media["has_audio"] and s in enabled_steps]
+        audio_results = _cached_results(media["cache_entry"], audio_steps, profiles, accuracy)
+        run_steps = [s for s in audio_steps if s not in audio_results]
+        _count_cache_lookups(media, audio_steps, audio_results)
+        for step_key in AUDIO_STEPS:
+            if step_key in audio_results:
+                _cached_step(job_id, step_key)
+            elif step_key in run_steps:
+                _start_step(job_id, step_key)
+            else:
+                _skip_step(job_id, step_key)
+        cached_waveform = media["cache_entry"].get("waveform_path") if media["cache_entry"] else None
+        if media["has_audio"] and (run_steps or not cached_waveform):
+            # The waveform is rendered for any file with audio
+            pass_started = time.time()
+            computed = run_audio_pass(filepath, job_id, run_steps,
+                                      timeout=media["timeout"], threads=AUDIO_THREADS,
+                                      progress=_progress_reporter(job_id, run_steps),
+                                      source=media["source"], accuracy=accuracy)
+            _observe_realtime(media, "audio_pass", time.time() - pass_started)
+            audio_results.update(computed)
+            for step_key in run_steps:
+                fresh[_cache_step(step_key, accuracy)] = (detector_params(step_key, profiles, accuracy),
+                                                          computed[step_key])
+            if computed.get("waveform_path"):
+                fresh_waveform.append(computed["waveform_path"])
+        elif media["has_audio"]:
+            # Copy, since the job's waveform is deleted when the job expires
+            audio_results["waveform_path"] = waveform_path(job_id)
+            shutil.copyfile(cached_waveform, audio_results["waveform_path"])
+        _finish_steps(job_id, run_steps)
+        return audio_results
+
+    fresh_waveform = []
+    video_threads = max(1, JOB_CPU_BUDGET - AUDIO_THREADS)
+    tasks = [
+        Task("metadata", metadata_task),
+        Task("video", video_task, deps=TASK_DEPS["video"], cost=video_threads),
+        Task("audio", audio_task, deps=TASK_DEPS["audio"], cost=AUDIO_THREADS),
+    ]
+
+    trace_token = tracing.start(job_id)
+    try:
+        results = run_tasks(tasks, JOB_CPU_BUDGET)
+        metadata = results["metadata"]
+        video_results = results["video"]
+        audio_results = results["audio"]
+
+        if upload_id:
+            # The passes are through; finish the streaming upload's metadata and cache key
+            _wait_for_upload(upload)
+            if media["source"] is upload:
+                # The header metadata may lack what ffprobe reads from the end of the file
+                metadata = extract_metadata(filepath, original_filename=original_filename)
+            media["content_hash"] = result_cache.file_hash(filepath)
+
+        if fresh or fresh_waveform or not media["cache_entry"]:
             try:
-                waveform_path = generate_waveform(filepath, job_id)
-                job["waveform_path"] = waveform_path
-            except Exception:
-                job["waveform_path"] = None
+                result_cache.save_entry(media["content_hash"], metadata, fresh,
+                                        fresh_waveform[0] if fresh_waveform else None)
+            except OSError:
+                pass  # A failing cache must not fail the analysis
 
-        # Recalculate estimates now that we know the actual duration and streams
-        _recalculate_estimates(job, duration, has_video, has_audio)
+        raw = {
+            "metadata": metadata,
+            "video": video_results,
+            "audio": {k: v for k, v in audio_results.items() if k != "waveform_path"},
+            "enabled_steps": sorted(enabled_steps),
+            "accuracy": accuracy_info(accuracy, skipped_steps),
+        }
+        job_store.set_raw(job_id, raw)
+        clipping = audio_results.get("clipping", {})
+        wave = audio_results.get("waveform_path")
 
-        # --- Step 2: Black frames ---
-        if has_video and "black_frames" in enabled_steps:
-            _start_step(job, "black_frames")
-            black_frames = detect_black_frames(filepath, config, timeout=analysis_timeout)
-            _finish_step(job, "black_frames")
-        else:
-            _skip_step(job, "black_frames")
-            black_frames = {"intervals": [], "total_black_duration": 0, "count": 0}
-
-        # --- Step 3: Media offline ---
-        if has_video and "media_offline" in enabled_steps:
-            _start_step(job, "media_offline")
-            media_offline = detect_media_offline(filepath, config, timeout=analysis_timeout)
-            _finish_step(job, "media_offline")
-        else:
-            _skip_step(job, "media_offline")
-            media_offline = {"frozen_intervals": [], "frozen_count": 0, "total_frozen_duration": 0}
-
-        # --- Step 4: Noise ---
-        if has_video and "noise" in enabled_steps:
-            _start_step(job, "noise")
-            noise_results = detect_noise(filepath, config, timeout=analysis_timeout)
-            _finish_step(job, "noise")
-        else:
-            _skip_step(job, "noise")
-            noise_results = {"avg_tout": 0, "max_tout": 0, "noisy_frame_count": 0, "total_frames": 0, "noisy_percentage": 0, "noisy_segments": []}
-
-        # --- Step 5: Loudness ---
-        if has_audio and "loudness" in enabled_steps:
-            _start_step(job, "loudness")
-            loudness = measure_loudness(filepath, timeout=analysis_timeout)
-            _finish_step(job, "loudness")
-        else:
-            _skip_step(job, "loudness")
-            loudness = {"status": "error", "message": "Kein Audio-Stream"}
-
-        # --- Step 6: Clipping ---
-        if has_audio and "clipping" in enabled_steps:
-            _start_step(job, "clipping")
-            clipping = detect_clipping(filepath, duration=duration, timeout=analysis_timeout)
-            _finish_step(job, "clipping")
-        else:
-            _skip_step(job, "clipping")
-            clipping = {"status": "error", "message": "Kein Audio-Stream"}
-
-        # --- Step 6b: Fuck Frames ---
-        if has_video and "fuck_frames" in enabled_steps:
-            _start_step(job, "fuck_frames")
-            fuck_frames = detect_fuck_frames(filepath, config, timeout=analysis_timeout)
-            _finish_step(job, "fuck_frames")
-        else:
-            _skip_step(job, "fuck_frames")
-            fuck_frames = {"flash_frames": [], "flash_count": 0}
-
-        # --- Step 7: Quality checks ---
-        _start_step(job, "checks")
-        checks = run_quality_checks(
-            metadata, black_frames, media_offline,
-            noise_results, loudness, clipping, fuck_frames, config,
-            enabled_steps=enabled_steps
-        )
-        overall = aggregate_results(checks)
-        _finish_step(job, "checks")
+        # --- Quality checks (after all analyzers) ---
+        _start_step(job_id, "checks")
+        scored = score_channel(raw, channel)
+        _finish_step(job_id, "checks")
 
         # Done
-        job["status"] = "complete"
-        job["result"] = {
-            "status": "complete",
-            "channel": channel,
-            "channel_label": config["label"],
-            "metadata": metadata,
-            "checks": checks,
-            "overall": overall,
-            "has_waveform": job.get("waveform_path") is not None,
-            "clipping_segments": clipping.get("clipping_segments", []),
-            "loud_segments": clipping.get("loud_segments", []),
-        }
+        with job_store.edit(job_id) as job:
+            job["status"] = "complete"
+            job["waveform_path"] = wave
+            job["result"] = {
+                "status": "complete",
+                "metadata": metadata,
+                **scored,
+                "accuracy": raw["accuracy"],
+                "has_waveform": wave is not None,
+                "clipping_segments": clipping.get("clipping_segments", []),
+                "loud_segments": clipping.get("loud_segments", []),
+            }
+        metrics.inc("qc_jobs_finished_total", status="complete")
+        if not upload_id:
+            # Passes over a streaming upload run at the speed of the upload
+            _record_timings(job_id, metadata, accuracy)
 
     except Exception as e:
-        job["status"] = "error"
-        job["error"] = str(e)
+        with job_store.edit(job_id) as job:
+            job["status"] = "error"
+            job["error"] = str(e)
+        metrics.inc("qc_jobs_finished_total", status="error")
 
     finally:
-        if os.path.exists(filepath):
+        if upload_id:
+            # Done reading the streaming upload; after an error further chunks are refused
+            job_store.delete_upload(upload_id)
+        job_store.set_trace(job_id, tracing.finish(trace_token, {
+            "filename": original_filename or os.path.basename(filepath),
+            "channel": channel,
+            "accuracy": accuracy,
+        }))
+        if not in_place and os.path.exists(filepath):
             os.remove(filepath)
 
 
-def _start_step(job, step_key):
-    """Mark a step as started."""
-    job["current_step"] = step_key
-    job["current_step_label"] = STEP_ESTIMATES[step_key]["label"]
-    job["steps"][step_key]["status"] = "running"
-    job["steps"][step_key]["started_at"] = time.time()
+def _cached_results(cache_entry, step_keys, configs, accuracy=DEFAULT_ACCURACY):
+    """Cached raw results for the given steps that match the detector params for configs."""
+    cached = {}
+    for step_key in step_keys:
+        result = result_cache.cached_step(cache_entry, _cache_step(step_key, accuracy),
+                                          detector_params(step_key, configs, accuracy))
+        if result is not None:
+            cached[step_key] = result
+    return cached
+
+
+def _cache_step(step_key, accuracy):
+    """Cache slot of a step; reduced accuracy levels do not replace full results."""
+    return step_key if accuracy == DEFAULT_ACCURACY else f"{step_key}@{accuracy}"
+
+
+def _count_cache_lookups(media, step_keys, cached):
+    """Cache hits and misses of the steps a pass was asked for (streaming uploads are not looked up)."""
+    if "content_hash" not in media:
+        return
+    for step_key in step_keys:
+        metrics.inc("qc_cache_requests_total", step=step_key, result="hit" if step_key in cached else "miss")
+
+
+def _record_timings(job_id, metadata, accuracy):
+    """Hand the measured wall times of the passes a completed job ran to the estimator."""
+    feats = estimator.features(metadata, accuracy)
+    passes = {}
+    for step_key, step in job_store.get(job_id)["steps"].items():
+        if step["status"] == "done" and not step.get("cached") and step["actual_duration"]:
+            # Steps of a fused pass carry the pass's wall time (see _finish_steps)
+            passes[tuple(step.get("pass", [step_key]))] = step.get("pass_seconds", step["actual_duration"])
+    estimator.record([(list(step_keys), feats, seconds) for step_keys, seconds in passes.items()])
+
+
+def _observe_realtime(media, analyzer, wall):
+    """Speed of a decoding pass over a complete file, as a multiple of realtime."""
+    # A pass over a streaming upload runs at the speed of the upload
+    if isinstance(media["source"], FileInput) and media["duration"] > 0 and wall > 0:
+        metrics.observe("qc_realtime_factor", media["duration"] / wall,
+                        analyzer=analyzer, resolution=media["resolution"])
+
 
+class AnalysisError(Exception):
+    """Pipeline failure with a message meant for the user."""
 
-def _finish_step(job, step_key):
+
+def _probe_upload(media, filepath, original_filename):
+    """
+    Extract the metadata of a streaming upload from its first UPLOAD_HEADER_BYTES.
+
+    Files that cannot be read from a pipe (moov atom at the end) or whose
+    header is not complete yet are analyzed once the whole upload is there:
+    media["source"] is then replaced by the file itself.
+    """
+    source = media["source"]
+    _wait_for_upload(source, UPLOAD_HEADER_BYTES)
+    with open(filepath, 'rb') as f:
+        streamable = not moov_at_end(f.read(UPLOAD_HEADER_BYTES))
+    if streamable:
+        metadata = extract_metadata(filepath, original_filename=original_filename)
+        if metadata.get('status') != 'error':
+            return metadata
+    _wait_for_upload(source)
+    media["source"] = FileInput(filepath)
+    return extract_metadata(filepath, original_filename=original_filename)
+
+
+def _wait_for_upload(source, min_bytes=None):
+    """Block until a streaming upload has min_bytes (default: all); fail if it was aborted or stalled."""
+    if not source.wait(min_bytes):
+        if source.stalled:
+            raise AnalysisError(f"Upload seit über {IDLE_TIMEOUT // 60} Minuten ohne neue Daten, Analyse abgebrochen")
+        raise AnalysisError("Upload wurde abgebrochen")
+
+
+def _start_step(job_id, step_key):
+    """Mark a step as started."""
+    with job_store.edit(job_id) as job:
+        job["steps"][step_key]["status"] = "running"
+        job["steps"][step_key]["started_at"] = time.time()
+        _update_current_step(job)
+
+
+def _progress_reporter(job_id, step_keys):
+    """ffmpeg progress callback that updates the steps sharing one pass."""
+    def report(out_time, speed):
+        with job_store.edit(job_id) as job:
+            duration = job.get("media_duration") or 0
+            fraction = min(out_time / duration, 1.0) if duration > 0 else 0.0
+            for step_key in step_keys:
+                step = job["steps"][step_key]
+                if step["status"] == "running":
+                    step["progress"] = fraction
+                    step["speed"] = speed
+    return report
+
+
+def _finish_step(job_id, step_key):
     """Mark a step as completed, record actual duration."""
-    step = job["steps"][step_key]
-    step["status"] = "done"
-    step["actual_duration"] = time.time() - step["started_at"]
-    job["completed_steps"] += 1
+    with job_store.edit(job_id) as job:
+        step = job["steps"][step_key]
+        step["status"] = "done"
+        step["actual_duration"] = time.time() - step["started_at"]
+        step["progress"] = 1.0
+        job["completed_steps"] += 1
+        _update_current_step(job)
 
-    # Update remaining time estimate based on actual measurements
-    _update_remaining_estimate(job)
+        # Update remaining time estimate based on actual measurements
+        _update_remaining_estimate(job)
+    metrics.observe("qc_step_duration_seconds", step["actual_duration"], step=step_key)
+    tracing.span(step_key, "step", step["started_at"], step["started_at"] + step["actual_duration"])
+
+
+def _finish_steps(job_id, step_keys):
+    """Mark steps that shared one ffmpeg pass as completed.
+
+    The wall time of the pass is split across the steps in proportion to
+    their estimates, so the correction factor reflects the fused speed-up.
+    The split is only for display; the estimator learns the pass's wall
+    time, kept with each step.
+    """
+    if not step_keys:
+        return
+    with job_store.edit(job_id) as job:
+        now = time.time()
+        wall = now - min(job["steps"][k]["started_at"] for k in step_keys)
+        total_est = sum(job["steps"][k]["estimated_duration"] for k in step_keys)
+        for step_key in step_keys:
+            step = job["steps"][step_key]
+            share = step["estimated_duration"] / total_est if total_est > 0 else 1 / len(step_keys)
+            step["status"] = "done"
+            step["actual_duration"] = wall * share
+            step["pass"] = list(step_keys)
+            step["pass_seconds"] = wall
+            step["progress"] = 1.0
+            job["completed_steps"] += 1
+        _update_current_step(job)
+        _update_remaining_estimate(job)
+    # Outside the job transaction: the metrics are written in one of their own
+    for step_key in step_keys:
+        metrics.observe("qc_step_duration_seconds", job["steps"][step_key]["actual_duration"], step=step_key)
+        # The trace shows the pass the steps shared, not the estimated split
+        tracing.span(step_key, "step", job["steps"][step_key]["started_at"], now,
+                     {"pass": step_keys, "share_seconds": job["steps"][step_key]["actual_duration"]})
+
+
+def _update_current_step(job):
+    """Point current_step/label at the step(s) currently running."""
+    running = [k for k in STEP_ORDER if job["steps"][k]["status"] == "running"]
+    if not running:
+        return
+    job["current_step"] = running[0]
+    if len(running) == 1:
+        job["current_step_label"] = STEP_ESTIMATES[running[0]]["label"]
+    else:
+        labels = [STEP_ESTIMATES[k]["label"].rstrip('.') for k in running]
+        job["current_step_label"] = ", ".join(labels) + "..."
 
 
-def _skip_step(job, step_key):
-    """Mark a step as skipped."""
-    job["steps"][step_key]["status"] = "skipped"
-    job["steps"][step_key]["estimated_duration"] = 0
-    job["completed_steps"] += 1
-    job["total_steps_active"] = job.get("total_steps_active", len(STEP_ORDER))
-    _update_remaining_estimate(job)
+def _cached_step(job_id, step_key):
+    """Mark a step as done from the result cache (no estimate, no wall time)."""
+    with job_store.edit(job_id) as job:
+        step = job["steps"][step_key]
+        step["status"] = "done"
+        step["cached"] = True
+        step["estimated_duration"] = 0
+        step["actual_duration"] = 0
+        step["progress"] = 1.0
+        job["completed_steps"] += 1
+        _update_remaining_estimate(job)
+    tracing.instant(step_key, "step", args={"cached": True})
 
 
-def _recalculate_estimates(job, duration, has_video, has_audio):
-    """Recalculate time estimates after knowing video duration & streams."""
-    active_count = 0
-    for step_key in STEP_ORDER:
-        skip = False
-        if step_key in ("black_frames", "media_offline", "noise", "fuck_frames") and not has_video:
-            skip = True
-        if step_key in ("loudness", "clipping") and not has_audio:
-            skip = True
-
-        if skip:
-            job["steps"][step_key]["estimated_duration"] = 0
-        else:
-            est = estimate_step_time(step_key, duration)
-            job["steps"][step_key]["estimated_duration"] = est
-            active_count += 1
+def _skip_step(job_id, step_key):
+    """Mark a step as skipped."""
+    with job_store.edit(job_id) as job:
+        job["steps"][step_key]["status"] = "skipped"
+        job["steps"][step_key]["estimated_duration"] = 0
+        job["completed_steps"] += 1
+        job["total_steps_active"] = job.get("total_steps_active", len(STEP_ORDER))
+        _update_remaining_estimate(job)
 
-    job["total_steps_active"] = active_count
-    job["estimated_total"] = sum(
-        s["estimated_duration"] for s in job["steps"].values()
-    )
-    _update_remaining_estimate(job)
+
+def _recalculate_estimates(job_id, duration, has_video, has_audio, time_factor=1.0, features=None):
+    """Recalculate time estimates after knowing video duration & streams.
+
+    With the file's features (see estimator.py) the steps of a task are
+    estimated by the learned model of their pass where that has enough data
+    (estimate_source "model"), split across the steps like the table
+    estimates; the other steps use STEP_ESTIMATES, with time_factor scaling
+    the video and audio pass steps (reduced accuracy levels).
+    """
+    with job_store.edit(job_id) as job:
+        job["media_duration"] = duration
+        active_count = 0
+        running = []
+        for step_key in STEP_ORDER:
+            skip = False
+            if step_key in VIDEO_STEPS and not has_video:
+                skip = True
+            if step_key in AUDIO_STEPS and not has_audio:
+                skip = True
+
+            if skip:
+                job["steps"][step_key]["estimated_duration"] = 0
+            elif job["steps"][step_key].get("cached"):
+                # Served from the result cache, costs no time
+                job["steps"][step_key]["estimated_duration"] = 0
+                active_count += 1
+            else:
+                est = estimate_step_time(step_key, duration)
+                if step_key in VIDEO_STEPS or step_key in AUDIO_STEPS:
+                    est *= time_factor
+                job["steps"][step_key]["estimated_duration"] = est
+                job["steps"][step_key]["estimate_source"] = "table"
+                running.append(step_key)
+                active_count += 1
+
+        for step_keys in TASK_STEPS.values():
+            run = [k for k in step_keys if k in running]
+            learned = estimator.estimate(run, features) if run and features else None
+            if learned is None:
+                continue
+            table = sum(job["steps"][k]["estimated_duration"] for k in run)
+            for step_key in run:
+                step = job["steps"][step_key]
+                step["estimated_duration"] = (learned * step["estimated_duration"] / table if table > 0
+                                              else learned / len(run))
+                step["estimate_source"] = "model"
+
+        job["total_steps_active"] = active_count
+        job["estimated_total"] = _critical_path({
+            task_key: sum(job["steps"][k]["estimated_duration"] for k in step_keys)
+            for task_key, step_keys in TASK_STEPS.items()
+        })
+        _update_remaining_estimate(job)
 
 
 def _update_remaining_estimate(job):
-    """Calculate remaining time based on completed step durations + estimates for pending."""
+    """Calculate remaining time based on completed step durations + estimates for pending.
+
+    The estimates are the learned or table values set by _recalculate_estimates;
+    the correction factor adapts them to how this file is actually doing.
+
+    Tasks that run concurrently overlap, so the remaining time is the
+    longest chain of still-open work through the task graph rather than
+    the sum over all steps.
+    """
     elapsed_total = 0
-    remaining = 0
     correction_factor = 1.0
 
     # Calculate correction factor from completed steps
@@ -266,19 +630,26 @@ def _update_remaining_estimate(job):
     if completed_estimated > 0:
         correction_factor = completed_actual / completed_estimated
 
-    # Sum remaining estimates with correction
-    for step_key in STEP_ORDER:
-        step = job["steps"][step_key]
-        if step["status"] in ("pending", "running"):
-            est = step["estimated_duration"] * correction_factor
-            if step["status"] == "running":
-                # Subtract time already spent on current step
-                running_for = time.time() - step.get("started_at", time.time())
-                est = max(est - running_for, 0)
-            remaining += est
+    # Remaining work per task, with correction
+    duration = job.get("media_duration") or 0
+    task_remaining = {}
+    for task_key, step_keys in TASK_STEPS.items():
+        open_steps = [job["steps"][k] for k in step_keys
+                      if job["steps"][k]["status"] in ("pending", "running")]
+        est = sum(s["estimated_duration"] for s in open_steps) * correction_factor
+        running = [s for s in open_steps if s["status"] == "running"]
+        reported = [s for s in running if s.get("speed") and s.get("progress")]
+        if reported and duration > 0:
+            # ffmpeg reports how far it got and how fast it is going
+            s = reported[0]
+            est = (1 - s["progress"]) * duration / s["speed"]
+        elif running:
+            # Subtract time already spent on the running pass
+            est = max(est - (time.time() - min(s["started_at"] for s in running)), 0)
+        task_remaining[task_key] = est
 
     job["elapsed_seconds"] = elapsed_total
-    job["remaining_seconds"] = round(remaining, 1)
+    job["remaining_seconds"] = round(_critical_path(task_remaining), 1)
 
 
 @app.route('/')
@@ -300,6 +671,10 @@ def get_channels():
 
 @app.route('/api/analyze', methods=['POST'])
 def analyze():
+    # Refuse before the upload body is read
+    if job_store.count('queued', batched=False) >= MAX_QUEUED_JOBS:
+        return _queue_full()
+
     if 'file' not in request.files:
         return jsonify({"error": "Keine Datei hochgeladen"}), 400
 
@@ -310,23 +685,441 @@ def analyze():
     channel = request.form.get('channel', 'youtube')
     if channel not in CHANNEL_CONFIGS:
         return jsonify({"error": f"Unbekannter Kanal: {channel}"}), 400
+    accuracy = request.form.get('accuracy', DEFAULT_ACCURACY)
+    if accuracy not in ACCURACY_LEVELS:
+        return jsonify({"error": f"Unbekannte Genauigkeitsstufe: {accuracy}"}), 400
 
     ext = os.path.splitext(file.filename)[1] or '.mp4'
     temp_name = f"{uuid.uuid4().hex}{ext}"
     filepath = os.path.join(UPLOAD_FOLDER, temp_name)
 
-    # Stream-save large files in chunks to avoid memory issues
+    # Stream-save large files in chunks to avoid memory issues,
+    # hashing them on the way for the result cache
     CHUNK_SIZE = 64 * 1024 * 1024  # 64 MB chunks
+    digest = hashlib.sha256()
+    received = 0
+    receive_started = time.time()
     with open(filepath, 'wb') as dest:
         while True:
             chunk = file.stream.read(CHUNK_SIZE)
             if not chunk:
                 break
+            digest.update(chunk)
             dest.write(chunk)
+            received += len(chunk)
+    content_hash = digest.hexdigest()
+    _count_upload("form", received, time.time() - receive_started)
+
+    # Parse enabled steps from form data
+    enabled_steps_json = request.form.get('enabled_steps', None)
+    enabled_steps = None
+    if enabled_steps_json:
+        try:
+            enabled_steps = json.loads(enabled_steps_json)
+        except (ValueError, TypeError):
+            enabled_steps = None
+
+    try:
+        job_id, created = _enqueue_job(filepath, channel, file.filename, enabled_steps, content_hash,
+                                       accuracy=accuracy)
+    except job_store.QueueFull:
+        os.remove(filepath)
+        return _queue_full()
+    if not created:
+        os.remove(filepath)
+        return jsonify({"job_id": job_id, "attached": True})
+    return jsonify({"job_id": job_id})
+
+
+@app.route('/api/analyze/path', methods=['POST'])
+def analyze_path():
+    """Analyze a file on server-side storage where it is, without uploading it.
+
+    JSON body: path (inside one of QC_ANALYZE_ROOTS), channel, optional
+    enabled_steps and accuracy. The file is only read: not copied, not deleted.
+    """
+    if not ANALYZE_ROOTS:
+        return jsonify({"error": "Analyse von Server-Pfaden ist nicht freigegeben"}), 403
+    data = request.get_json(silent=True) or {}
+    channel = data.get('channel', 'youtube')
+    if channel not in CHANNEL_CONFIGS:
+        return jsonify({"error": f"Unbekannter Kanal: {channel}"}), 400
+    accuracy = data.get('accuracy', DEFAULT_ACCURACY)
+    if accuracy not in ACCURACY_LEVELS:
+        return jsonify({"error": f"Unbekannte Genauigkeitsstufe: {accuracy}"}), 400
+
+    filepath, error, status = _resolve_analyze_path(data.get('path'))
+    if error:
+        return jsonify({"error": error}), status
+
+    try:
+        job_id, created = _enqueue_job(filepath, channel, os.path.basename(filepath), data.get('enabled_steps'),
+                                       result_cache.stat_key(filepath), in_place=True, accuracy=accuracy)
+    except job_store.QueueFull:
+        return _queue_full()
+    if not created:
+        return jsonify({"job_id": job_id, "attached": True})
+    return jsonify({"job_id": job_id})
+
+
+def _resolve_analyze_path(path):
+    """
+    Check a server-side path against QC_ANALYZE_ROOTS.
+
+    Returns:
+        (filepath, None, None) for a readable file inside the allow-list,
+        else (None, error message, HTTP status)
+    """
+    # Resolve symlinks and '..' before comparing against the allow-list
+    filepath = os.path.realpath(path or '')
+    if not any(os.path.commonpath([root, filepath]) == root for root in ANALYZE_ROOTS):
+        return None, "Pfad liegt außerhalb der freigegebenen Verzeichnisse", 403
+    if not os.path.isfile(filepath):
+        return None, "Datei nicht gefunden", 404
+    if not os.access(filepath, os.R_OK):
+        return None, "Datei ist nicht lesbar", 403
+    return filepath, None, None
+
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """Start a chunked upload: reserves the file and returns the chunk layout.
+
+    JSON body: filename, size (bytes), optional chunk_size (bytes). With
+    "stream": true (plus channel, optional enabled_steps and accuracy) the analysis is
+    queued right away and reads the chunks as they arrive; the response then
+    carries its job_id. Chunks should be sent roughly in order for that.
+    """
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename') or ''
+    if filename == '':
+        return jsonify({"error": "Kein Dateiname"}), 400
+    stream = bool(data.get('stream'))
+    channel = data.get('channel', 'youtube')
+    if stream and channel not in CHANNEL_CONFIGS:
+        return jsonify({"error": f"Unbekannter Kanal: {channel}"}), 400
+    accuracy = data.get('accuracy', DEFAULT_ACCURACY)
+    if stream and accuracy not in ACCURACY_LEVELS:
+        return jsonify({"error": f"Unbekannte Genauigkeitsstufe: {accuracy}"}), 400
+    if stream and job_store.count('queued', batched=False) >= MAX_QUEUED_JOBS:
+        return _queue_full()
+    try:
+        size = int(data.get('size', 0))
+        chunk_size = int(data.get('chunk_size') or UPLOAD_CHUNK_SIZE)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Ungültige Dateigröße"}), 400
+    if size <= 0 or size > MAX_CONTENT_LENGTH:
+        return jsonify({"error": "Ungültige Dateigröße"}), 400
+    chunk_size = min(max(chunk_size, MIN_UPLOAD_CHUNK_SIZE), MAX_UPLOAD_CHUNK_SIZE)
+
+    ext = os.path.splitext(filename)[1] or '.mp4'
+    upload_id = uuid.uuid4().hex
+    filepath = os.path.join(UPLOAD_FOLDER, f"{upload_id}{ext}")
+    try:
+        _preallocate(filepath, size)
+    except OSError:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        return jsonify({"error": "Nicht genügend Speicherplatz für die Datei"}), 507
+
+    job_store.create_upload(upload_id, filename, filepath, size, chunk_size)
+    if stream:
+        try:
+            job_id, _ = _enqueue_job(filepath, channel, filename, data.get('enabled_steps'),
+                                     upload_id=upload_id, accuracy=accuracy)
+        except job_store.QueueFull:
+            job_store.delete_upload(upload_id)
+            os.remove(filepath)
+            return _queue_full()
+        job_store.set_upload_job(upload_id, job_id)
+    return jsonify(_upload_status(job_store.get_upload(upload_id))), 201
+
+
+@app.route('/api/uploads/<upload_id>')
+def get_upload(upload_id):
+    """Chunks received so far, so an interrupted client can send only the missing ones."""
+    upload = job_store.get_upload(upload_id)
+    if upload is None:
+        return jsonify({"error": "Upload nicht gefunden"}), 404
+    return jsonify(_upload_status(upload))
+
+
+@app.route('/api/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def put_chunk(upload_id, index):
+    """Write one chunk at its offset; the body must match the X-Chunk-SHA256 header.
+
+    Chunks may arrive in any order and in parallel, also on different workers.
+    """
+    upload = job_store.get_upload(upload_id)
+    if upload is None:
+        return jsonify({"error": "Upload nicht gefunden"}), 404
+    if index >= _chunk_count(upload):
+        return jsonify({"error": "Ungültiger Chunk-Index"}), 400
+    expected_hash = request.headers.get('X-Chunk-SHA256', '').lower()
+    if not expected_hash:
+        return jsonify({"error": "X-Chunk-SHA256 fehlt"}), 400
+
+    offset = index * upload["chunk_size"]
+    expected_size = min(upload["chunk_size"], upload["size"] - offset)
+    digest = hashlib.sha256()
+    written = 0
+    receive_started = time.time()
+    fd = os.open(upload["path"], os.O_WRONLY)
+    try:
+        while True:
+            data = request.stream.read(1024 * 1024)
+            if not data:
+                break
+            if written + len(data) > expected_size:
+                return jsonify({"error": "Chunk ist größer als erwartet"}), 400
+            digest.update(data)
+            os.pwrite(fd, data, offset + written)
+            written += len(data)
+    finally:
+        os.close(fd)
+    _count_upload("chunk", written, time.time() - receive_started)
+
+    if written != expected_size:
+        return jsonify({"error": f"Chunk unvollständig ({written} von {expected_size} Bytes)"}), 400
+    if digest.hexdigest() != expected_hash:
+        return jsonify({"error": "Prüfsumme des Chunks stimmt nicht"}), 400
+    before = job_store.mark_chunk(upload_id, index)
+    if before is None:
+        return jsonify({"error": "Upload nicht gefunden"}), 404
+    if upload["job_id"] and (received_bytes(dict(upload, received=before + [index]))
+                             >= min(UPLOAD_HEADER_BYTES, upload["size"])):
+        # Data is flowing: the job may take a running slot now
+        job_store.mark_upload_ready(upload_id)
+        work_available.set()
+        _start_triage(upload)
+    return jsonify({"index": index, "size": written})
+
+
+@app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    """Start the analysis of a complete chunked upload.
+
+    JSON body: channel, optional enabled_steps (list) and accuracy. When the queue is
+    full the upload is kept, so finalize can be retried after Retry-After.
+    A streaming upload already has its job; finalize only confirms that all
+    chunks are in and returns the job_id.
+    """
+    upload = job_store.get_upload(upload_id)
+    if upload is None:
+        return jsonify({"error": "Upload nicht gefunden"}), 404
+    missing = _upload_status(upload)["missing"]
+    if missing:
+        return jsonify({"error": f"{len(missing)} Chunks fehlen noch", "missing": missing}), 409
+    if upload["job_id"]:
+        # The job may still be reading the upload; it deletes the upload when it is done
+        job_store.finalize_upload(upload_id)
+        work_available.set()
+        _start_triage(upload)
+        return jsonify({"job_id": upload["job_id"]})
+
+    data = request.get_json(silent=True) or {}
+    channel = data.get('channel', 'youtube')
+    if channel not in CHANNEL_CONFIGS:
+        return jsonify({"error": f"Unbekannter Kanal: {channel}"}), 400
+    enabled_steps = data.get('enabled_steps')
+    accuracy = data.get('accuracy', DEFAULT_ACCURACY)
+    if accuracy not in ACCURACY_LEVELS:
+        return jsonify({"error": f"Unbekannte Genauigkeitsstufe: {accuracy}"}), 400
+
+    try:
+        job_id, _ = _enqueue_job(upload["path"], channel, upload["filename"], enabled_steps,
+                                 accuracy=accuracy)
+    except job_store.QueueFull:
+        return _queue_full()
+    job_store.delete_upload(upload_id)
+    return jsonify({"job_id": job_id})
+
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    """Discard an upload. The job of a streaming upload is cancelled with it."""
+    upload = job_store.get_upload(upload_id)
+    if upload is None:
+        return jsonify({"error": "Upload nicht gefunden"}), 404
+    job_store.delete_upload(upload_id)
+    if upload["job_id"]:
+        # A running analysis notices the missing upload itself and ends with this error
+        with job_store.edit(upload["job_id"]) as job:
+            if job["status"] == "queued":
+                job["status"] = "error"
+                job["error"] = "Upload wurde abgebrochen"
+    if os.path.exists(upload["path"]):
+        os.remove(upload["path"])
+    return jsonify({"upload_id": upload_id, "status": "aborted"})
+
+
+def _start_triage(upload):
+    """
+    Run the metadata checks of a streaming upload once its header is in.
+
+    The result is reported as "triage" in the job status long before the
+    analysis is done, so the client can abort the upload on a hard FAIL
+    (e.g. 720p for a 4K channel, no audio stream). It runs in a background
+    thread, off the chunk request. Every later chunk and finalize may claim
+    it again, so a failed attempt is retried up to TRIAGE_ATTEMPTS times.
+    """
+    now = time.time()
+    # Read first: most chunks arrive after the triage is done and need no write
+    job = job_store.get(upload["job_id"])
+    if job is None or not _triage_due(job, now):
+        return
+    try:
+        with job_store.edit(upload["job_id"]) as job:
+            if not _triage_due(job, now):
+                return  # Claimed by another request meanwhile
+            job["triage_attempts"] = job.get("triage_attempts", 0) + 1
+            job["triage_started_at"] = now
+    except KeyError:
+        return  # Job already purged
+    threading.Thread(target=_triage_upload, args=(upload,), name="triage", daemon=True).start()
+
+
+def _triage_due(job, now):
+    return (not job.get("triage") and job["status"] not in ("complete", "error")
+            and job.get("triage_attempts", 0) < TRIAGE_ATTEMPTS
+            and now - job.get("triage_started_at", 0) >= TRIAGE_TIMEOUT)
 
-    job_id = uuid.uuid4().hex[:12]
 
-    # Initialize job with step tracking
+def _triage_upload(upload):
+    triage = None
+    try:
+        with open(upload["path"], 'rb') as f:
+            header = f.read(UPLOAD_HEADER_BYTES)
+        if moov_at_end(header):
+            triage = False  # ffprobe needs the end of the file, no point in retrying
+        else:
+            metadata = extract_metadata(upload["path"], original_filename=upload["filename"])
+            if metadata.get('status') != 'error':
+                channel = job_store.get_run_args(upload["job_id"])["channel"]
+                checks = run_metadata_checks(metadata, CHANNEL_CONFIGS[channel])
+                triage = {"checks": checks, "overall": aggregate_results(checks)}
+    except Exception:
+        pass  # A failed attempt; the next chunk or finalize retries it
+    try:
+        with job_store.edit(upload["job_id"]) as job:
+            if triage is False:
+                job["triage_attempts"] = TRIAGE_ATTEMPTS
+            elif triage:
+                job["triage"] = triage
+            # Done: the next chunk or finalize may retry right away
+            job["triage_started_at"] = 0
+    except KeyError:
+        pass
+
+
+def _count_upload(method, size, seconds):
+    metrics.inc("qc_upload_bytes_total", size, method=method)
+    metrics.inc("qc_upload_seconds_total", seconds, method=method)
+
+
+def _chunk_count(upload):
+    return -(-upload["size"] // upload["chunk_size"])
+
+
+def _upload_status(upload):
+    received = set(upload["received"])
+    return {
+        "upload_id": upload["upload_id"],
+        "size": upload["size"],
+        "chunk_size": upload["chunk_size"],
+        "chunk_count": _chunk_count(upload),
+        "received": sorted(received),
+        "missing": [i for i in range(_chunk_count(upload)) if i not in received],
+        "job_id": upload["job_id"],
+    }
+
+
+def _preallocate(path, size):
+    """Reserve the disk space up front (sparse file where fallocate is unsupported)."""
+    with open(path, 'wb') as f:
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+        except AttributeError:
+            f.truncate(size)
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                raise
+            f.truncate(size)
+
+
+def _enqueue_job(filepath, channel, original_filename, enabled_steps, content_hash=None, upload_id=None,
+                 in_place=False, accuracy=DEFAULT_ACCURACY, batch_id=None):
+    """
+    Queue an analysis of an uploaded file.
+
+    With a content_hash, an identical upload (same file, channel, steps and accuracy)
+    that is still queued or running is reused instead. An upload_id marks a
+    streaming upload the analysis reads while it arrives, in_place a
+    server-side file that must not be deleted. Jobs of a batch (batch_id)
+    get their own job, since they expire with the batch, and are not
+    limited by MAX_QUEUED_JOBS.
+
+    Returns:
+        (job_id, created)
+
+    Raises:
+        job_store.QueueFull
+    """
+    upload_key = None
+    if content_hash and not batch_id:
+        steps_part = ",".join(sorted(enabled_steps)) if enabled_steps is not None else "*"
+        upload_key = f"{content_hash}:{channel}:{steps_part}:{accuracy}"
+    run_args = {
+        "filepath": filepath,
+        "channel": channel,
+        "original_filename": original_filename,
+        "enabled_steps": enabled_steps,
+        "content_hash": content_hash,
+        "upload_id": upload_id,
+        "in_place": in_place,
+        "accuracy": accuracy,
+    }
+    job = _new_job(uuid.uuid4().hex[:12])
+    if batch_id:
+        job["batch_id"] = batch_id
+    job_id, created = job_store.create(job, upload_key, run_args,
+                                       max_queued=None if batch_id else MAX_QUEUED_JOBS, batch_id=batch_id)
+    if created:
+        work_available.set()
+    return job_id, created
+
+
+def _queue_full():
+    """429 with a Retry-After derived from the compute time still ahead."""
+    # Queued batch jobs wait behind new uploads, so they do not delay a retry
+    ahead = [j for j in job_store.active_jobs() if j["status"] == "running" or not j.get("batch_id")]
+    retry_after = max(1, math.ceil(_backlog_seconds(ahead) / MAX_CONCURRENT_JOBS))
+    response = jsonify({
+        "error": f"Server ausgelastet, bitte in ca. {_format_time(retry_after)} erneut versuchen",
+        "retry_after": retry_after,
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def _queue_position(job_id):
+    """1-based position of a queued job and the estimated wait until it starts."""
+    active = job_store.active_jobs()
+    queued = [j["job_id"] for j in active if j["status"] == "queued"]
+    position = queued.index(job_id) + 1 if job_id in queued else 1
+    ahead = [j for j in active if j["status"] == "running" or j["job_id"] in queued[:position - 1]]
+    return position, _backlog_seconds(ahead) / MAX_CONCURRENT_JOBS
+
+
+def _backlog_seconds(active):
+    """Estimated compute seconds of running (remaining) and queued (total) jobs."""
+    return sum(job["remaining_seconds"] if job["status"] == "running" else job["estimated_total"]
+               for job in active)
+
+
+def _new_job(job_id):
+    """Initial job state with step tracking."""
     steps = {}
     for step_key in STEP_ORDER:
         steps[step_key] = {
@@ -334,14 +1127,16 @@ def analyze():
             "estimated_duration": estimate_step_time(step_key, 60),  # Default 60s estimate
             "actual_duration": None,
             "started_at": None,
+            "progress": 0.0,
+            "speed": None,
         }
 
-    jobs[job_id] = {
-        "status": "running",
+    return {
+        "status": "queued",
         "job_id": job_id,
         "started_at": time.time(),
         "current_step": None,
-        "current_step_label": "Wird vorbereitet...",
+        "current_step_label": "In Warteschlange...",
         "steps": steps,
         "completed_steps": 0,
         "total_steps": len(STEP_ORDER),
@@ -353,40 +1148,129 @@ def analyze():
         "error": None,
     }
 
-    # Parse enabled steps from form data
-    enabled_steps_json = request.form.get('enabled_steps', None)
-    enabled_steps = None
-    if enabled_steps_json:
-        try:
-            enabled_steps = json.loads(enabled_steps_json)
-        except (ValueError, TypeError):
-            enabled_steps = None
 
-    thread = threading.Thread(
-        target=run_analysis,
-        args=(job_id, filepath, channel),
-        kwargs={"original_filename": file.filename, "enabled_steps": enabled_steps}
-    )
-    thread.daemon = True
-    thread.start()
-
-    return jsonify({"job_id": job_id})
+def _analysis_worker():
+    """Analysis thread: runs queued jobs one at a time while the global limit allows."""
+    while True:
+        try:
+            claimed = job_store.claim_next(MAX_CONCURRENT_JOBS)
+        except Exception:
+            claimed = None  # Database busy; try again after the next wake-up
+        if claimed is None:
+            work_available.wait(QUEUE_POLL_INTERVAL)
+            work_available.clear()
+            continue
+        job_id, run_args = claimed
+        run_analysis(job_id, run_args["filepath"], run_args["channel"],
+                     original_filename=run_args["original_filename"],
+                     enabled_steps=run_args["enabled_steps"],
+                     content_hash=run_args["content_hash"],
+                     upload_id=run_args.get("upload_id"),
+                     in_place=run_args.get("in_place", False),
+                     accuracy=run_args.get("accuracy", DEFAULT_ACCURACY))
+
+
+def _maintain_jobs():
+    """Per-worker loop: heartbeat, drop expired jobs and stale uploads, re-run jobs of dead workers."""
+    while True:
+        try:
+            job_store.heartbeat(running_processes())
+            for job in job_store.purge():
+                if job.get("waveform_path") and os.path.exists(job["waveform_path"]):
+                    os.remove(job["waveform_path"])
+            for path in job_store.purge_uploads(UPLOAD_IDLE_TTL):
+                if os.path.exists(path):
+                    os.remove(path)
+            for job_id, run_args in job_store.claim_orphans(ORPHAN_AFTER):
+                _resume_job(job_id, run_args)
+        except Exception:
+            pass  # Keep beating; a locked or missing database is retried next round
+        time.sleep(HEARTBEAT_INTERVAL)
+
+
+def _resume_job(job_id, run_args):
+    """Queue a job whose worker went away again, as long as its upload is still there."""
+    with job_store.edit(job_id) as job:
+        if not run_args or not os.path.exists(run_args["filepath"]):
+            job["status"] = "error"
+            job["error"] = "Analyse wurde durch einen Neustart abgebrochen"
+            return
+        batch_id = job.get("batch_id")
+        job.clear()
+        job.update(_new_job(job_id))
+        if batch_id:
+            job["batch_id"] = batch_id
+    work_available.set()
 
 
 @app.route('/api/status/<job_id>')
 def get_status(job_id):
-    job = jobs.get(job_id)
+    job = job_store.get(job_id)
     if not job:
         return jsonify({"error": "Job nicht gefunden"}), 404
+    return jsonify(_status_response(job_id, job))
+
 
+@app.route('/api/status/<job_id>/stream')
+def stream_status(job_id):
+    """Server-Sent Events: the status JSON, pushed only when the job changed.
+
+    The stream ends after the complete or error event, and otherwise after
+    STREAM_MAX_DURATION; EventSource then reconnects on its own. With
+    MAX_STATUS_STREAMS streams open on this worker the request is refused
+    with 503 and the client polls /api/status/<job_id> instead.
+    """
+    if job_store.get(job_id) is None:
+        return jsonify({"error": "Job nicht gefunden"}), 404
+    if not stream_slots.acquire(blocking=False):
+        return jsonify({"error": "Zu viele Status-Streams, bitte per Polling abfragen"}), 503
+
+    def events():
+        yield f"retry: {STREAM_RECONNECT_MS}\n\n"
+        last = None
+        opened = last_sent = time.time()
+        while time.time() - opened < STREAM_MAX_DURATION:
+            job = job_store.get(job_id)
+            if job is None:
+                return
+            queue_position = _queue_position(job_id)[0] if job["status"] == "queued" else None
+            # Serialized before _status_response, which adds live fields to the job
+            snapshot = json.dumps([job, queue_position], sort_keys=True, default=str)
+            if snapshot != last:
+                last = snapshot
+                last_sent = time.time()
+                yield f"data: {json.dumps(_status_response(job_id, job))}\n\n"
+                if job["status"] in ("complete", "error"):
+                    return
+            elif time.time() - last_sent > STREAM_KEEPALIVE:
+                # Comment line, keeps proxies from closing an idle stream
+                last_sent = time.time()
+                yield ": keepalive\n\n"
+            time.sleep(STREAM_POLL_INTERVAL)
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(stream_slots.release)
+    return response
+
+
+def _status_response(job_id, job):
+    """Status JSON of a job (shared by polling and the event stream)."""
     # Live-update remaining for running step
     if job["status"] == "running":
         _update_remaining_estimate(job)
 
+    queue_position = None
+    if job["status"] == "queued":
+        queue_position, wait = _queue_position(job_id)
+        job["current_step_label"] = f"In Warteschlange (Position {queue_position})..."
+        job["remaining_seconds"] = wait + job["estimated_total"]
+
     elapsed = time.time() - job["started_at"]
 
     # Build step summary
     step_summary = []
+    speeds = []
     for step_key in STEP_ORDER:
         s = job["steps"][step_key]
         step_summary.append({
@@ -395,7 +1279,12 @@ def get_status(job_id):
             "status": s["status"],
             "estimated_duration": round(s["estimated_duration"], 1),
             "actual_duration": round(s["actual_duration"], 1) if s["actual_duration"] else None,
+            "progress_percent": round(s["progress"] * 100),
+            "speed": round(s["speed"], 2) if s["speed"] else None,
+            "cached": s.get("cached", False),
         })
+        if s["status"] == "running" and s["speed"]:
+            speeds.append(s["speed"])
 
     response = {
         "job_id": job_id,
@@ -404,34 +1293,55 @@ def get_status(job_id):
         "current_step_label": job["current_step_label"],
         "completed_steps": job["completed_steps"],
         "total_steps": job["total_steps_active"],
-        "progress_percent": round(
-            job["completed_steps"] / max(job["total_steps_active"], 1) * 100
-        ),
+        "queue_position": queue_position,
+        "progress_percent": round(_job_progress(job) * 100),
+        # Slowest running ffmpeg pass, as a multiple of realtime
+        "speed": round(min(speeds), 2) if speeds else None,
         "elapsed_seconds": round(elapsed, 1),
         "remaining_seconds": round(job["remaining_seconds"], 1),
         "elapsed_formatted": _format_time(elapsed),
         "remaining_formatted": _format_time(job["remaining_seconds"]),
         "steps": step_summary,
+        # Metadata checks of a streaming upload, available once its header arrived
+        "triage": job.get("triage"),
     }
 
     if job["status"] == "complete":
         response["result"] = job["result"]
-        # Cleanup job + waveform after result is fetched (keep for 5 min)
-        def cleanup_job():
-            j = jobs.pop(job_id, None)
-            if j and j.get("waveform_path") and os.path.exists(j["waveform_path"]):
-                os.remove(j["waveform_path"])
-        threading.Timer(300, cleanup_job).start()
 
     if job["status"] == "error":
         response["error"] = job["error"]
 
-    return jsonify(response)
+    if job["status"] in ("complete", "error"):
+        # Cleanup job + waveform after result is fetched (keep for 5 min)
+        job_store.expire(job_id, JOB_RETENTION)
+
+    return response
+
+
+def _job_progress(job):
+    """Mean progress (0..1) of the steps a job runs."""
+    active = [s["progress"] for s in job["steps"].values() if s["status"] != "skipped"]
+    return sum(active) / max(len(active), 1)
+
+
+@app.route('/api/status/<job_id>/trace')
+def get_trace(job_id):
+    """Execution trace of a finished job as Chrome trace-event JSON (chrome://tracing, Perfetto)."""
+    job = job_store.get(job_id)
+    if not job:
+        return jsonify({"error": "Job nicht gefunden"}), 404
+    trace = job_store.get_trace(job_id)
+    if trace is None:
+        return jsonify({"error": "Trace liegt erst nach Abschluss der Analyse vor"}), 409
+    response = jsonify(trace)
+    response.headers['Content-Disposition'] = f'attachment; filename="trace-{job_id}.json"'
+    return response
 
 
 @app.route('/api/waveform/<job_id>')
 def get_waveform(job_id):
-    job = jobs.get(job_id)
+    job = job_store.get(job_id)
     if not job:
         return jsonify({"error": "Job nicht gefunden"}), 404
 
@@ -443,6 +1353,187 @@ def get_waveform(job_id):
     return send_file(waveform_path, mimetype='image/png')
 
 
+@app.route('/api/rescore/<job_id>')
+def rescore(job_id):
+    """Verdicts of a finished job for other channels, without analyzing again.
+
+    Query parameter channels: comma-separated channel keys (default: all).
+    """
+    job = job_store.get(job_id)
+    if not job:
+        return jsonify({"error": "Job nicht gefunden"}), 404
+    if job["status"] != "complete":
+        return jsonify({"error": "Analyse ist noch nicht abgeschlossen"}), 409
+
+    channels_param = request.args.get('channels')
+    channels = channels_param.split(',') if channels_param else list(CHANNEL_CONFIGS)
+    unknown = [c for c in channels if c not in CHANNEL_CONFIGS]
+    if unknown:
+        return jsonify({"error": f"Unbekannter Kanal: {', '.join(unknown)}"}), 400
+
+    raw = job_store.get_raw(job_id)
+    return jsonify({
+        "job_id": job_id,
+        "accuracy": raw.get("accuracy"),
+        "results": {channel: score_channel(raw, channel) for channel in channels},
+    })
+
+
+@app.route('/api/batches', methods=['POST'])
+def create_batch():
+    """QC a delivery package: queue one analysis per file of a manifest.
+
+    JSON body: files (list of {"path": ...} for files inside QC_ANALYZE_ROOTS
+    or {"upload_id": ...} for complete chunked uploads, each with an optional
+    "name"), channel, optional name, enabled_steps and accuracy. The manifest
+    is checked completely before any job is queued; with an invalid entry
+    nothing is queued and the response lists the errors per entry.
+    """
+    data = request.get_json(silent=True) or {}
+    channel = data.get('channel', 'youtube')
+    if channel not in CHANNEL_CONFIGS:
+        return jsonify({"error": f"Unbekannter Kanal: {channel}"}), 400
+    accuracy = data.get('accuracy', DEFAULT_ACCURACY)
+    if accuracy not in ACCURACY_LEVELS:
+        return jsonify({"error": f"Unbekannte Genauigkeitsstufe: {accuracy}"}), 400
+    entries = data.get('files')
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"error": "Keine Dateien angegeben"}), 400
+    if len(entries) > MAX_BATCH_FILES:
+        return jsonify({"error": f"Höchstens {MAX_BATCH_FILES} Dateien pro Batch"}), 400
+
+    sources = []
+    errors = []
+    for index, entry in enumerate(entries):
+        source, error = _batch_source(entry)
+        if error:
+            errors.append({"index": index, "error": error})
+        sources.append(source)
+    if errors:
+        return jsonify({"error": f"{len(errors)} Einträge sind ungültig", "files": errors}), 400
+
+    batch_id = uuid.uuid4().hex[:12]
+    items = []
+    for source in sources:
+        job_id, _ = _enqueue_job(source["filepath"], channel, source["filename"], data.get('enabled_steps'),
+                                 source["content_hash"], in_place=source["in_place"], accuracy=accuracy,
+                                 batch_id=batch_id)
+        if source["upload_id"]:
+            job_store.delete_upload(source["upload_id"])
+        items.append({"name": source["name"], "job_id": job_id})
+    job_store.create_batch({
+        "batch_id": batch_id,
+        "name": data.get('name') or f"Batch {time.strftime('%Y-%m-%d %H:%M')}",
+        "channel": channel,
+        "channel_label": CHANNEL_CONFIGS[channel]["label"],
+        "accuracy": accuracy,
+        "created_at": time.time(),
+        "items": items,
+    })
+    return jsonify({"batch_id": batch_id, "files": items}), 201
+
+
+def _batch_source(entry):
+    """Resolve one manifest entry. Returns (source dict, None) or (None, error message)."""
+    if not isinstance(entry, dict):
+        return None, "Eintrag muss ein Objekt sein"
+    if entry.get('path'):
+        if not ANALYZE_ROOTS:
+            return None, "Analyse von Server-Pfaden ist nicht freigegeben"
+        filepath, error, _ = _resolve_analyze_path(entry['path'])
+        if error:
+            return None, error
+        return {"filepath": filepath, "filename": os.path.basename(filepath),
+                "name": entry.get('name') or entry['path'], "content_hash": result_cache.stat_key(filepath),
+                "in_place": True, "upload_id": None}, None
+    if entry.get('upload_id'):
+        upload = job_store.get_upload(entry['upload_id'])
+        if upload is None:
+            return None, "Upload nicht gefunden"
+        if upload["job_id"]:
+            return None, "Upload wird bereits analysiert"
+        missing = _upload_status(upload)["missing"]
+        if missing:
+            return None, f"{len(missing)} Chunks fehlen noch"
+        return {"filepath": upload["path"], "filename": upload["filename"],
+                "name": entry.get('name') or upload["filename"], "content_hash": None,
+                "in_place": False, "upload_id": upload["upload_id"]}, None
+    return None, "path oder upload_id fehlt"
+
+
+@app.route('/api/batches/<batch_id>')
+def get_batch(batch_id):
+    """Batch progress: file counts per status, overall progress and the state of each file."""
+    batch = job_store.get_batch(batch_id)
+    if batch is None:
+        return jsonify({"error": "Batch nicht gefunden"}), 404
+    jobs = job_store.batch_jobs(batch_id)
+
+    files = []
+    counts = {"queued": 0, "running": 0, "complete": 0, "error": 0}
+    progress_sum = 0.0
+    remaining = 0.0
+    for item in batch["items"]:
+        job = jobs.get(item["job_id"])
+        status = job["status"] if job else "error"
+        counts[status] += 1
+        entry = {"name": item["name"], "job_id": item["job_id"], "status": status, "progress_percent": 100,
+                 "overall": None, "error": None}
+        if job is None:
+            entry["error"] = "Job nicht mehr vorhanden"
+        elif status in job_store.ACTIVE:
+            if status == "running":
+                _update_remaining_estimate(job)
+            fraction = _job_progress(job)
+            entry["progress_percent"] = round(fraction * 100)
+            progress_sum += fraction
+            remaining += job["remaining_seconds"] if status == "running" else job["estimated_total"]
+        else:
+            progress_sum += 1.0
+            entry["overall"] = job["result"]["overall"] if status == "complete" else None
+            entry["error"] = job.get("error")
+        files.append(entry)
+
+    total = len(batch["items"])
+    finished = counts["complete"] + counts["error"]
+    if finished == total:
+        job_store.expire_batch(batch_id, BATCH_RETENTION)
+    return jsonify({
+        "batch_id": batch_id,
+        "name": batch["name"],
+        "channel": batch["channel"],
+        "accuracy": batch["accuracy"],
+        "status": "complete" if finished == total else "running" if counts["queued"] < total else "queued",
+        "total": total,
+        "counts": counts,
+        "progress_percent": round(progress_sum / total * 100),
+        # Compute time still ahead, spread over the jobs that run at once
+        "remaining_seconds": round(remaining / MAX_CONCURRENT_JOBS, 1),
+        "remaining_formatted": _format_time(remaining / MAX_CONCURRENT_JOBS),
+        "files": files,
+    })
+
+
+@app.route('/api/batches/<batch_id>/report')
+def get_batch_report(batch_id):
+    """Combined report of a batch; ?format=csv for a CSV download.
+
+    Files still in progress are listed with their status; "complete" in the
+    JSON tells whether the report is final.
+    """
+    batch = job_store.get_batch(batch_id)
+    if batch is None:
+        return jsonify({"error": "Batch nicht gefunden"}), 404
+    report = build_report(batch, job_store.batch_jobs(batch_id))
+    if report["complete"]:
+        job_store.expire_batch(batch_id, BATCH_RETENTION)
+    if request.args.get('format') == 'csv':
+        filename = re.sub(r'[^A-Za-z0-9._-]+', '_', batch["name"]) or batch_id
+        return Response(report_csv(report), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename="{filename}.csv"'})
+    return jsonify(report)
+
+
 @app.route('/api/normalize', methods=['POST'])
 def normalize_audio():
     """Normalize audio to target LUFS using ffmpeg loudnorm (2-pass)."""
@@ -487,10 +1578,10 @@ def normalize_audio():
             '-af', f'loudnorm=I={target_lufs}:TP={target_tp}:LRA=11:print_format=json',
             '-f', 'null', '-'
         ]
-        result = subprocess.run(pass1_cmd, capture_output=True, text=True, timeout=600)
+        _, _, stderr = run_capture(pass1_cmd, timeout=600)
 
         # Extract the JSON block from loudnorm output
-        json_match = re.search(r'\{[^}]*"input_i"[^}]*\}', result.stderr, re.DOTALL)
+        json_match = re.search(r'\{[^}]*"input_i"[^}]*\}', stderr, re.DOTALL)
         if not json_match:
             return jsonify({"error": "Loudnorm-Messung fehlgeschlagen (Pass 1)"}), 500
 
@@ -515,9 +1606,9 @@ def normalize_audio():
 
         pass2_cmd.extend(['-y', out_path])
 
-        result2 = subprocess.run(pass2_cmd, capture_output=True, text=True, timeout=600)
-        if result2.returncode != 0:
-            return jsonify({"error": f"Normalisierung fehlgeschlagen: {result2.stderr[:300]}"}), 500
+        returncode, _, stderr = run_capture(pass2_cmd, timeout=600)
+        if returncode != 0:
+            return jsonify({"error": f"Normalisierung fehlgeschlagen: {stderr[:300]}"}), 500
 
         if not os.path.exists(out_path):
             return jsonify({"error": "Normalisierte Datei nicht erstellt"}), 500
@@ -546,6 +1637,12 @@ def normalize_audio():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/metrics')
+def get_metrics():
+    """Pipeline metrics of all workers in the Prometheus text format (see metrics.py)."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 def _format_time(seconds):
     seconds = max(0, seconds)
     if seconds < 60:
@@ -555,5 +1652,11 @@ def _format_time(seconds):
     return f"{m}m {s:02d}s"
 
 
+threading.Thread(target=_maintain_jobs, daemon=True).start()
+# One analysis thread per job slot; job_store.claim_next enforces the global limit
+for _ in range(ANALYSIS_THREADS):
+    threading.Thread(target=_analysis_worker, daemon=True).start()
+
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
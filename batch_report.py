@@ -0,0 +1,86 @@
+"""
+Combined report of a batch (a delivery package QC'd against one channel).
+
+The report lists every file of the batch with the overall verdict of its
+job (aggregate_results) and the status of each check, and rates the batch
+as a whole with aggregate_results over the file verdicts: one failed file
+fails the package. Files whose analysis failed count as failed. Files still
+queued or running are counted as pending, not scored; until they are done
+the batch is "pending" unless a failed file already decided it. As CSV,
+each file is one row with one column per check.
+"""
+
+import csv
+import io
+
+from analyzers.quality_checks import aggregate_results
+from config import FAIL
+
+
+def build_report(batch, jobs):
+    """
+    Args:
+        batch: Batch state (see create_batch in app.py)
+        jobs: Job states of the batch by job_id
+
+    Returns:
+        dict with the batch fields, overall and one entry per file in manifest order
+    """
+    files = []
+    for item in batch["items"]:
+        job = jobs.get(item["job_id"]) or {"status": "error", "error": "Job nicht mehr vorhanden"}
+        entry = {
+            "name": item["name"],
+            "job_id": item["job_id"],
+            "status": job["status"],
+            "overall": None,
+            "checks": [],
+            "error": job.get("error"),
+        }
+        if job["status"] == "complete":
+            result = job["result"]
+            entry["overall"] = result["overall"]
+            entry["checks"] = [{"name": c["name"], "status": c["status"], "message": c["message"]}
+                               for c in result["checks"]]
+        files.append(entry)
+
+    finished = [f for f in files if f["status"] in ("complete", "error")]
+    verdicts = [{"status": f["overall"]["status"] if f["overall"] else FAIL} for f in finished]
+    overall = aggregate_results(verdicts)
+    overall["pending_count"] = len(files) - len(finished)
+    if overall["pending_count"] and overall["status"] != FAIL:
+        overall["status"] = "pending"
+    if overall["pending_count"]:
+        overall["summary"] += f", {overall['pending_count']} ausstehend"
+    return {
+        "batch_id": batch["batch_id"],
+        "name": batch["name"],
+        "channel": batch["channel"],
+        "channel_label": batch["channel_label"],
+        "accuracy": batch["accuracy"],
+        "complete": len(finished) == len(files),
+        "overall": overall,
+        "files": files,
+    }
+
+
+def report_csv(report):
+    """The report as CSV text: one row per file, one column per check (in order of appearance)."""
+    check_names = []
+    for f in report["files"]:
+        for check in f["checks"]:
+            if check["name"] not in check_names:
+                check_names.append(check["name"])
+
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["Datei", "Job", "Status", "Gesamt", "Score", "Bestanden", "Warnungen",
+                     "Fehlgeschlagen", *check_names, "Fehler"])
+    for f in report["files"]:
+        overall = f["overall"] or {}
+        statuses = {c["name"]: c["status"] for c in f["checks"]}
+        writer.writerow([f["name"], f["job_id"], f["status"], overall.get("status", ""),
+                         overall.get("score", ""), overall.get("pass_count", ""),
+                         overall.get("warning_count", ""), overall.get("fail_count", ""),
+                         *(statuses.get(name, "") for name in check_names), f["error"] or ""])
+    return out.getvalue()
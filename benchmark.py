@@ -0,0 +1,336 @@
+"""
+Benchmark suite on synthetic media with known events.
+
+    python benchmark.py run -o bench-abc123.json --resolutions 1280x720,3840x2160 --codecs libx264,prores_ks
+    python benchmark.py compare bench-old.json bench-new.json
+
+The test media is generated with ffmpeg lavfi sources: testsrc2 video with
+inserted black runs, frozen segments, two-frame flashes and a segment of
+line dropouts, plus a sine tone at -6 dBFS that is pushed to +6 dBFS in a few
+places (float PCM, so the overs survive the encode). Events sit at fixed
+fractions of the duration, aligned to frames, so every file carries its own
+ground truth (see media_events). Each event is made to trip its detector at
+the CHANNEL thresholds; tests/test_benchmark.py checks that it does.
+
+Every analyzer entry point in analyzers/ (and the fused passes) runs on
+every file in a fresh process and is measured for:
+
+- throughput as a multiple of realtime (media duration / wall time)
+- peak RSS of the Python process and of the largest ffmpeg/ffprobe child
+- precision and recall of the reported events against the ground truth; a
+  detection matches an event it overlaps within EVENT_TOLERANCE
+
+The result file is JSON with one entry per (media, analyzer) plus the
+commit and ffmpeg version, so runs of two commits can be compared with the
+compare command.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from config import CHANNEL_CONFIGS
+from analyzers.metadata import extract_metadata
+from analyzers.black_frames import detect_black_frames
+from analyzers.media_offline import detect_media_offline
+from analyzers.noise import detect_noise
+from analyzers.fuck_frames import detect_fuck_frames
+from analyzers.audio_loudness import measure_loudness
+from analyzers.audio_clipping import detect_clipping
+from analyzers.waveform import generate_waveform
+from analyzers.video_pass import VIDEO_STEPS, channel_result, run_video_pass
+from analyzers.audio_pass import AUDIO_STEPS, run_audio_pass
+
+RESULT_VERSION = 1
+FPS = 25
+# Events of the synthetic media need this much room
+MIN_DURATION = 20
+# Seconds a detection may lie off its event and still match it
+EVENT_TOLERANCE = 2 / FPS
+# Channel whose thresholds decide what counts as detected
+CHANNEL = "youtube"
+
+# Encoder options per benchmark codec; audio is float PCM in every file
+CODECS = {
+    "libx264": ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18', '-pix_fmt', 'yuv420p'],
+    "prores_ks": ['-c:v', 'prores_ks', '-profile:v', '2', '-pix_fmt', 'yuv422p10le'],
+    "mpeg2video": ['-c:v', 'mpeg2video', '-q:v', '2', '-pix_fmt', 'yuv420p'],
+    "ffv1": ['-c:v', 'ffv1', '-pix_fmt', 'yuv420p'],
+}
+
+
+def media_events(duration):
+    """
+    Ground truth of a synthetic file: event key -> list of (start, end) in seconds.
+
+    Positions are fractions of the duration, lengths are fixed; all times
+    fall on frame boundaries. Black runs stay shorter than
+    FREEZE_MIN_DURATION, otherwise they count as freezes too. Flashes last
+    two frames: the scene score of select is min(mafd, |mafd - prev_mafd|),
+    so the cut back after a single-frame flash scores near 0 and only one
+    cut is found.
+    """
+    def at(fraction, length):
+        start = round(duration * fraction * FPS) / FPS
+        return (start, round(start + length, 6))
+
+    return {
+        "black_frames": [at(0.10, 1.0), at(0.60, 1.5)],
+        "media_offline": [at(0.25, 3.0), at(0.72, 3.0)],
+        "fuck_frames": [at(0.40, 2 / FPS), at(0.88, 2 / FPS)],
+        "noise": [at(0.45, 3.0)],
+        "clipping": [at(0.30, 1.0), at(0.80, 0.5)],
+    }
+
+
+def media_filters(width, height, duration):
+    """Video and audio source chains (lavfi filters) that render media_events."""
+    events = media_events(duration)
+
+    def between(intervals):
+        # Frame-exact: end is the first frame after the event
+        return '+'.join(f"between(n,{round(a * FPS)},{round(b * FPS) - 1})" for a, b in intervals)
+
+    video = [f"testsrc2=size={width}x{height}:rate={FPS}:duration={duration}"]
+    video.append(f"drawbox=c=black:t=fill:enable='{between(events['black_frames'])}'")
+    video.append(f"drawbox=c=white:t=fill:enable='{between(events['fuck_frames'])}'")
+    # signalstats TOUT counts pixels that differ from the lines 1 and 2 above and below
+    # while those agree, across three neighbouring columns; per-pixel noise hardly ever
+    # does that. Line dropouts do: horizontally stretched noise on every third line
+    # gives a TOUT of about 0.28 at any resolution and codec here
+    snow = (f"color=c=gray:size={int(width) // 8}x{height}:rate={FPS}:duration={duration},"
+            f"noise=alls=100:allf=t+u,scale={width}:{height}:flags=neighbor,format=yuv420p")
+    lines = (f"color=c=black:size=1x{height}:rate={FPS}:duration={duration},format=gray,"
+             f"geq=lum='255*eq(mod(Y,3),0)',scale={width}:{height}:flags=neighbor")
+    graph = (f"{','.join(video)}[base];{snow}[snow];{lines}[lines];[snow][lines]alphamerge[dropouts];"
+             f"[base][dropouts]overlay=enable='{between(events['noise'])}'")
+    # freezeframes replaces a frame range with one frame of its second input
+    for i, (a, b) in enumerate(events['media_offline']):
+        first, last = round(a * FPS), round(b * FPS) - 1
+        graph += f",split[f{i}a][f{i}b];[f{i}a][f{i}b]freezeframes=first={first}:last={last}:replace={first}"
+
+    overs = '+'.join(f"between(t,{a},{b})" for a, b in events['clipping'])
+    # sine has an amplitude of 1/8: -6 dBFS, below the loud range, and +6 dBFS in the overs
+    audio = (f"sine=frequency=1000:sample_rate=48000:duration={duration},aformat=sample_fmts=flt,"
+             f"volume=4,volume=volume=4:enable='{overs}'")
+    return graph, audio
+
+
+def make_media(workdir, resolution, duration, codec):
+    """Render (or reuse) the synthetic file for one matrix entry and return its path."""
+    path = os.path.join(workdir, f"bench_{resolution}_{duration}s_{codec}.mov")
+    if os.path.exists(path):
+        return path
+    width, height = resolution.split('x')
+    video, audio = media_filters(width, height, duration)
+    cmd = ['ffmpeg', '-v', 'error', '-y', '-filter_complex', f"{video}[v];{audio}[a]",
+           '-map', '[v]', '-map', '[a]', *CODECS[codec], '-c:a', 'pcm_f32le',
+           path + '.tmp.mov']
+    subprocess.run(cmd, check=True)
+    os.replace(path + '.tmp.mov', path)
+    return path
+
+
+def match_events(truth, detected, tolerance=EVENT_TOLERANCE):
+    """Precision and recall of detected (start, end) intervals against the true ones."""
+    def overlaps(d, t):
+        return d[0] < t[1] + tolerance and t[0] < d[1] + tolerance
+
+    matched_detections = sum(any(overlaps(d, t) for t in truth) for d in detected)
+    found = sum(any(overlaps(d, t) for d in detected) for t in truth)
+    return {
+        "truth": len(truth),
+        "detected": len(detected),
+        "precision": round(matched_detections / len(detected), 3) if detected else None,
+        "recall": round(found / len(truth), 3) if truth else None,
+    }
+
+
+def _intervals(items):
+    return [(item["start"], item["end"]) for item in items]
+
+
+def _found_events(step_key, result):
+    """(start, end) intervals an analyzer result reports for an event key."""
+    if result.get("status") == "error":
+        return []
+    if step_key == "black_frames":
+        return _intervals(result["intervals"])
+    if step_key == "media_offline":
+        return _intervals(result["frozen_intervals"])
+    if step_key == "noise":
+        return _intervals(result["noisy_segments"])
+    if step_key == "fuck_frames":
+        return _intervals(result["flash_frames"])
+    return _intervals(result["clipping_segments"])
+
+
+def _run_analyzer(analyzer, path):
+    """Run one analyzer and return {event key: analyzer result} for the events it covers."""
+    config = CHANNEL_CONFIGS[CHANNEL]
+    if analyzer == "metadata":
+        extract_metadata(path)
+        return {}
+    if analyzer == "black_frames":
+        return {analyzer: detect_black_frames(path, config)}
+    if analyzer == "media_offline":
+        return {analyzer: detect_media_offline(path, config)}
+    if analyzer == "noise":
+        return {analyzer: detect_noise(path, config)}
+    if analyzer == "fuck_frames":
+        return {analyzer: detect_fuck_frames(path, config)}
+    if analyzer == "loudness":
+        measure_loudness(path)
+        return {}
+    if analyzer == "clipping":
+        return {analyzer: detect_clipping(path)}
+    job_id = f"bench_{uuid.uuid4().hex[:12]}"
+    if analyzer == "waveform":
+        output = generate_waveform(path, job_id)
+        if output and os.path.exists(output):
+            os.remove(output)
+        return {}
+    if analyzer == "video_pass":
+        raw = run_video_pass(path, list(CHANNEL_CONFIGS.values()), VIDEO_STEPS, threads=os.cpu_count())
+        return {k: channel_result(k, v, config) for k, v in raw.items()}
+    results = run_audio_pass(path, job_id, AUDIO_STEPS)
+    if results.get("waveform_path") and os.path.exists(results["waveform_path"]):
+        os.remove(results["waveform_path"])
+    return {"clipping": results["clipping"]}
+
+
+ANALYZERS = ("metadata", "black_frames", "media_offline", "noise", "fuck_frames", "loudness", "clipping",
+             "waveform", "video_pass", "audio_pass")
+
+
+def _measure(analyzer, path, duration):
+    """Run in a fresh process: wall time, peak RSS and accuracy of one analyzer on one file."""
+    started = time.perf_counter()
+    results = _run_analyzer(analyzer, path)
+    wall = time.perf_counter() - started
+    events = media_events(duration)
+    # ru_maxrss is in KiB on Linux; RUSAGE_CHILDREN holds the largest waited-for child
+    return {
+        "wall_seconds": round(wall, 3),
+        "realtime": round(duration / wall, 2) if wall > 0 else None,
+        "peak_rss_mb": {
+            "python": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "ffmpeg": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        },
+        "accuracy": {key: match_events(events[key], _found_events(key, result))
+                     for key, result in results.items()},
+    }
+
+
+def run_benchmarks(resolutions, durations, codecs, analyzers, workdir):
+    context = multiprocessing.get_context('fork')
+    runs = []
+    for resolution in resolutions:
+        for duration in durations:
+            for codec in codecs:
+                path = make_media(workdir, resolution, duration, codec)
+                media = {"resolution": resolution, "duration": duration, "codec": codec}
+                for analyzer in analyzers:
+                    with context.Pool(1) as pool:
+                        measured = pool.apply(_measure, (analyzer, path, duration))
+                    runs.append({"media": media, "analyzer": analyzer, **measured})
+                    print(f"{resolution} {duration}s {codec:10} {analyzer:14} "
+                          f"{measured['realtime']:>8}x  {measured['peak_rss_mb']['ffmpeg']:>8} MB",
+                          file=sys.stderr)
+    return runs
+
+
+def _environment():
+    def first_line(cmd):
+        try:
+            return subprocess.run(cmd, capture_output=True, text=True, timeout=10).stdout.split('\n')[0]
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    return {
+        "commit": first_line(['git', '-C', os.path.dirname(os.path.abspath(__file__)), 'rev-parse', 'HEAD']),
+        "ffmpeg": first_line(['ffmpeg', '-version']),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def _run_key(run):
+    media = run["media"]
+    return f"{media['resolution']} {media['duration']}s {media['codec']} {run['analyzer']}"
+
+
+def compare(old, new):
+    """Lines describing how throughput, peak RSS and accuracy changed from old to new."""
+    old_runs = {_run_key(r): r for r in old["runs"]}
+    lines = [f"{(old['environment']['commit'] or '?')[:10]} -> {(new['environment']['commit'] or '?')[:10]}"]
+    for run in new["runs"]:
+        key = _run_key(run)
+        before = old_runs.get(key)
+        if before is None:
+            lines.append(f"{key}: neu")
+            continue
+        changes = []
+        if before["realtime"] and run["realtime"]:
+            changes.append(f"{run['realtime']}x ({(run['realtime'] / before['realtime'] - 1) * 100:+.0f}%)")
+        for proc in ("python", "ffmpeg"):
+            a, b = before["peak_rss_mb"][proc], run["peak_rss_mb"][proc]
+            if a and abs(b - a) / a > 0.05:
+                changes.append(f"RSS {proc} {a} -> {b} MB")
+        for event, acc in run["accuracy"].items():
+            prev = before["accuracy"].get(event, {})
+            for metric in ("precision", "recall"):
+                if prev.get(metric) != acc[metric]:
+                    changes.append(f"{event} {metric} {prev.get(metric)} -> {acc[metric]}")
+        lines.append(f"{key}: {', '.join(changes)}")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark der Analyzer auf synthetischen Testdateien")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help="Benchmark ausfuehren")
+    run.add_argument('-o', '--output', required=True, help="Ergebnisdatei (JSON)")
+    run.add_argument('--resolutions', default='1280x720,1920x1080', help="z.B. 1280x720,3840x2160")
+    run.add_argument('--durations', default='30', help="Sekunden, kommagetrennt (mindestens 20)")
+    run.add_argument('--codecs', default='libx264', help=f"Kommagetrennt aus {', '.join(CODECS)}")
+    run.add_argument('--analyzers', default=','.join(ANALYZERS), help="Kommagetrennt (Standard: alle)")
+    run.add_argument('--workdir', help="Verzeichnis fuer die Testdateien (werden wiederverwendet)")
+    cmp = commands.add_parser('compare', help="Zwei Ergebnisdateien vergleichen")
+    cmp.add_argument('old')
+    cmp.add_argument('new')
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        with open(args.old) as f_old, open(args.new) as f_new:
+            print('\n'.join(compare(json.load(f_old), json.load(f_new))))
+        return 0
+
+    durations = [int(d) for d in args.durations.split(',')]
+    codecs = args.codecs.split(',')
+    analyzers = args.analyzers.split(',')
+    if min(durations) < MIN_DURATION:
+        parser.error(f"Dauer mindestens {MIN_DURATION} s")
+    if any(c not in CODECS for c in codecs) or any(a not in ANALYZERS for a in analyzers):
+        parser.error("Unbekannter Codec oder Analyzer")
+    workdir = args.workdir or tempfile.mkdtemp(prefix='qc-bench-')
+    os.makedirs(workdir, exist_ok=True)
+
+    runs = run_benchmarks(args.resolutions.split(','), durations, codecs, analyzers, workdir)
+    with open(args.output, 'w') as f:
+        json.dump({"version": RESULT_VERSION, "created_at": time.time(), "environment": _environment(),
+                   "channel": CHANNEL, "runs": runs}, f, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""
+Headless bulk QC — analyzes files on local disk without the web app.
+
+    python cli.py /archiv/2024 /archiv/2025/spot.mov --channel tv_broadcast -o qc.jsonl
+
+Directories are searched recursively for media files. The files are spread
+over a process pool; every finished file is appended to the output as one
+JSON line (path, key, status, metadata, checks, overall) right away. Files
+whose line in the output already reports a complete analysis (same path,
+size and modification time) are skipped, so an interrupted sweep continues
+where it stopped when run again with the same output file. Files whose
+analysis failed are tried again.
+
+The exit code is 1 if any analysis failed, 0 otherwise (QC verdicts do not
+change it).
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+import uuid
+
+from config import CHANNEL_CONFIGS, JOB_CPU_BUDGET
+from analyzers.metadata import extract_metadata
+from analyzers.video_pass import VIDEO_STEPS, run_video_pass
+from analyzers.audio_pass import AUDIO_STEPS, run_audio_pass
+from analyzers.accuracy import ACCURACY_LEVELS, DEFAULT_ACCURACY, accuracy_info, unsupported_steps
+from analyzers.quality_checks import score_channel
+from analyzers.waveform import waveform_path
+from result_cache import stat_key
+from scheduler import Task, run_tasks
+
+MEDIA_EXTENSIONS = {'.mp4', '.mov', '.mxf', '.mkv', '.avi', '.m4v', '.mts', '.m2ts', '.ts', '.webm',
+                    '.wav', '.mp3', '.aac', '.m4a', '.flac', '.aif', '.aiff'}
+ANALYSIS_STEPS = list(VIDEO_STEPS) + list(AUDIO_STEPS)
+
+
+def analyze_file(path, channel, enabled_steps=None, accuracy=DEFAULT_ACCURACY, threads=JOB_CPU_BUDGET):
+    """
+    Analyze one file and score it for a channel, like a job of the web app.
+
+    Returns:
+        dict with metadata, checks, overall and accuracy of the channel
+
+    Raises:
+        RuntimeError if the metadata cannot be read
+    """
+    enabled_steps = set(ANALYSIS_STEPS if enabled_steps is None else enabled_steps)
+    skipped_steps = enabled_steps & set(unsupported_steps(accuracy))
+    enabled_steps -= skipped_steps
+
+    metadata = extract_metadata(path, original_filename=os.path.basename(path))
+    if metadata.get('status') == 'error':
+        raise RuntimeError(f"Metadaten-Extraktion fehlgeschlagen: {metadata.get('message')}")
+    duration = metadata.get('duration', 0)
+    timeout = max(600, int(duration * 3) + 120)
+    profiles = list(CHANNEL_CONFIGS.values())
+    audio_threads = 1
+    video_threads = max(1, threads - audio_threads)
+
+    def video_task():
+        steps = [s for s in VIDEO_STEPS if s in enabled_steps]
+        if metadata.get('video') is None or not steps:
+            return {}
+        return run_video_pass(path, profiles, steps, timeout=timeout, threads=video_threads,
+                              accuracy=accuracy, duration=duration, max_shards=max(1, video_threads // 2))
+
+    def audio_task():
+        steps = [s for s in AUDIO_STEPS if s in enabled_steps]
+        if metadata.get('audio') is None or not steps:
+            return {}
+        # The pass always renders a waveform; the CLI has no use for it
+        results = run_audio_pass(path, f"cli_{uuid.uuid4().hex[:12]}", steps, timeout=timeout,
+                                 threads=audio_threads, accuracy=accuracy)
+        wave = results.pop("waveform_path", None)
+        if wave and os.path.exists(wave):
+            os.remove(wave)
+        return results
+
+    results = run_tasks([
+        Task("video", video_task, cost=video_threads),
+        Task("audio", audio_task, cost=audio_threads),
+    ], threads)
+    raw = {
+        "metadata": metadata,
+        "video": results["video"],
+        "audio": results["audio"],
+        "enabled_steps": sorted(enabled_steps | {"metadata", "checks"}),
+    }
+    scored = score_channel(raw, channel)
+    return {
+        "metadata": metadata,
+        "checks": scored["checks"],
+        "overall": scored["overall"],
+        "accuracy": accuracy_info(accuracy, skipped_steps),
+    }
+
+
+def find_media(paths):
+    """Media files among the given files and directories (recursively), sorted per directory."""
+    for path in paths:
+        if os.path.isfile(path):
+            yield os.path.abspath(path)
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if os.path.splitext(name)[1].lower() in MEDIA_EXTENSIONS and not name.startswith('.'):
+                    yield os.path.abspath(os.path.join(dirpath, name))
+
+
+def completed_keys(output):
+    """Keys of the files the output already holds a complete result for."""
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # Line cut off by an interrupted run
+            if entry.get("status") == "complete":
+                done.add(entry["key"])
+            else:
+                done.discard(entry.get("key"))
+    return done
+
+
+def _init_worker():
+    # Ctrl-C is handled by the parent, which stops the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _run_one(task):
+    path, key, options = task
+    started = time.time()
+    entry = {"path": path, "key": key, "channel": options["channel"]}
+    try:
+        entry.update(analyze_file(path, options["channel"], options["enabled_steps"],
+                                  options["accuracy"], options["threads"]))
+        entry["status"] = "complete"
+    except Exception as e:
+        entry["status"] = "error"
+        entry["error"] = str(e)
+    entry["elapsed_seconds"] = round(time.time() - started, 1)
+    return entry
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Video QC fuer Dateien auf lokalen Laufwerken")
+    parser.add_argument('paths', nargs='+', help="Dateien oder Verzeichnisse (rekursiv)")
+    parser.add_argument('-c', '--channel', default='youtube', choices=sorted(CHANNEL_CONFIGS),
+                        help="Zielkanal (Standard: youtube)")
+    parser.add_argument('-o', '--output', required=True,
+                        help="JSON-Lines-Datei; vorhandene Ergebnisse werden uebersprungen")
+    parser.add_argument('-j', '--jobs', type=int, default=max(1, (os.cpu_count() or 2) // JOB_CPU_BUDGET),
+                        help="Dateien, die gleichzeitig analysiert werden")
+    parser.add_argument('--steps', help=f"Kommagetrennte Analysen (Standard: alle; {', '.join(ANALYSIS_STEPS)})")
+    parser.add_argument('--accuracy', default=DEFAULT_ACCURACY, choices=list(ACCURACY_LEVELS),
+                        help="Genauigkeitsstufe (Standard: full)")
+    args = parser.parse_args(argv)
+
+    enabled_steps = args.steps.split(',') if args.steps else None
+    unknown = [s for s in enabled_steps or [] if s not in ANALYSIS_STEPS]
+    if unknown:
+        parser.error(f"Unbekannte Analyse: {', '.join(unknown)}")
+    jobs = max(1, args.jobs)
+    options = {
+        "channel": args.channel,
+        "enabled_steps": enabled_steps,
+        "accuracy": args.accuracy,
+        # The CPUs are shared by the files analyzed at once
+        "threads": max(1, (os.cpu_count() or 2) // jobs),
+    }
+
+    done = completed_keys(args.output)
+    tasks = []
+    for path in find_media(args.paths):
+        try:
+            key = stat_key(path)
+        except OSError as e:
+            print(f"{path}: {e}", file=sys.stderr)
+            continue
+        if key not in done:
+            tasks.append((path, key, options))
+    print(f"{len(tasks)} Dateien zu analysieren, {len(done)} bereits erledigt", file=sys.stderr)
+
+    failed = 0
+    pool = multiprocessing.Pool(jobs, initializer=_init_worker)
+    try:
+        with open(args.output, 'a') as out:
+            for n, entry in enumerate(pool.imap_unordered(_run_one, tasks), 1):
+                out.write(json.dumps(entry) + '\n')
+                out.flush()
+                verdict = entry["overall"]["status"] if entry["status"] == "complete" else "error"
+                failed += entry["status"] == "error"
+                print(f"[{n}/{len(tasks)}] {verdict:7} {entry['path']}", file=sys.stderr)
+        pool.close()
+    except KeyboardInterrupt:
+        pool.terminate()
+        print("Abgebrochen; erneuter Aufruf mit derselben Ausgabedatei setzt fort", file=sys.stderr)
+        return 130
+    finally:
+        pool.join()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,6 +2,37 @@ import os
 
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
 MAX_CONTENT_LENGTH = 100 * 1024 * 1024 * 1024  # 100 GB
+# Default chunk size of the chunked upload API
+UPLOAD_CHUNK_SIZE = int(os.environ.get('QC_UPLOAD_CHUNK_MB', 64)) * 1024 * 1024
+
+# Server-side directories whose files may be analyzed in place (os.pathsep-separated);
+# empty disables /api/analyze/path
+ANALYZE_ROOTS = [os.path.realpath(p) for p in os.environ.get('QC_ANALYZE_ROOTS', '').split(os.pathsep) if p]
+
+# SQLite job store shared by all workers (must be on a local filesystem for WAL)
+JOB_DB_PATH = os.environ.get('QC_JOB_DB', os.path.join(os.path.dirname(__file__), 'jobs.db'))
+
+# Content-hash cache for raw analyzer results (LRU-evicted beyond the size limit)
+CACHE_FOLDER = os.environ.get('QC_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'cache'))
+CACHE_MAX_BYTES = int(os.environ.get('QC_CACHE_MAX_MB', 1024)) * 1024 * 1024
+
+# CPU threads one analysis job may keep busy across its concurrent steps
+JOB_CPU_BUDGET = int(os.environ.get('QC_JOB_CPU_BUDGET', os.cpu_count() or 2))
+
+# Parallel time shards of the video pass for long files (1 disables sharding)
+VIDEO_SHARDS = int(os.environ.get('QC_VIDEO_SHARDS', max(1, JOB_CPU_BUDGET // 2)))
+
+# Analysis jobs running at once (across all workers, at least one) and jobs allowed
+# to wait; further uploads are refused with 429
+MAX_CONCURRENT_JOBS = max(1, int(os.environ.get('QC_MAX_CONCURRENT_JOBS', (os.cpu_count() or 2) // JOB_CPU_BUDGET)))
+# Analysis threads of each worker (0: the worker only serves the API, others run the queue)
+ANALYSIS_THREADS = int(os.environ.get('QC_ANALYSIS_THREADS', MAX_CONCURRENT_JOBS))
+MAX_QUEUED_JOBS = int(os.environ.get('QC_MAX_QUEUED_JOBS', 20))
+# Files per batch; batch jobs queue behind interactive ones and outside MAX_QUEUED_JOBS
+MAX_BATCH_FILES = int(os.environ.get('QC_MAX_BATCH_FILES', 500))
+
+# Open status streams per worker; each holds one server thread, further clients poll
+MAX_STATUS_STREAMS = int(os.environ.get('QC_MAX_STATUS_STREAMS', 8))
 
 PASS = "pass"
 WARN = "warning"
@@ -0,0 +1,151 @@
+"""
+Learned step time estimates.
+
+How long a step takes depends on much more than the media duration: the
+video pass over 4K HEVC costs many times what it costs over 720p H.264.
+Every completed job records the measured wall time of each pass it ran
+together with the file's features (see features). A pass is the set of
+steps that shared one decode (pass_key), e.g. the fused video pass over
+all four detectors; a step run on its own is a pass of one. Per pass, a
+least-squares model predicts log(seconds) from
+
+    log duration, log pixels (width x height), log fps, log bitrate,
+    audio channels, one indicator per video codec and per accuracy level
+
+with the continuous features standardized and a small ridge penalty, so a
+few dozen jobs already give a stable fit. Only passes are learned, never
+the steps inside one: the split of a pass's wall time across its steps
+(see _finish_steps in app.py) follows their estimates, so training on it
+would teach the models their own estimates.
+
+A pass is estimated by its model once it has MIN_SAMPLES measurements, of
+which at least MIN_LEVEL_SAMPLES at the job's accuracy level; until then
+estimate() returns None and the caller falls back to the static table
+(STEP_ESTIMATES in app.py). Samples live in the job store, so every worker
+learns from the jobs of all; each worker refits at most every
+REFIT_INTERVAL seconds. Only the newest MAX_SAMPLES per pass are kept, so
+the models follow hardware and ffmpeg upgrades.
+"""
+
+import json
+import math
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+import job_store
+
+MIN_SAMPLES = 20
+MIN_LEVEL_SAMPLES = 5
+MAX_SAMPLES = 2000
+REFIT_INTERVAL = 300
+RIDGE = 1.0
+
+_models = {}
+_fitted_at = None
+_lock = threading.Lock()
+
+
+def features(metadata, accuracy):
+    """Features of a file (from extract_metadata) and accuracy level the step times depend on."""
+    video = metadata.get("video") or {}
+    audio = metadata.get("audio") or {}
+    return {
+        "duration": metadata.get("duration") or 0,
+        "codec": video.get("codec") or "none",
+        "width": video.get("width") or 0,
+        "height": video.get("height") or 0,
+        "fps": video.get("framerate") or 0,
+        "bitrate_kbps": metadata.get("overall_bitrate_kbps") or video.get("bitrate_kbps") or 0,
+        "audio_channels": audio.get("channels") or 0,
+        "accuracy": accuracy,
+    }
+
+
+def pass_key(step_keys):
+    """Model key of a pass: its steps, sorted and joined with '+'."""
+    return '+'.join(sorted(step_keys))
+
+
+def record(samples):
+    """
+    Store measured pass times.
+
+    Args:
+        samples: List of (step_keys, features, seconds), one per pass
+    """
+    try:
+        job_store.add_pass_timings([(pass_key(step_keys), json.dumps(feats), seconds)
+                                    for step_keys, feats, seconds in samples], MAX_SAMPLES)
+    except sqlite3.Error:
+        pass  # Estimates are a convenience; a busy database must not fail the job
+
+
+def estimate(step_keys, feats):
+    """Predicted seconds of a pass running step_keys for a file, or None while the model lacks data."""
+    model = _model(pass_key(step_keys))
+    if model is None or model["levels"].get(feats["accuracy"], 0) < MIN_LEVEL_SAMPLES:
+        return None
+    return math.exp(float(_design_row(feats, model) @ model["coef"]))
+
+
+def _model(key):
+    global _fitted_at
+    with _lock:
+        if _fitted_at is None or time.time() - _fitted_at > REFIT_INTERVAL:
+            try:
+                rows = job_store.pass_timings()
+            except sqlite3.Error:
+                rows = None  # Keep the current models; retried on the next call
+            if rows is not None:
+                samples = {}
+                for key, feats, seconds in rows:
+                    samples.setdefault(key, []).append((json.loads(feats), seconds))
+                _models.clear()
+                _models.update({key: _fit(s) for key, s in samples.items() if len(s) >= MIN_SAMPLES})
+                _fitted_at = time.time()
+        return _models.get(key)
+
+
+def _fit(samples):
+    """Ridge regression of log(seconds) on the design rows of the samples."""
+    feats = [f for f, _ in samples]
+    levels = {}
+    for f in feats:
+        levels[f["accuracy"]] = levels.get(f["accuracy"], 0) + 1
+    continuous = np.array([_continuous(f) for f in feats])
+    std = continuous.std(axis=0)
+    model = {
+        "codecs": sorted({f["codec"] for f in feats}),
+        "levels": levels,
+        "mean": continuous.mean(axis=0),
+        "std": np.where(std > 0, std, 1.0),
+    }
+    x = np.array([_design_row(f, model) for f in feats])
+    y = np.log([max(seconds, 0.01) for _, seconds in samples])
+    penalty = RIDGE * np.eye(x.shape[1])
+    penalty[0, 0] = 0  # The intercept is not shrunk
+    model["coef"] = np.linalg.solve(x.T @ x + penalty, x.T @ y)
+    return model
+
+
+def _continuous(f):
+    return [
+        math.log(max(f["duration"], 1)),
+        math.log1p(f["width"] * f["height"]),
+        math.log1p(f["fps"]),
+        math.log1p(f["bitrate_kbps"]),
+        f["audio_channels"],
+    ]
+
+
+def _design_row(f, model):
+    # Codecs and levels not seen in the samples get no indicator
+    return np.concatenate([
+        [1.0],
+        (np.array(_continuous(f)) - model["mean"]) / model["std"],
+        [float(f["codec"] == codec) for codec in model["codecs"]],
+        [float(f["accuracy"] == level) for level in model["levels"]],
+    ])
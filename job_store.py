@@ -0,0 +1,439 @@
+"""
+Job store shared by all gunicorn workers.
+
+Jobs live in a SQLite database in WAL mode, so a status poll can land on
+any worker: readers get a consistent snapshot without blocking the worker
+that is writing step updates, and every update is a read-modify-write
+inside one IMMEDIATE transaction.
+
+Each job row holds the job state as JSON (the dict the status endpoint
+reports), the raw measurements and the execution trace of a finished job in
+separate columns (so polls do not load them), the arguments to run the analysis and the worker
+that owns it. New jobs are "queued"; the analysis threads of all workers
+take them in insertion order with claim_next, which keeps the number of
+running jobs below a global limit. Workers write a heartbeat; running jobs
+whose owner stopped beating (restart, crash) are queued again.
+
+Chunked uploads in progress are tracked here as well, so the chunks of one
+upload can arrive on different workers. A streaming upload also records the
+job that analyzes it while it arrives; finalizing it only sets a flag, the
+job removes the upload once it is done reading.
+
+A batch groups the jobs of a delivery package. Its jobs share the queue and
+the running limit with all others, but interactive jobs are claimed first
+and batch jobs do not count against the queue limit; they expire together
+with their batch.
+
+The counters behind /metrics (see metrics.py) and the measured pass times
+the estimates learn from (see estimator.py) are kept here too, so every
+worker adds to the same totals; gauges that belong to one worker (its
+running ffmpeg processes) travel with its heartbeat.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from config import JOB_DB_PATH
+
+# Identifies this process as owner of the jobs it runs
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+_local = threading.local()
+
+ACTIVE = ('queued', 'running')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    state TEXT NOT NULL,
+    raw TEXT,
+    upload_key TEXT,
+    run_args TEXT,
+    owner TEXT,
+    expires_at REAL,
+    batch_id TEXT,
+    trace TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_upload_key ON jobs (upload_key, status);
+CREATE TABLE IF NOT EXISTS uploads (
+    upload_id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    chunk_size INTEGER NOT NULL,
+    received TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    job_id TEXT,
+    finalized INTEGER NOT NULL DEFAULT 0,
+    ready INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    expires_at REAL
+);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    heartbeat REAL NOT NULL,
+    ffmpeg_processes INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS pass_timings (
+    pass_key TEXT NOT NULL,
+    features TEXT NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pass_timings_pass_key ON pass_timings (pass_key);
+CREATE TABLE IF NOT EXISTS metrics (
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (name, labels)
+);
+"""
+
+
+def _conn():
+    """One connection per thread; transactions are managed explicitly."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(JOB_DB_PATH, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        _local.conn = conn
+    return conn
+
+
+@contextmanager
+def _transaction():
+    conn = _conn()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
+def init():
+    os.makedirs(os.path.dirname(JOB_DB_PATH) or '.', exist_ok=True)
+    conn = _conn()
+    conn.executescript(_SCHEMA)
+    # Databases created before streaming uploads, batches, metrics and traces lack these columns
+    for table, column, decl in (("uploads", "job_id", "TEXT"), ("jobs", "batch_id", "TEXT"),
+                                ("jobs", "trace", "TEXT"), ("uploads", "finalized", "INTEGER NOT NULL DEFAULT 0"),
+                                ("workers", "ffmpeg_processes", "INTEGER NOT NULL DEFAULT 0"),
+                                ("uploads", "ready", "INTEGER NOT NULL DEFAULT 0")):
+        if column not in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}:
+            try:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+            except sqlite3.OperationalError:
+                pass  # Added by another worker in the meantime
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id)")
+    # Per-step samples held estimate-proportional shares of the fused passes
+    conn.execute("DROP TABLE IF EXISTS step_timings")
+
+
+class QueueFull(Exception):
+    """The queue already holds the maximum number of waiting jobs."""
+
+
+def create(job, upload_key=None, run_args=None, max_queued=None, batch_id=None):
+    """
+    Insert a new job, unless the same upload is already queued or running.
+
+    Jobs of a batch (batch_id) are not counted against max_queued.
+
+    Returns:
+        (job_id, created): the new job's id and True, or the id of the
+        active job with the same upload_key and False
+
+    Raises:
+        QueueFull if max_queued jobs are already waiting
+    """
+    with _transaction() as conn:
+        if upload_key is not None:
+            row = conn.execute(
+                "SELECT job_id FROM jobs WHERE upload_key = ? AND status IN (?, ?)",
+                (upload_key, *ACTIVE)).fetchone()
+            if row:
+                return row[0], False
+        if max_queued is not None and count('queued', conn, batched=False) >= max_queued:
+            raise QueueFull()
+        conn.execute(
+            "INSERT INTO jobs (job_id, status, state, upload_key, run_args, owner, batch_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job["job_id"], job["status"], json.dumps(job), upload_key,
+             json.dumps(run_args), WORKER_ID, batch_id))
+    return job["job_id"], True
+
+
+def count(status, conn=None, batched=None):
+    """Number of jobs with a status; batched=False counts only jobs outside batches."""
+    conn = conn or _conn()
+    query = "SELECT COUNT(*) FROM jobs WHERE status = ?"
+    if batched is not None:
+        query += " AND batch_id IS NOT NULL" if batched else " AND batch_id IS NULL"
+    return conn.execute(query, (status,)).fetchone()[0]
+
+
+# Queue order: interactive jobs first, then batch jobs, each in insertion order
+_QUEUE_ORDER = "ORDER BY batch_id IS NOT NULL, rowid"
+
+
+def active_jobs():
+    """States of all queued and running jobs, in queue order."""
+    rows = _conn().execute(
+        f"SELECT state FROM jobs WHERE status IN (?, ?) {_QUEUE_ORDER}", ACTIVE).fetchall()
+    return [json.loads(row[0]) for row in rows]
+
+
+def claim_next(max_running):
+    """
+    Take the oldest queued job if fewer than max_running jobs are running.
+
+    Jobs of streaming uploads are passed over until their upload is ready
+    (see mark_upload_ready), so an upload that is slow to start or abandoned
+    does not hold a running slot while no data comes in.
+
+    Returns:
+        (job_id, run_args) of the job, now running and owned by this
+        worker, or None
+    """
+    with _transaction() as conn:
+        if count('running', conn) >= max_running:
+            return None
+        row = conn.execute(
+            "SELECT job_id, state, run_args FROM jobs WHERE status = 'queued' AND job_id NOT IN "
+            f"(SELECT job_id FROM uploads WHERE job_id IS NOT NULL AND ready = 0) {_QUEUE_ORDER} LIMIT 1"
+        ).fetchone()
+        if row is None:
+            return None
+        job_id, state, run_args = row
+        job = json.loads(state)
+        job["status"] = "running"
+        job["started_at"] = time.time()
+        conn.execute("UPDATE jobs SET status = 'running', state = ?, owner = ? WHERE job_id = ?",
+                     (json.dumps(job), WORKER_ID, job_id))
+    return job_id, json.loads(run_args) if run_args else None
+
+
+def get_run_args(job_id):
+    row = _conn().execute("SELECT run_args FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    return json.loads(row[0]) if row and row[0] else None
+
+
+def get(job_id):
+    """Snapshot of a job's state, or None."""
+    row = _conn().execute("SELECT state FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+@contextmanager
+def edit(job_id):
+    """Atomically update a job: yields its state dict and writes it back on exit."""
+    with _transaction() as conn:
+        row = conn.execute("SELECT state FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            raise KeyError(job_id)
+        job = json.loads(row[0])
+        yield job
+        conn.execute("UPDATE jobs SET status = ?, state = ? WHERE job_id = ?",
+                     (job["status"], json.dumps(job), job_id))
+
+
+def set_raw(job_id, raw):
+    with _transaction() as conn:
+        conn.execute("UPDATE jobs SET raw = ? WHERE job_id = ?", (json.dumps(raw), job_id))
+
+
+def get_raw(job_id):
+    row = _conn().execute("SELECT raw FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    return json.loads(row[0]) if row and row[0] else None
+
+
+def set_trace(job_id, trace):
+    with _transaction() as conn:
+        conn.execute("UPDATE jobs SET trace = ? WHERE job_id = ?", (json.dumps(trace), job_id))
+
+
+def get_trace(job_id):
+    row = _conn().execute("SELECT trace FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    return json.loads(row[0]) if row and row[0] else None
+
+
+def expire(job_id, after):
+    """Schedule a finished job for removal after the given seconds (once); batch jobs expire with their batch."""
+    with _transaction() as conn:
+        conn.execute("UPDATE jobs SET expires_at = ? WHERE job_id = ? AND expires_at IS NULL "
+                     "AND batch_id IS NULL", (time.time() + after, job_id))
+
+
+def purge():
+    """Delete expired jobs and batches and return the last states of the jobs."""
+    with _transaction() as conn:
+        now = time.time()
+        rows = conn.execute("SELECT state FROM jobs WHERE expires_at < ?", (now,)).fetchall()
+        conn.execute("DELETE FROM jobs WHERE expires_at < ?", (now,))
+        conn.execute("DELETE FROM batches WHERE expires_at < ?", (now,))
+    return [json.loads(row[0]) for row in rows]
+
+
+def create_batch(batch):
+    with _transaction() as conn:
+        conn.execute("INSERT INTO batches (batch_id, state) VALUES (?, ?)",
+                     (batch["batch_id"], json.dumps(batch)))
+
+
+def get_batch(batch_id):
+    row = _conn().execute("SELECT state FROM batches WHERE batch_id = ?", (batch_id,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def batch_jobs(batch_id):
+    """States of the jobs of a batch, by job_id."""
+    rows = _conn().execute("SELECT job_id, state FROM jobs WHERE batch_id = ?", (batch_id,)).fetchall()
+    return {job_id: json.loads(state) for job_id, state in rows}
+
+
+def expire_batch(batch_id, after):
+    """Schedule a finished batch and its jobs for removal after the given seconds (once)."""
+    with _transaction() as conn:
+        expires_at = time.time() + after
+        conn.execute("UPDATE batches SET expires_at = ? WHERE batch_id = ? AND expires_at IS NULL",
+                     (expires_at, batch_id))
+        conn.execute("UPDATE jobs SET expires_at = ? WHERE batch_id = ? AND expires_at IS NULL",
+                     (expires_at, batch_id))
+
+
+def heartbeat(ffmpeg_processes=0):
+    with _transaction() as conn:
+        conn.execute("INSERT OR REPLACE INTO workers (worker_id, heartbeat, ffmpeg_processes) VALUES (?, ?, ?)",
+                     (WORKER_ID, time.time(), ffmpeg_processes))
+
+
+def worker_stats(stale_after):
+    """(workers, ffmpeg processes) summed over the workers that sent a heartbeat within stale_after seconds."""
+    row = _conn().execute("SELECT COUNT(*), COALESCE(SUM(ffmpeg_processes), 0) FROM workers WHERE heartbeat >= ?",
+                          (time.time() - stale_after,)).fetchone()
+    return row[0], row[1]
+
+
+def claim_orphans(stale_after):
+    """
+    Take over running jobs whose owner has not sent a heartbeat for stale_after seconds.
+
+    Returns:
+        List of (job_id, run_args) now owned by this worker
+    """
+    with _transaction() as conn:
+        cutoff = time.time() - stale_after
+        rows = conn.execute(
+            "SELECT j.job_id, j.run_args FROM jobs j LEFT JOIN workers w ON w.worker_id = j.owner "
+            "WHERE j.status = 'running' AND j.owner != ? AND (w.heartbeat IS NULL OR w.heartbeat < ?)",
+            (WORKER_ID, cutoff)).fetchall()
+        for job_id, _ in rows:
+            conn.execute("UPDATE jobs SET owner = ? WHERE job_id = ?", (WORKER_ID, job_id))
+        conn.execute("DELETE FROM workers WHERE heartbeat < ?", (cutoff,))
+    return [(job_id, json.loads(run_args) if run_args else None) for job_id, run_args in rows]
+
+
+def add_metrics(increments):
+    """Add to counters in one transaction; increments is a list of (name, labels, amount)."""
+    with _transaction() as conn:
+        conn.executemany(
+            "INSERT INTO metrics (name, labels, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value", increments)
+
+
+def metric_values():
+    """All counters as (name, labels, value) rows."""
+    return _conn().execute("SELECT name, labels, value FROM metrics").fetchall()
+
+
+def add_pass_timings(rows, keep):
+    """Insert (pass_key, features, seconds) rows and keep only the newest keep rows per pass."""
+    with _transaction() as conn:
+        conn.executemany("INSERT INTO pass_timings (pass_key, features, seconds) VALUES (?, ?, ?)", rows)
+        for pass_key in {row[0] for row in rows}:
+            conn.execute("DELETE FROM pass_timings WHERE pass_key = ? AND rowid NOT IN "
+                         "(SELECT rowid FROM pass_timings WHERE pass_key = ? ORDER BY rowid DESC LIMIT ?)",
+                         (pass_key, pass_key, keep))
+
+
+def pass_timings():
+    """All measured pass times as (pass_key, features, seconds) rows."""
+    return _conn().execute("SELECT pass_key, features, seconds FROM pass_timings").fetchall()
+
+
+def create_upload(upload_id, filename, path, size, chunk_size):
+    with _transaction() as conn:
+        conn.execute(
+            "INSERT INTO uploads (upload_id, filename, path, size, chunk_size, received, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, '[]', ?)",
+            (upload_id, filename, path, size, chunk_size, time.time()))
+
+
+def get_upload(upload_id):
+    """Upload as dict (received: sorted chunk indices, updated_at: time of the last chunk), or None."""
+    row = _conn().execute(
+        "SELECT filename, path, size, chunk_size, received, job_id, finalized, updated_at FROM uploads "
+        "WHERE upload_id = ?", (upload_id,)).fetchone()
+    if row is None:
+        return None
+    filename, path, size, chunk_size, received, job_id, finalized, updated_at = row
+    return {"upload_id": upload_id, "filename": filename, "path": path, "size": size,
+            "chunk_size": chunk_size, "received": json.loads(received), "job_id": job_id,
+            "finalized": bool(finalized), "updated_at": updated_at}
+
+
+def set_upload_job(upload_id, job_id):
+    """Record the job analyzing a streaming upload."""
+    with _transaction() as conn:
+        conn.execute("UPDATE uploads SET job_id = ? WHERE upload_id = ?", (job_id, upload_id))
+
+
+def finalize_upload(upload_id):
+    """Mark a streaming upload as complete; its job deletes it after reading."""
+    with _transaction() as conn:
+        conn.execute("UPDATE uploads SET finalized = 1, ready = 1, updated_at = ? WHERE upload_id = ?",
+                     (time.time(), upload_id))
+
+
+def mark_upload_ready(upload_id):
+    """Let claim_next start the job of a streaming upload whose data is coming in."""
+    with _transaction() as conn:
+        conn.execute("UPDATE uploads SET ready = 1 WHERE upload_id = ?", (upload_id,))
+
+
+def mark_chunk(upload_id, index):
+    """Record a verified chunk. Returns the received chunk indices before it, or None if the upload is gone."""
+    with _transaction() as conn:
+        row = conn.execute("SELECT received FROM uploads WHERE upload_id = ?", (upload_id,)).fetchone()
+        if row is None:
+            return None
+        before = json.loads(row[0])
+        received = sorted(set(before) | {index})
+        conn.execute("UPDATE uploads SET received = ?, updated_at = ? WHERE upload_id = ?",
+                     (json.dumps(received), time.time(), upload_id))
+    return before
+
+
+def delete_upload(upload_id):
+    with _transaction() as conn:
+        conn.execute("DELETE FROM uploads WHERE upload_id = ?", (upload_id,))
+
+
+def purge_uploads(idle_after):
+    """Forget uploads without activity for idle_after seconds and return their file paths."""
+    with _transaction() as conn:
+        cutoff = time.time() - idle_after
+        rows = conn.execute("SELECT path FROM uploads WHERE updated_at < ?", (cutoff,)).fetchall()
+        conn.execute("DELETE FROM uploads WHERE updated_at < ?", (cutoff,))
+    return [row[0] for row in rows]
@@ -0,0 +1,187 @@
+"""
+Pipeline metrics in the Prometheus text format, served at /metrics.
+
+Counters and histograms are written to the job store (see job_store.py)
+instead of process memory: gunicorn runs several workers and a scrape lands
+on any one of them, so each worker adds its observations to the same rows
+and every worker reports the totals of all. Histograms are stored as their
+cumulative buckets plus _sum and _count, i.e. as plain counters as well.
+Gauges are read when scraped: queue depth from the jobs table, running
+ffmpeg processes from the heartbeats of the live workers.
+
+Writes happen once per finished step, pass, ffmpeg process and received
+upload, not per frame. A failing write is dropped; metrics must never fail
+an analysis or an upload.
+"""
+
+import math
+import sqlite3
+
+import job_store
+from analyzers import ffmpeg_runner
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Heartbeats older than this belong to workers that are gone
+WORKER_STALE_AFTER = 30
+
+METRICS = {
+    "qc_step_duration_seconds": {
+        "type": "histogram",
+        "help": "Wall time of an analysis step (fused steps share their pass's time by estimate)",
+        "buckets": (1, 2, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200),
+    },
+    "qc_realtime_factor": {
+        "type": "histogram",
+        "help": "Media duration divided by wall time of a decoding pass, by analyzer and resolution class",
+        "buckets": (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128),
+    },
+    "qc_jobs_finished_total": {
+        "type": "counter",
+        "help": "Analysis jobs finished, by outcome",
+    },
+    "qc_jobs": {
+        "type": "gauge",
+        "help": "Jobs waiting or running, by status and kind (interactive or batch)",
+    },
+    "qc_workers": {
+        "type": "gauge",
+        "help": "Workers with a recent heartbeat",
+    },
+    "qc_ffmpeg_processes": {
+        "type": "gauge",
+        "help": "ffmpeg processes running on all live workers",
+    },
+    "qc_ffmpeg_cpu_seconds_total": {
+        "type": "counter",
+        "help": "User plus system CPU time of finished ffmpeg processes",
+    },
+    "qc_ffmpeg_max_rss_bytes": {
+        "type": "histogram",
+        "help": "Peak resident memory of finished ffmpeg processes",
+        "buckets": tuple(2 ** n * 1024 * 1024 for n in range(5, 15)),
+    },
+    "qc_upload_bytes_total": {
+        "type": "counter",
+        "help": "Upload bytes received, by method (form or chunk)",
+    },
+    "qc_upload_seconds_total": {
+        "type": "counter",
+        "help": "Time spent receiving upload bodies, by method; throughput is the rate of bytes over this",
+    },
+    "qc_cache_requests_total": {
+        "type": "counter",
+        "help": "Result cache lookups per analysis step, by result (hit or miss)",
+    },
+}
+
+
+def inc(name, amount=1, **labels):
+    """Add amount to a counter."""
+    _add([(name, _label_string(labels), amount)])
+
+
+def observe(name, value, **labels):
+    """Record one value in a histogram."""
+    # Buckets below the value get a zero increment, so every bucket row exists
+    increments = [(f"{name}_bucket", _label_string(labels, bound), int(value <= bound))
+                  for bound in METRICS[name]["buckets"]]
+    increments += [
+        (f"{name}_bucket", _label_string(labels, math.inf), 1),
+        (f"{name}_sum", _label_string(labels), value),
+        (f"{name}_count", _label_string(labels), 1),
+    ]
+    _add(increments)
+
+
+def resolution_class(metadata):
+    """Coarse resolution label of a file from its short side: sd, hd, fhd, uhd, or none without video."""
+    video = metadata.get("video")
+    if not video:
+        return "none"
+    short_side = min(video.get("width") or 0, video.get("height") or 0)
+    if short_side >= 2160:
+        return "uhd"
+    if short_side >= 1080:
+        return "fhd"
+    if short_side >= 720:
+        return "hd"
+    return "sd"
+
+
+def render():
+    """All metrics as Prometheus text exposition."""
+    # Refresh this worker's own gauge before summing over all workers
+    job_store.heartbeat(ffmpeg_runner.running_processes())
+    workers, processes = job_store.worker_stats(WORKER_STALE_AFTER)
+    gauges = {
+        "qc_jobs": [(_label_string({"status": status, "kind": kind}),
+                     job_store.count(status, batched=kind == "batch"))
+                    for status in job_store.ACTIVE for kind in ("interactive", "batch")],
+        "qc_workers": [("", workers)],
+        "qc_ffmpeg_processes": [("", processes)],
+    }
+    stored = {}
+    for name, labels, value in job_store.metric_values():
+        stored.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name, spec in METRICS.items():
+        lines.append(f"# HELP {name} {spec['help']}")
+        lines.append(f"# TYPE {name} {spec['type']}")
+        if spec["type"] == "gauge":
+            samples = [(name, labels, value) for labels, value in gauges[name]]
+        elif spec["type"] == "counter":
+            samples = sorted((name, labels, value) for labels, value in stored.get(name, []))
+        else:
+            samples = sorted(((f"{name}{suffix}", labels, value)
+                              for suffix in ("_bucket", "_sum", "_count")
+                              for labels, value in stored.get(f"{name}{suffix}", [])),
+                             key=_histogram_order)
+        for sample, labels, value in samples:
+            lines.append(f"{sample}{{{labels}}} {_format_value(value)}" if labels
+                         else f"{sample} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _add(increments):
+    try:
+        job_store.add_metrics(increments)
+    except sqlite3.Error:
+        pass  # A busy or broken database must not fail the caller
+
+
+def _ffmpeg_finished(process):
+    if process["cpu_seconds"] is None:
+        return  # Reaped elsewhere, no usage known
+    inc("qc_ffmpeg_cpu_seconds_total", process["cpu_seconds"])
+    observe("qc_ffmpeg_max_rss_bytes", process["max_rss_bytes"])
+
+
+def _label_string(labels, le=None):
+    """Labels in exposition syntax with sorted keys (the row key in the store); le always comes last."""
+    parts = [f'{key}="{_escape(str(value))}"' for key, value in sorted(labels.items())]
+    if le is not None:
+        parts.append(f'le="{_format_value(le)}"')
+    return ",".join(parts)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _histogram_order(sample):
+    """Group the samples of one label set: buckets by bound, then _sum, then _count."""
+    name, labels, _ = sample
+    base, has_le, bound = labels.partition('le="')
+    suffix_rank = {"_bucket": 0, "_sum": 1, "_count": 2}[name[name.rindex("_"):]]
+    return base.rstrip(","), suffix_rank, float(bound.rstrip('"')) if has_le else 0.0
+
+
+ffmpeg_runner.on_process_finished(_ffmpeg_finished)
@@ -0,0 +1,158 @@
+"""
+Content-addressed cache for raw analyzer results.
+
+Entries are keyed by the SHA-256 of the uploaded file (of path, size and
+mtime for files analyzed in place, see stat_key) plus ANALYZER_VERSION and
+live in one directory each:
+
+    <CACHE_FOLDER>/<sha256>-v<version>/results.json
+    <CACHE_FOLDER>/<sha256>-v<version>/waveform.png
+
+results.json holds the metadata and, per analysis step, the raw result
+together with the detector parameters it was computed with. A step is only
+reused if its parameters match, so a re-upload for another channel reuses
+everything that does not depend on the channel. The directory mtime is
+bumped on every hit; when the cache grows beyond CACHE_MAX_BYTES the least
+recently used entries are removed.
+
+All gunicorn workers share the cache directory. Saving an entry holds an
+exclusive flock on its .lock file, so concurrent saves of one file merge
+instead of overwriting each other, and every file is written to a unique
+temp file and moved into place, so readers never see a partial write.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from config import CACHE_FOLDER, CACHE_MAX_BYTES
+
+# Bump whenever an analyzer changes the shape or meaning of its result
+ANALYZER_VERSION = 4
+
+
+def file_hash(path, chunk_size=64 * 1024 * 1024):
+    """SHA-256 of a file, the same key /api/analyze computes while receiving it."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stat_key(path):
+    """
+    Cache key for a server-side file analyzed in place.
+
+    Hashing a master on a shared mount would read it once more just for the
+    key, so path, size and modification time stand in for its content.
+    """
+    st = os.stat(path)
+    return hashlib.sha256(f"{os.path.realpath(path)}:{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()
+
+
+def _entry_dir(content_hash):
+    return os.path.join(CACHE_FOLDER, f"{content_hash}-v{ANALYZER_VERSION}")
+
+
+def load_entry(content_hash):
+    """Return the cached entry for a file hash (and mark it as recently used), or None."""
+    entry_dir = _entry_dir(content_hash)
+    try:
+        with open(os.path.join(entry_dir, 'results.json')) as f:
+            entry = json.load(f)
+        os.utime(entry_dir)
+    except (OSError, ValueError):
+        return None
+    waveform = os.path.join(entry_dir, 'waveform.png')
+    entry["waveform_path"] = waveform if os.path.exists(waveform) else None
+    return entry
+
+
+def cached_step(entry, step_key, params):
+    """Cached result of a step if it was computed with the same detector params."""
+    if not entry:
+        return None
+    cached = entry.get("steps", {}).get(step_key)
+    if cached is None or cached.get("params") != params:
+        return None
+    return cached["result"]
+
+
+def save_entry(content_hash, metadata, step_results, waveform_path=None):
+    """
+    Merge fresh results into the cache entry for a file hash.
+
+    Args:
+        content_hash: SHA-256 hex digest of the file
+        metadata: Result of extract_metadata
+        step_results: Dict step_key -> (params, result); error results are skipped
+        waveform_path: Path of a freshly rendered waveform PNG, or None
+    """
+    entry_dir = _entry_dir(content_hash)
+    os.makedirs(entry_dir, exist_ok=True)
+    # Released when the file is closed
+    with open(os.path.join(entry_dir, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        results_path = os.path.join(entry_dir, 'results.json')
+        try:
+            with open(results_path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = {"steps": {}}
+
+        entry["metadata"] = metadata
+        for step_key, (params, result) in step_results.items():
+            if result.get("status") == "error":
+                continue
+            entry["steps"][step_key] = {"params": params, "result": result}
+
+        _replace(results_path, lambda f: f.write(json.dumps(entry).encode()))
+        if waveform_path and os.path.exists(waveform_path):
+            with open(waveform_path, 'rb') as src:
+                _replace(os.path.join(entry_dir, 'waveform.png'), lambda f: shutil.copyfileobj(src, f))
+
+        _evict(CACHE_MAX_BYTES)
+
+
+def _replace(path, write):
+    """Write a file through a unique temp file in its directory and move it into place."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _evict(max_bytes):
+    """Remove least recently used entries until the cache fits into max_bytes."""
+    entries = []
+    total = 0
+    for name in os.listdir(CACHE_FOLDER):
+        path = os.path.join(CACHE_FOLDER, name)
+        if not os.path.isdir(path):
+            continue
+        try:
+            size = sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+            entries.append((os.stat(path).st_mtime, size, path))
+        except OSError:
+            continue
+        total += size
+
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
@@ -0,0 +1,85 @@
+"""
+Step scheduler — runs the independent parts of an analysis concurrently.
+
+Tasks form a dependency graph. A task starts as soon as all of its
+dependencies have finished and its CPU cost fits into the remaining budget
+of the job, so e.g. the audio pass runs next to the video pass instead of
+after it. A task that costs more than the whole budget still runs, but only
+when nothing else is running. Each task's thread is named after the task and
+runs in a copy of the caller's context (e.g. the job trace, see tracing.py).
+"""
+
+import contextvars
+import threading
+
+
+class Task:
+    """One schedulable unit of work."""
+
+    def __init__(self, key, fn, deps=(), cost=1):
+        self.key = key
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.cost = max(1, cost)
+
+
+def run_tasks(tasks, cpu_budget):
+    """
+    Run tasks respecting their dependencies and a CPU budget.
+
+    Args:
+        tasks: List of Task objects; deps refer to other task keys
+        cpu_budget: Number of CPU threads the tasks may use together
+
+    Returns:
+        dict mapping task key to the return value of its fn
+
+    The first exception raised by a task is re-raised once all running
+    tasks have finished; tasks that had not started yet are dropped.
+    """
+    pending = {t.key: t for t in tasks}
+    results = {}
+    done = set()
+    running = {}
+    errors = []
+    cond = threading.Condition()
+
+    def worker(task):
+        try:
+            value = task.fn()
+        except BaseException as e:
+            with cond:
+                errors.append(e)
+        else:
+            with cond:
+                results[task.key] = value
+                done.add(task.key)
+        finally:
+            with cond:
+                running.pop(task.key, None)
+                cond.notify_all()
+
+    with cond:
+        while pending or running:
+            if errors:
+                pending.clear()
+            started = False
+            for key, task in list(pending.items()):
+                if not all(d in done for d in task.deps):
+                    continue
+                used = sum(t.cost for t in running.values())
+                if running and used + task.cost > cpu_budget:
+                    continue
+                del pending[key]
+                running[key] = task
+                threading.Thread(target=contextvars.copy_context().run, args=(worker, task),
+                                 name=task.key, daemon=True).start()
+                started = True
+            if not started and (pending or running):
+                if not running:
+                    raise RuntimeError(f"Unerfüllbare Abhängigkeiten: {sorted(pending)}")
+                cond.wait()
+
+    if errors:
+        raise errors[0]
+    return results
@@ -3,6 +3,7 @@ document.addEventListener('DOMContentLoaded', async () => {
     const renderer = new ResultsRenderer();
     const analyzeBtn = document.getElementById('analyze-btn');
     const channelSelect = document.getElementById('channel-select');
+    const accuracySelect = document.getElementById('accuracy-select');
     const channelDesc = document.getElementById('channel-description');
     const toggleAllBtn = document.getElementById('toggle-all-checks');
 
@@ -14,6 +15,8 @@ document.addEventListener('DOMContentLoaded', async () => {
     };
 
     let pollInterval = null;
+    let eventSource = null;
+    let elapsedTimer = null;
 
     // Load channels
     try {
@@ -75,9 +78,16 @@ document.addEventListener('DOMContentLoaded', async () => {
         showSection('progress');
         resetProgressUI();
 
+        // Resumable parallel chunks need SHA-256 in the browser (secure context)
+        if (window.crypto && crypto.subtle) {
+            uploadChunked(file);
+            return;
+        }
+
         const formData = new FormData();
         formData.append('file', file);
         formData.append('channel', channelSelect.value);
+        formData.append('accuracy', accuracySelect.value);
 
         // Send enabled steps
         const enabledSteps = getEnabledSteps();
@@ -128,6 +138,133 @@ document.addEventListener('DOMContentLoaded', async () => {
         xhr.send(formData);
     });
 
+    const UPLOAD_PARALLEL = 4;
+    const CHUNK_RETRIES = 5;
+    const TRIAGE_POLL_MS = 1000;
+
+    // The server analyzes the upload while the chunks arrive (in order)
+    async function uploadChunked(file) {
+        const progressText = document.getElementById('progress-text');
+        const progressBar = document.getElementById('progress-bar');
+        let upload = null;
+        let aborted = false;
+        let stopTriage = () => {};
+        try {
+            const res = await fetch('/api/uploads', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    filename: file.name,
+                    size: file.size,
+                    stream: true,
+                    channel: channelSelect.value,
+                    enabled_steps: getEnabledSteps(),
+                    accuracy: accuracySelect.value,
+                }),
+            });
+            upload = await res.json();
+            if (!res.ok) throw new Error(upload.error || 'Upload fehlgeschlagen');
+
+            const chunkBytes = (i) => Math.min(upload.chunk_size, file.size - i * upload.chunk_size);
+            const pending = [...upload.missing];
+            stopTriage = watchTriage(upload.job_id, () => {
+                aborted = true;
+                pending.length = 0;
+                fetch(`/api/uploads/${upload.upload_id}`, { method: 'DELETE' }).catch(() => {});
+                reset();
+            });
+            let uploaded = file.size - pending.reduce((sum, i) => sum + chunkBytes(i), 0);
+
+            const sendChunk = async (index) => {
+                const start = index * upload.chunk_size;
+                const data = await file.slice(start, start + chunkBytes(index)).arrayBuffer();
+                const digest = await crypto.subtle.digest('SHA-256', data);
+                const hash = Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+                for (let attempt = 0; ; attempt++) {
+                    let r = null;
+                    try {
+                        r = await fetch(`/api/uploads/${upload.upload_id}/chunks/${index}`, {
+                            method: 'PUT',
+                            headers: { 'X-Chunk-SHA256': hash },
+                            body: data,
+                        });
+                    } catch (e) {
+                        // Connection dropped: retry below
+                    }
+                    if (r && r.ok) return;
+                    if ((r && r.status < 500) || attempt >= CHUNK_RETRIES) {
+                        const err = r ? await r.json().catch(() => ({})) : {};
+                        throw new Error(err.error || 'Verbindungsfehler beim Hochladen');
+                    }
+                    await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** attempt));
+                }
+            };
+
+            const worker = async () => {
+                while (pending.length > 0) {
+                    const index = pending.shift();
+                    await sendChunk(index);
+                    uploaded += chunkBytes(index);
+                    const pct = Math.round((uploaded / file.size) * 100);
+                    progressBar.style.width = `${pct}%`;
+                    progressText.textContent = `Datei wird hochgeladen... ${formatFileSize(uploaded)} / ${formatFileSize(file.size)} (${pct}%)`;
+                }
+            };
+            await Promise.all(Array.from({ length: UPLOAD_PARALLEL }, worker));
+            stopTriage();
+            if (aborted) return;
+
+            const fin = await fetch(`/api/uploads/${upload.upload_id}/finalize`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    channel: channelSelect.value,
+                    enabled_steps: getEnabledSteps(),
+                    accuracy: accuracySelect.value,
+                }),
+            });
+            const data = await fin.json();
+            if (!fin.ok) throw new Error(data.error || 'Analyse fehlgeschlagen');
+
+            progressBar.style.width = '0%';
+            progressText.textContent = 'Wird vorbereitet...';
+            renderer.setJobId(data.job_id);
+            startPolling(data.job_id);
+        } catch (e) {
+            stopTriage();
+            if (aborted) return;
+            if (upload && upload.job_id) {
+                // The analysis may have failed first (and removed the upload): show its error
+                const status = await fetch(`/api/status/${upload.job_id}`).then(r => r.json()).catch(() => ({}));
+                if (status.status === 'error') {
+                    showError(status.error || e.message);
+                    return;
+                }
+                // Otherwise stop the analysis waiting for the remaining chunks
+                fetch(`/api/uploads/${upload.upload_id}`, { method: 'DELETE' }).catch(() => {});
+            }
+            showError(e.message);
+        }
+    }
+
+    // Poll a streaming upload's job until the header checks are in; on a
+    // hard FAIL the user may stop the upload instead of waiting for it
+    function watchTriage(jobId, onAbort) {
+        const timer = setInterval(async () => {
+            const data = await fetch(`/api/status/${jobId}`).then(r => r.json()).catch(() => null);
+            if (!data || (!data.triage && data.status !== 'error')) return;
+            clearInterval(timer);
+            if (!data.triage || data.triage.overall.status !== 'fail') return;
+            const failed = data.triage.checks
+                .filter(c => c.status === 'fail')
+                .map(c => `• ${c.name}: ${c.message}`);
+            if (confirm(`Die Datei erfüllt die Anforderungen des Kanals nicht:\n\n${failed.join('\n')}\n\nUpload abbrechen?`)) {
+                onAbort();
+            }
+        }, TRIAGE_POLL_MS);
+        return () => clearInterval(timer);
+    }
+
     // Reset
     document.getElementById('reset-btn').addEventListener('click', reset);
     document.getElementById('error-reset-btn').addEventListener('click', reset);
@@ -161,17 +298,44 @@ document.addEventListener('DOMContentLoaded', async () => {
 
     function startPolling(jobId) {
         stopPolling();
+        if (window.EventSource) {
+            startStream(jobId);
+            return;
+        }
         // Poll every 500ms
         pollInterval = setInterval(() => pollStatus(jobId), 500);
         // Also poll immediately
         pollStatus(jobId);
     }
 
+    // Server pushes the status only when it changes
+    function startStream(jobId) {
+        eventSource = new EventSource(`/api/status/${jobId}/stream`);
+        eventSource.onmessage = (e) => handleStatus(JSON.parse(e.data));
+        eventSource.onerror = () => {
+            // Stream refused (by a proxy, or the server has too many open): fall back to polling.
+            // A stream the server ended after its maximum duration reconnects on its own
+            if (eventSource && eventSource.readyState === EventSource.CLOSED) {
+                stopPolling();
+                pollInterval = setInterval(() => pollStatus(jobId), 500);
+                pollStatus(jobId);
+            }
+        };
+    }
+
     function stopPolling() {
         if (pollInterval) {
             clearInterval(pollInterval);
             pollInterval = null;
         }
+        if (eventSource) {
+            eventSource.close();
+            eventSource = null;
+        }
+        if (elapsedTimer) {
+            clearInterval(elapsedTimer);
+            elapsedTimer = null;
+        }
     }
 
     async function pollStatus(jobId) {
@@ -184,49 +348,52 @@ document.addEventListener('DOMContentLoaded', async () => {
                 return;
             }
 
-            updateProgressUI(data);
-
-            if (data.status === 'complete') {
-                stopPolling();
+            handleStatus(data);
+        } catch (e) {
+            // Network error - keep polling, might be transient
+            console.warn('Poll error:', e);
+        }
+    }
 
-                // Check if server detected audio-only (no video stream)
-                const serverAudioOnly = data.result.metadata && !data.result.metadata.video && data.result.metadata.audio;
-                if (serverAudioOnly && !renderer._isAudioOnly) {
-                    // File had a video extension but no video stream — switch to audio mode
-                    renderer._isAudioOnly = true;
-                    const audio = document.getElementById('qc-audio');
-                    if (audio && renderer._videoUrl) {
-                        audio.src = renderer._videoUrl;
-                        renderer._audioElement = audio;
-                    }
+    function handleStatus(data) {
+        updateProgressUI(data);
+
+        if (data.status === 'complete') {
+            stopPolling();
+
+            // Check if server detected audio-only (no video stream)
+            const serverAudioOnly = data.result.metadata && !data.result.metadata.video && data.result.metadata.audio;
+            if (serverAudioOnly && !renderer._isAudioOnly) {
+                // File had a video extension but no video stream — switch to audio mode
+                renderer._isAudioOnly = true;
+                const audio = document.getElementById('qc-audio');
+                if (audio && renderer._videoUrl) {
+                    audio.src = renderer._videoUrl;
+                    renderer._audioElement = audio;
                 }
-
-                // Short delay to show 100% before switching
-                setTimeout(() => {
-                    showSection('results');
-                    renderer.renderOverall(data.result.overall, data.result.channel_label);
-                    renderer.renderMetadata(data.result.metadata);
-                    renderer.renderChecks(data.result.checks);
-
-                    // Pass clipping/loudness data for waveform markers
-                    renderer.setAnalysisData(
-                        { segments: data.result.clipping_segments || [] },
-                        { segments: data.result.loud_segments || [] }
-                    );
-
-                    renderer.renderTimeline(data.result.checks, data.result.metadata.duration);
-                    initFilters();
-                    initNormalizeButton();
-                }, 400);
             }
 
-            if (data.status === 'error') {
-                showError(data.error || 'Analyse fehlgeschlagen');
-            }
+            // Short delay to show 100% before switching
+            setTimeout(() => {
+                showSection('results');
+                renderer.renderOverall(data.result.overall, data.result.channel_label, data.result.accuracy);
+                renderer.renderMetadata(data.result.metadata);
+                renderer.renderChecks(data.result.checks);
+
+                // Pass clipping/loudness data for waveform markers
+                renderer.setAnalysisData(
+                    { segments: data.result.clipping_segments || [] },
+                    { segments: data.result.loud_segments || [] }
+                );
+
+                renderer.renderTimeline(data.result.checks, data.result.metadata.duration);
+                initFilters();
+                initNormalizeButton();
+            }, 400);
+        }
 
-        } catch (e) {
-            // Network error - keep polling, might be transient
-            console.warn('Poll error:', e);
+        if (data.status === 'error') {
+            showError(data.error || 'Analyse fehlgeschlagen');
         }
     }
 
@@ -245,6 +412,15 @@ document.addEventListener('DOMContentLoaded', async () => {
 
         // Time displays
         elapsed.textContent = data.elapsed_formatted || '0s';
+        if (eventSource) {
+            // Pushed updates only arrive on changes; keep the clock running locally
+            const base = data.elapsed_seconds || 0;
+            const receivedAt = Date.now();
+            if (elapsedTimer) clearInterval(elapsedTimer);
+            elapsedTimer = setInterval(() => {
+                elapsed.textContent = formatSeconds(base + (Date.now() - receivedAt) / 1000);
+            }, 1000);
+        }
 
         if (data.remaining_seconds > 0) {
             remaining.textContent = `~${data.remaining_formatted}`;
@@ -284,10 +460,17 @@ document.addEventListener('DOMContentLoaded', async () => {
     }
 
     function stepTimeStr(step) {
+        if (step.status === 'done' && step.cached) {
+            return 'Cache';
+        }
         if (step.status === 'done' && step.actual_duration != null) {
             return formatSeconds(step.actual_duration);
         }
         if (step.status === 'running') {
+            if (step.progress_percent > 0) {
+                const speed = step.speed ? ` \u00b7 ${step.speed}x` : '';
+                return `${step.progress_percent}%${speed}`;
+            }
             return `~${formatSeconds(step.estimated_duration)}`;
         }
         if (step.status === 'skipped') {
@@ -77,7 +77,7 @@ class ResultsRenderer {
         }
     }
 
-    renderOverall(overall, channelLabel) {
+    renderOverall(overall, channelLabel, accuracy) {
         const card = document.getElementById('overall-card');
         const badge = document.getElementById('overall-badge');
         const text = document.getElementById('overall-text');
@@ -98,6 +98,10 @@ class ResultsRenderer {
         text.textContent = labels[overall.status] || 'Unbekannt';
         summary.textContent = overall.summary;
         channel.textContent = `Kanal: ${channelLabel}`;
+        if (accuracy && accuracy.level !== 'full') {
+            // Reduced accuracy: results are a first sighting, not a final verdict
+            channel.textContent += ` \u00b7 Genauigkeit: ${accuracy.label} (${accuracy.description})`;
+        }
 
         this._renderScoreRing(overall.score);
 
@@ -0,0 +1,27 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# A private job store and cache; no analysis threads, tests run the pipeline themselves
+_state = tempfile.mkdtemp(prefix='qc-tests-')
+os.environ['QC_JOB_DB'] = os.path.join(_state, 'jobs.db')
+os.environ['QC_CACHE_DIR'] = os.path.join(_state, 'cache')
+os.environ['QC_MAX_CONCURRENT_JOBS'] = '1'
+os.environ['QC_ANALYSIS_THREADS'] = '0'
+
+requires_ffmpeg = pytest.mark.skipif(not (shutil.which('ffmpeg') and shutil.which('ffprobe')),
+                                     reason="ffmpeg/ffprobe not in PATH")
+
+
+def render(path, graph, duration, extra=()):
+    """Render a lavfi filter graph with a [v] (and optionally [a]) output to path."""
+    maps = ['-map', '[v]'] + (['-map', '[a]'] if '[a]' in graph else [])
+    subprocess.run(['ffmpeg', '-v', 'error', '-y', '-filter_complex', graph, *maps, '-t', str(duration),
+                    *extra, str(path)], check=True)
+    return str(path)
@@ -0,0 +1,29 @@
+import os
+
+from analyzers import waveform
+from analyzers.audio_pass import AUDIO_STEPS, run_audio_pass
+from conftest import render, requires_ffmpeg
+
+
+@requires_ffmpeg
+def test_fused_pass_creates_the_waveform_folder(tmp_path, monkeypatch):
+    folder = tmp_path / "fresh-clone" / "uploads"
+    monkeypatch.setattr(waveform, "UPLOAD_FOLDER", str(folder))
+    path = render(tmp_path / "tone.mkv", "color=s=64x64:d=3[v];sine=frequency=1000:duration=3[a]", 3)
+
+    results = run_audio_pass(path, "test", AUDIO_STEPS)
+    assert results["waveform_path"] == str(folder / "waveform_test.png")
+    assert os.path.exists(results["waveform_path"])
+    assert results["clipping"]["has_clipping"] is False
+
+
+@requires_ffmpeg
+def test_loudness_reads_the_source_rate_at_reduced_accuracy(tmp_path, monkeypatch):
+    monkeypatch.setattr(waveform, "UPLOAD_FOLDER", str(tmp_path))
+    # 15 kHz lies above the Nyquist frequency of the balanced level's 24 kHz
+    path = render(tmp_path / "high.mkv", "color=s=64x64:d=5[v];sine=frequency=15000:duration=5[a]", 5)
+
+    full = run_audio_pass(path, "full", AUDIO_STEPS)
+    balanced = run_audio_pass(path, "balanced", AUDIO_STEPS, accuracy="balanced")
+    assert balanced["loudness"] == full["loudness"]
+    assert os.path.exists(balanced["waveform_path"])
@@ -0,0 +1,29 @@
+from batch_report import build_report
+from config import FAIL, PASS
+
+BATCH = {"batch_id": "b1", "name": "Lieferung", "channel": "youtube", "channel_label": "YouTube",
+         "accuracy": "full", "items": [{"name": "a.mp4", "job_id": "a"}, {"name": "b.mp4", "job_id": "b"}]}
+
+
+def _complete(status):
+    return {"status": "complete", "result": {"overall": {"status": status}, "checks": []}}
+
+
+def test_unfinished_files_are_pending_not_passing():
+    report = build_report(BATCH, {"a": {"status": "queued"}, "b": {"status": "running"}})
+    assert not report["complete"]
+    assert report["overall"]["status"] == "pending"
+    assert report["overall"]["pending_count"] == 2
+
+    report = build_report(BATCH, {"a": _complete(PASS), "b": {"status": "running"}})
+    assert (report["overall"]["status"], report["overall"]["pass_count"]) == ("pending", 1)
+
+
+def test_a_failed_file_decides_the_batch_early():
+    report = build_report(BATCH, {"a": _complete(FAIL), "b": {"status": "queued"}})
+    assert report["overall"]["status"] == FAIL
+    assert report["overall"]["pending_count"] == 1
+
+    report = build_report(BATCH, {"a": _complete(PASS), "b": _complete(PASS)})
+    assert report["complete"]
+    assert (report["overall"]["status"], report["overall"]["pending_count"]) == (PASS, 0)
@@ -0,0 +1,23 @@
+import pytest
+
+import benchmark
+from conftest import requires_ffmpeg
+
+DURATION = benchmark.MIN_DURATION
+
+
+@pytest.fixture(scope="module")
+def media(tmp_path_factory):
+    return benchmark.make_media(str(tmp_path_factory.mktemp("bench")), "640x360", DURATION, "libx264")
+
+
+@requires_ffmpeg
+@pytest.mark.parametrize("analyzer", ["black_frames", "media_offline", "noise", "fuck_frames", "clipping",
+                                      "video_pass", "audio_pass"])
+def test_every_event_trips_its_detector(media, analyzer):
+    events = benchmark.media_events(DURATION)
+    results = benchmark._run_analyzer(analyzer, media)
+    assert results
+    for key, result in results.items():
+        accuracy = benchmark.match_events(events[key], benchmark._found_events(key, result))
+        assert (key, accuracy["recall"], accuracy["precision"]) == (key, 1.0, 1.0)
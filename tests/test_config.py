@@ -0,0 +1,13 @@
+import importlib
+
+import config
+
+
+def test_concurrency_limit_is_at_least_one(monkeypatch):
+    # The queue estimates divide by it
+    monkeypatch.setenv('QC_MAX_CONCURRENT_JOBS', '0')
+    try:
+        assert importlib.reload(config).MAX_CONCURRENT_JOBS == 1
+    finally:
+        monkeypatch.undo()
+        importlib.reload(config)
@@ -0,0 +1,47 @@
+import time
+
+import pytest
+
+import app
+import estimator
+import job_store
+from analyzers.video_pass import VIDEO_STEPS
+
+METADATA = {"duration": 120, "video": {"codec": "h264", "width": 1920, "height": 1080, "framerate": 25},
+            "audio": {"channels": 2}}
+
+
+@pytest.fixture
+def fresh_models(monkeypatch):
+    with job_store._transaction() as conn:
+        conn.execute("DELETE FROM pass_timings")
+    monkeypatch.setattr(estimator, "_fitted_at", None)
+
+
+def test_fused_pass_is_recorded_once_with_its_wall_time(fresh_models):
+    job_id, _ = app._enqueue_job("/nonexistent.mp4", "youtube", "clip.mp4", None)
+    for step_key in VIDEO_STEPS:
+        app._start_step(job_id, step_key)
+    time.sleep(0.2)
+    app._finish_steps(job_id, list(VIDEO_STEPS))
+    app._record_timings(job_id, METADATA, "full")
+
+    rows = job_store.pass_timings()
+    assert [key for key, _, _ in rows] == [estimator.pass_key(VIDEO_STEPS)]
+    wall = job_store.get(job_id)["steps"]["noise"]["pass_seconds"]
+    assert rows[0][2] == pytest.approx(wall)
+    assert wall >= 0.2
+
+
+def test_pass_estimate_is_split_across_its_steps(fresh_models):
+    feats = estimator.features(METADATA, "full")
+    estimator.record([(list(VIDEO_STEPS), feats, 90.0)] * estimator.MIN_SAMPLES)
+    assert estimator.estimate(list(VIDEO_STEPS), feats) == pytest.approx(90.0, rel=0.01)
+    assert estimator.estimate(["noise"], feats) is None
+
+    job_id, _ = app._enqueue_job("/nonexistent.mp4", "youtube", "clip.mp4", None)
+    app._recalculate_estimates(job_id, 120, True, True, features=feats)
+    steps = job_store.get(job_id)["steps"]
+    assert sum(steps[k]["estimated_duration"] for k in VIDEO_STEPS) == pytest.approx(90.0, rel=0.01)
+    assert {steps[k]["estimate_source"] for k in VIDEO_STEPS} == {"model"}
+    assert steps["loudness"]["estimate_source"] == "table"
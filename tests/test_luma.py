@@ -0,0 +1,66 @@
+import pytest
+
+import benchmark
+from analyzers import video_pass
+from analyzers.accuracy import ACCURACY_LEVELS
+from analyzers.fuck_frames import scene_threshold
+from analyzers.video_pass import VIDEO_STEPS, build_video_graph, channel_result, run_video_pass
+from config import CHANNEL_CONFIGS
+from conftest import render, requires_ffmpeg
+
+PROFILES = list(CHANNEL_CONFIGS.values())
+FRAME = 1 / benchmark.FPS
+
+
+@pytest.fixture(scope="module")
+def media(tmp_path_factory):
+    """Benchmark events at 720p plus a fade through black (the case luma.py bounds)."""
+    video, _ = benchmark.media_filters(1280, 720, 20)
+    graph = video + ",fade=t=out:st=18:d=0.6:enable='lt(t,19)',fade=t=in:st=19:d=0.6:enable='gte(t,19)'[v]"
+    return render(tmp_path_factory.mktemp("luma") / "in.mp4", graph, 20,
+                  ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18', '-pix_fmt', 'yuv420p'])
+
+
+def _assert_same_intervals(analysis, full):
+    assert len(analysis) == len(full)
+    for a, f in zip(analysis, full):
+        assert a["start"] == pytest.approx(f["start"], abs=FRAME + 1e-6)
+        assert a["end"] == pytest.approx(f["end"], abs=FRAME + 1e-6)
+
+
+@requires_ffmpeg
+def test_analysis_widths_match_full_size_within_tolerance(media, monkeypatch):
+    analysis = run_video_pass(media, PROFILES, VIDEO_STEPS)
+    monkeypatch.setattr(video_pass, "ANALYSIS_WIDTHS", dict.fromkeys(video_pass.ANALYSIS_WIDTHS))
+    full = run_video_pass(media, PROFILES, VIDEO_STEPS)
+
+    # Boundaries move by at most one frame, during fades
+    _assert_same_intervals(analysis["black_frames"]["intervals"], full["black_frames"]["intervals"])
+    assert len(full["black_frames"]["intervals"]) == 3
+    _assert_same_intervals(analysis["media_offline"]["frozen_intervals"], full["media_offline"]["frozen_intervals"])
+    # Cuts above the most sensitive channel threshold are the same frames
+    threshold = scene_threshold(PROFILES)
+    assert ([t for t, score in analysis["fuck_frames"]["scene_changes"] if score > threshold]
+            == [t for t, score in full["fuck_frames"]["scene_changes"] if score > threshold])
+    # Noise runs at the source resolution in both
+    assert analysis["noise"] == full["noise"]
+
+
+def test_signalstats_never_gets_gray_frames():
+    branches = [(step_key, f"{step_key}_chain", None) for step_key in VIDEO_STEPS]
+    noise_input = f"[in{VIDEO_STEPS.index('noise')}]"
+    for level in ACCURACY_LEVELS:
+        widths = [video_pass.analysis_width(level, video_pass.ANALYSIS_WIDTHS[s]) for s in VIDEO_STEPS]
+        groups = [c for c in build_video_graph(branches, widths).split(';') if c.startswith('[g')]
+        assert 'format=gray' not in next(c for c in groups if c.endswith(noise_input) or noise_input + '[' in c)
+
+
+@requires_ffmpeg
+def test_balanced_keeps_noise_at_source_resolution(tmp_path):
+    # Line dropouts average out below TOUT thresholds when 1080p is scaled to 640 px
+    path = benchmark.make_media(str(tmp_path), "1920x1080", benchmark.MIN_DURATION, "libx264")
+    raw = run_video_pass(path, PROFILES, ["noise"], accuracy="balanced")
+    result = channel_result("noise", raw["noise"], CHANNEL_CONFIGS[benchmark.CHANNEL])
+    events = benchmark.media_events(benchmark.MIN_DURATION)["noise"]
+    accuracy = benchmark.match_events(events, benchmark._found_events("noise", result))
+    assert (accuracy["recall"], accuracy["precision"]) == (1.0, 1.0)
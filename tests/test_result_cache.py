@@ -0,0 +1,26 @@
+import multiprocessing
+import os
+
+import result_cache
+
+
+def _save_steps(worker, rounds):
+    for i in range(rounds):
+        result_cache.save_entry("abc", {"duration": 1}, {f"step_{worker}_{i}": ({"n": i}, {"value": i})})
+
+
+def test_concurrent_saves_from_several_processes_merge(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache, "CACHE_FOLDER", str(tmp_path))
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_save_steps, args=(w, 20)) for w in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert [worker.exitcode for worker in workers] == [0] * 4
+
+    entry = result_cache.load_entry("abc")
+    assert len(entry["steps"]) == 4 * 20
+    assert result_cache.cached_step(entry, "step_3_19", {"n": 19}) == {"value": 19}
+    # No temp files left behind
+    assert sorted(os.listdir(result_cache._entry_dir("abc"))) == ['.lock', 'results.json']
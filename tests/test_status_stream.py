@@ -0,0 +1,33 @@
+import threading
+
+import app
+
+
+def _events(response):
+    return [line for line in response.get_data(as_text=True).split("\n\n") if line.startswith("data:")]
+
+
+def test_stream_sends_an_unchanged_job_once(monkeypatch):
+    monkeypatch.setattr(app, "STREAM_POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(app, "STREAM_MAX_DURATION", 1)
+    job_id, _ = app._enqueue_job("/nonexistent.mp4", "youtube", "clip.mp4", None)
+
+    response = app.app.test_client().get(f"/api/status/{job_id}/stream")
+    assert response.status_code == 200
+    assert len(_events(response)) == 1
+    response.close()
+
+
+def test_stream_refused_beyond_the_limit(monkeypatch):
+    monkeypatch.setattr(app, "stream_slots", threading.BoundedSemaphore(1))
+    monkeypatch.setattr(app, "STREAM_MAX_DURATION", 0)
+    job_id, _ = app._enqueue_job("/nonexistent.mp4", "youtube", "clip.mp4", None)
+    client = app.app.test_client()
+
+    first = client.get(f"/api/status/{job_id}/stream", buffered=False)
+    assert first.status_code == 200
+    assert client.get(f"/api/status/{job_id}/stream").status_code == 503
+    first.close()
+    second = client.get(f"/api/status/{job_id}/stream")
+    assert second.status_code == 200
+    second.close()
@@ -0,0 +1,116 @@
+import hashlib
+import time
+
+import app
+import job_store
+import upload_stream
+from conftest import render, requires_ffmpeg
+from upload_stream import UploadInput
+
+CHUNK = 1024 * 1024
+# Starts with an mdat box, so the header triage waits for the whole file instead of probing it
+BODY = b'\x00\x00\x00\x08mdat' + bytes(2 * CHUNK - 12) + b'tail'
+
+
+def _stream_upload(client, body=BODY, filename="clip.mp4"):
+    response = client.post('/api/uploads', json={"filename": filename, "size": len(body), "chunk_size": CHUNK,
+                                                 "stream": True, "channel": "youtube"})
+    assert response.status_code == 201
+    upload = response.get_json()
+    for index in range(upload["chunk_count"]):
+        chunk = body[index * CHUNK:(index + 1) * CHUNK]
+        response = client.put(f"/api/uploads/{upload['upload_id']}/chunks/{index}", data=chunk,
+                              headers={"X-Chunk-SHA256": hashlib.sha256(chunk).hexdigest()})
+        assert response.status_code == 200
+    return upload
+
+
+def test_finalize_keeps_streaming_upload_until_the_job_is_done():
+    client = app.app.test_client()
+    upload = _stream_upload(client)
+    source = UploadInput(upload["upload_id"], job_store.get_upload(upload["upload_id"])["path"])
+    assert source.wait()
+
+    response = client.post(f"/api/uploads/{upload['upload_id']}/finalize", json={})
+    assert response.status_code == 200
+    assert response.get_json()["job_id"] == upload["job_id"]
+    assert source.wait()
+    reader = source.open()
+    assert reader.read(len(BODY)) == BODY
+    reader.close()
+    # Finalizing again is harmless
+    assert client.post(f"/api/uploads/{upload['upload_id']}/finalize", json={}).status_code == 200
+
+
+def _wait_for_triage(job_id):
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        job = job_store.get(job_id)
+        if job.get("triage") or not job.get("triage_started_at"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError("triage still running")
+
+
+@requires_ffmpeg
+def test_failed_triage_does_not_fail_the_chunk_and_is_retried(tmp_path, monkeypatch):
+    path = render(tmp_path / "clip.mkv", "testsrc2=s=320x240:d=2[v];sine=duration=2[a]", 2)
+    with open(path, 'rb') as f:
+        body = f.read()
+    calls = []
+
+    def flaky_extract_metadata(filepath, original_filename=None):
+        calls.append(filepath)
+        if len(calls) == 1:
+            raise OSError("ffprobe not executable")
+        return extract_metadata(filepath, original_filename)
+
+    extract_metadata = app.extract_metadata
+    monkeypatch.setattr(app, "extract_metadata", flaky_extract_metadata)
+    client = app.app.test_client()
+    upload = _stream_upload(client, body, "clip.mkv")
+
+    job = _wait_for_triage(upload["job_id"])
+    assert job.get("triage") is None
+    assert job["triage_attempts"] == 1
+
+    assert client.post(f"/api/uploads/{upload['upload_id']}/finalize", json={}).status_code == 200
+    job = _wait_for_triage(upload["job_id"])
+    assert job["triage"]["overall"]
+    assert len(calls) == 2
+
+
+def test_streaming_job_takes_a_slot_only_once_data_arrives():
+    client = app.app.test_client()
+    response = client.post('/api/uploads', json={"filename": "clip.mp4", "size": len(BODY), "chunk_size": CHUNK,
+                                                 "stream": True, "channel": "youtube"})
+    upload = response.get_json()
+    # Other tests leave queued jobs behind; the waiting upload's job is never among the claimed ones
+    claimed = []
+    while True:
+        next_job = job_store.claim_next(len(job_store.active_jobs()) + 1)
+        if next_job is None:
+            break
+        claimed.append(next_job[0])
+    assert upload["job_id"] not in claimed
+    assert job_store.get(upload["job_id"])["status"] == "queued"
+
+    for index in range(upload["chunk_count"]):
+        chunk = BODY[index * CHUNK:(index + 1) * CHUNK]
+        client.put(f"/api/uploads/{upload['upload_id']}/chunks/{index}", data=chunk,
+                   headers={"X-Chunk-SHA256": hashlib.sha256(chunk).hexdigest()})
+    assert job_store.claim_next(len(job_store.active_jobs()) + 1)[0] == upload["job_id"]
+
+
+def test_idle_upload_stalls_the_reader(monkeypatch):
+    monkeypatch.setattr(upload_stream, "IDLE_TIMEOUT", 0)
+    client = app.app.test_client()
+    response = client.post('/api/uploads', json={"filename": "clip.mp4", "size": len(BODY), "chunk_size": CHUNK,
+                                                 "stream": True, "channel": "youtube"})
+    upload = response.get_json()
+    source = UploadInput(upload["upload_id"], job_store.get_upload(upload["upload_id"])["path"])
+    reader = source.open()
+    assert reader.read(CHUNK) == b''
+    reader.close()
+    assert not source.wait()
+    assert source.stalled
@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+from analyzers import ffmpeg_runner, video_pass
+from analyzers.ffmpeg_runner import LineRouter
+from analyzers.fuck_frames import _get_framerate
+from analyzers.media_offline import FREEZE_MIN_DURATION
+from analyzers.video_pass import run_video_pass
+from config import CHANNEL_CONFIGS
+from conftest import render, requires_ffmpeg
+
+PROFILES = list(CHANNEL_CONFIGS.values())
+
+
+def _black_and_freeze(tmp_path, duration=10, black=(2, 4), freeze_frames=(150, 200)):
+    first, last = freeze_frames
+    graph = (f"testsrc2=s=320x240:r=25:d={duration},"
+             f"drawbox=c=black:t=fill:enable='between(t,{black[0]},{black[1]})',"
+             f"split[m][r];[m][r]freezeframes=first={first}:last={last}:replace={first}[v]")
+    return render(tmp_path / "in.mp4", graph, duration, ['-c:v', 'libx264', '-pix_fmt', 'yuv420p'])
+
+
+class _Collect:
+    def __init__(self):
+        self.lines = []
+
+    def feed(self, line):
+        self.lines.append(line)
+
+
+def test_line_router_accepts_both_prefix_forms():
+    black = _Collect()
+    router = LineRouter({"blackdetect": black})
+    router.feed("[Parsed_blackdetect_3 @ 0x55d1] black_start:1 black_end:2 black_duration:1")
+    router.feed("[blackdetect @ 0x7f81] black_start:4 black_end:5 black_duration:1")
+    router.feed("[h264 @ 0x7f82] unrelated")
+    assert black.lines == ["[Parsed_blackdetect_3 @ 0x55d1] black_start:1 black_end:2 black_duration:1",
+                           "[blackdetect @ 0x7f81] black_start:4 black_end:5 black_duration:1"]
+
+
+@requires_ffmpeg
+def test_fused_pass_finds_black_and_frozen_intervals(tmp_path):
+    path = _black_and_freeze(tmp_path)
+    result = run_video_pass(path, PROFILES, ["black_frames", "media_offline"])
+
+    black = result["black_frames"]["intervals"]
+    assert len(black) == 1
+    assert black[0]["start"] == pytest.approx(2, abs=0.05)
+    assert black[0]["end"] == pytest.approx(4.04, abs=0.05)
+    frozen = [(i["start"], i["end"]) for i in result["media_offline"]["frozen_intervals"]]
+    # The black interval is frozen as well (a still black frame)
+    assert any(start == pytest.approx(6, abs=0.05) for start, _ in frozen)
+
+
+@requires_ffmpeg
+def test_sharded_pass_matches_single_pass(tmp_path, monkeypatch):
+    monkeypatch.setattr(video_pass, "SHARD_MIN_DURATION", 4)
+    # Frames 75-124 frozen: exactly FREEZE_MIN_DURATION at 25 fps, across the shard boundary at 4 s
+    path = _black_and_freeze(tmp_path, duration=12, black=(8, 9), freeze_frames=(75, 124))
+    steps = ["black_frames", "media_offline"]
+    single = run_video_pass(path, PROFILES, steps, duration=12, max_shards=1)
+    sharded = run_video_pass(path, PROFILES, steps, duration=12, max_shards=3)
+
+    frozen = single["media_offline"]["frozen_intervals"]
+    assert any(i["duration"] == pytest.approx(FREEZE_MIN_DURATION) for i in frozen)
+    assert sharded == single
+
+
+@requires_ffmpeg
+def test_framerate_probe_is_accounted(tmp_path, monkeypatch):
+    path = render(tmp_path / "in.mp4", "testsrc2=s=160x120:r=25:d=1[v]", 1, ['-c:v', 'libx264', '-pix_fmt', 'yuv420p'])
+    finished = []
+    monkeypatch.setattr(ffmpeg_runner, "_finished_callbacks", [finished.append])
+
+    assert _get_framerate(path) == 25
+    assert [os.path.basename(p["cmd"][0]) for p in finished] == ["ffprobe"]
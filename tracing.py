@@ -0,0 +1,111 @@
+"""
+Per-job execution traces in the Chrome trace-event format.
+
+While a job runs, its trace collects one span per analysis step and one per
+subprocess (ffmpeg, ffprobe) with the exact command line, exit code, bytes
+read, CPU time and peak memory. Steps that share a fused pass share its
+span. Each thread of the job (the scheduler's tasks, the time shards of the
+video pass) gets its own row, so overlapping passes show up side by side.
+
+The trace of the running job is held in a context variable; the scheduler
+and the video pass start their threads in a copy of the caller's context,
+so subprocesses deep inside a pass are recorded without handing the trace
+down. Once the job is done its trace is stored with the job and served at
+/api/status/<job_id>/trace; load it in chrome://tracing or Perfetto.
+"""
+
+import contextvars
+import os
+import shlex
+import threading
+import time
+
+from analyzers import ffmpeg_runner
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    """Events of one job; timestamps are microseconds since the job started."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.started_at = time.time()
+        self.events = []
+        self._threads = {}
+        self._lock = threading.Lock()
+
+    def span(self, name, category, start, end, args=None):
+        """Complete event from start to end (epoch seconds) on the calling thread's row."""
+        self._add({"name": name, "cat": category, "ph": "X", "ts": self._micros(start),
+                   "dur": max(0, round((end - start) * 1e6)), "args": args or {}})
+
+    def instant(self, name, category, at, args=None):
+        self._add({"name": name, "cat": category, "ph": "i", "s": "t", "ts": self._micros(at),
+                   "args": args or {}})
+
+    def to_chrome(self):
+        """The trace as Chrome trace-event JSON object."""
+        with self._lock:
+            events = list(self.events)
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"job_id": self.job_id, "started_at": self.started_at},
+        }
+
+    def _micros(self, at):
+        return round((at - self.started_at) * 1e6)
+
+    def _add(self, event):
+        # Keyed by the thread object: idents of finished threads are reused
+        thread = threading.current_thread()
+        with self._lock:
+            if thread not in self._threads:
+                self._threads[thread] = len(self._threads) + 1
+                self.events.append({"name": "thread_name", "ph": "M", "pid": 1,
+                                    "tid": self._threads[thread], "args": {"name": thread.name}})
+            self.events.append(dict(event, pid=1, tid=self._threads[thread]))
+
+
+def start(job_id):
+    """Begin the trace of a job in the current context; returns the token for finish."""
+    return _current.set(Trace(job_id))
+
+
+def finish(token, args=None):
+    """End the job's trace with a span over the whole analysis and return it as Chrome JSON."""
+    trace = _current.get()
+    _current.reset(token)
+    trace.span("analysis", "job", trace.started_at, time.time(), args)
+    return trace.to_chrome()
+
+
+def span(name, category, start, end, args=None):
+    """Record a span in the current job's trace (no-op outside a job)."""
+    trace = _current.get()
+    if trace is not None:
+        trace.span(name, category, start, end, args)
+
+
+def instant(name, category, at=None, args=None):
+    """Record a point in time in the current job's trace (no-op outside a job)."""
+    trace = _current.get()
+    if trace is not None:
+        trace.instant(name, category, time.time() if at is None else at, args)
+
+
+def _process_finished(process):
+    trace = _current.get()
+    if trace is None:
+        return
+    trace.span(os.path.basename(process["cmd"][0]), "subprocess", process["started_at"], process["ended_at"], {
+        "command": shlex.join(process["cmd"]),
+        "exit_code": process["exit_code"],
+        "bytes_read": process["bytes_read"],
+        "cpu_seconds": process["cpu_seconds"],
+        "max_rss_bytes": process["max_rss_bytes"],
+    })
+
+
+ffmpeg_runner.on_process_finished(_process_finished)
@@ -0,0 +1,142 @@
+"""
+Analysis input for a chunked upload that is still arriving.
+
+An upload created with "stream": true gets its analysis job right away.
+It waits in the queue without taking a running slot until the header
+has arrived (see job_store.claim_next). The passes then read the file
+through ffmpeg's stdin: UploadInput copies
+the part of the file that has arrived without gaps (the leading run of
+received chunks) into the pipe and waits for the next chunk whenever it
+runs dry. ffmpeg's own growing-file support (-follow) cannot be used, since
+the upload file is preallocated at its final size and the end of the
+received data is not visible from the file itself.
+
+MP4/MOV files with the moov atom at the end cannot be demuxed from a pipe
+(the index comes after all media data). For those, moov_at_end() tells the
+analysis to wait for the complete upload and read the file directly.
+
+An upload that gets no new chunk for IDLE_TIMEOUT while the analysis waits
+for it stalls the input: the reader ends and wait() gives up, so the job
+fails and frees its slot instead of blocking until the upload expires.
+"""
+
+import struct
+import time
+
+import job_store
+
+# How often a reader that ran out of data checks for new chunks
+POLL_INTERVAL = 0.25
+# A waiting reader gives up after this many seconds without a new chunk
+IDLE_TIMEOUT = 300
+
+
+def received_bytes(upload):
+    """Length of the file prefix covered by received chunks without gaps."""
+    received = set(upload["received"])
+    index = 0
+    while index in received:
+        index += 1
+    return min(index * upload["chunk_size"], upload["size"])
+
+
+class UploadInput:
+    """ffmpeg input fed from an upload in progress (see FileInput in ffmpeg_runner.py)."""
+
+    def __init__(self, upload_id, path):
+        self.upload_id = upload_id
+        self.path = path
+        # Set once the upload went idle while the analysis waited for it
+        self.stalled = False
+
+    def args(self):
+        return ['-i', 'pipe:0']
+
+    def open(self):
+        return _UploadReader(self)
+
+    def wait(self, min_bytes=None):
+        """
+        Block until min_bytes (default: the whole file) have arrived.
+
+        Returns:
+            False if the upload was aborted or stalled first, else True
+        """
+        while True:
+            upload = job_store.get_upload(self.upload_id)
+            if upload is None:
+                return False
+            target = upload["size"] if min_bytes is None else min(min_bytes, upload["size"])
+            if received_bytes(upload) >= target:
+                return True
+            if self.idle(upload):
+                return False
+            time.sleep(POLL_INTERVAL)
+
+    def idle(self, upload):
+        """Whether the upload got no chunk for IDLE_TIMEOUT; marks the input as stalled."""
+        if time.time() - upload["updated_at"] > IDLE_TIMEOUT:
+            self.stalled = True
+        return self.stalled
+
+
+class _UploadReader:
+    """File-like reader that blocks at the end of the received data instead of returning EOF."""
+
+    def __init__(self, source):
+        self.source = source
+        self.file = open(source.path, 'rb')
+        self.position = 0
+        self.available = 0
+
+    def read(self, size):
+        while self.position >= self.available:
+            upload = job_store.get_upload(self.source.upload_id)
+            if upload is None:
+                # Aborted: end the input, the analysis reports the abort after the passes
+                return b''
+            if self.position >= upload["size"]:
+                return b''
+            self.available = received_bytes(upload)
+            if self.position >= self.available:
+                if self.source.idle(upload):
+                    # Stalled: end the input, the analysis reports it after the passes
+                    return b''
+                time.sleep(POLL_INTERVAL)
+        data = self.file.read(min(size, self.available - self.position))
+        self.position += len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def moov_at_end(head):
+    """
+    Whether an MP4/MOV header needs the end of the file before it can be demuxed.
+
+    Args:
+        head: The first bytes of the file
+
+    Returns:
+        True if the media data (mdat) comes before the index (moov), False
+        otherwise and for other containers
+    """
+    if head[4:8] not in (b'ftyp', b'moov', b'free', b'wide', b'skip', b'mdat'):
+        return False
+    offset = 0
+    while offset + 8 <= len(head):
+        size, box_type = struct.unpack('>I4s', head[offset:offset + 8])
+        if box_type == b'moov':
+            return False
+        if box_type == b'mdat':
+            return True
+        if size == 1:
+            if offset + 16 > len(head):
+                break
+            size = struct.unpack('>Q', head[offset + 8:offset + 16])[0]
+        if size < 8:
+            break  # size 0 (box extends to the end of the file) or corrupt
+        offset += size
+    # moov not within the header: only reachable by seeking
+    return True